@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-query cost of the compiled safety matcher vs checking a
+list of independent regexes per safety level, as the hazard phrase list grows.
+
+    python scripts/bench_safety_matcher.py [--phrases 10 100 500 2000]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from backend.safety_matcher import SAFETY_LEVELS, SafetyMatcher
+
+BASE_PATTERNS = {
+    "emergency": [r"\b(gas\s+leak|smell\s+gas|gas\s+odor)\b", r"\b(explosion|explosive)\b",
+                  r"\b(carbon\s+monoxide|co\s+alarm)\b"],
+    "danger": [r"\b(electrical\s+shock|electrocuted)\b", r"\b(fire|smoke|burning)\b", r"\bspark(s|ing|ed)?\b"],
+    "caution": [r"\bleak(s|ing)?\b", r"\b(overheat|overheating)\b", r"\bgrinding\s+noise\b"]
+}
+BRANDS = ["samsung", "lg", "whirlpool", "bosch", "ge", "kenmore", "frigidaire", "maytag", "electrolux", "miele"]
+PARTS = ["door", "cord", "plug", "panel", "heater", "motor", "pump", "valve", "burner", "magnetron"]
+SYMPTOMS = ["melting", "arcing", "scorched", "smoking", "sparking", "shorted", "cracked", "buzzing"]
+
+QUERIES = [
+    "My Samsung WF45 won't spin, what does E3 mean?",
+    "How to clean lint filter?",
+    "Dishwasher not draining properly",
+    "I smell gas from the oven",
+    "My microwave is sparking",
+    "Water leaking from washing machine",
+    "The LG fridge makes a loud humming sound after the door is closed for a while",
+    "What is the recommended temperature setting for the freezer compartment?"
+]
+
+
+def hazard_phrases(count: int, seed: int = 7):
+    """Synthetic brand-specific hazard phrases spread over the levels"""
+    rng = random.Random(seed)
+    phrases = {level: [] for level in SAFETY_LEVELS}
+    for i in range(count):
+        words = [rng.choice(BRANDS), rng.choice(PARTS), rng.choice(SYMPTOMS), str(i)]
+        phrases[SAFETY_LEVELS[i % len(SAFETY_LEVELS)]].append(r"\b" + r"\s+".join(words) + r"\b")
+    return phrases
+
+
+class RegexListChecker:
+    """The per-level loop over independent regexes the matcher replaces"""
+    
+    def __init__(self, patterns):
+        self.compiled = {level: [re.compile(p, re.IGNORECASE) for p in patterns[level]] for level in SAFETY_LEVELS}
+    
+    def level(self, text: str) -> str:
+        for level in SAFETY_LEVELS:
+            for pattern in self.compiled[level]:
+                if pattern.search(text):
+                    return level
+        return "safe"
+
+
+def per_query_us(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in QUERIES:
+            fn(query)
+    return (time.perf_counter() - start) / (rounds * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--phrases", type=int, nargs="+", default=[0, 10, 100, 500, 2000])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    
+    print(f"{'phrases':>8} {'regex list us':>14} {'matcher us':>11} {'speedup':>8} {'build ms':>9}")
+    for count in args.phrases:
+        patterns = {level: BASE_PATTERNS[level] + extra for level, extra in hazard_phrases(count).items()}
+        baseline = RegexListChecker(patterns)
+        
+        build_start = time.perf_counter()
+        matcher = SafetyMatcher(patterns)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        
+        mismatches = [q for q in QUERIES if baseline.level(q) != matcher.level(q)]
+        if mismatches:
+            print(f"  level mismatch for {mismatches}")
+        
+        baseline_us = per_query_us(baseline.level, args.rounds)
+        matcher_us = per_query_us(matcher.level, args.rounds)
+        print(f"{count:>8} {baseline_us:>14.1f} {matcher_us:>11.1f} {baseline_us / matcher_us:>7.1f}x {build_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
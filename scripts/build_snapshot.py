@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Build the packed single-file index snapshot (faiss_index/companion.snapshot)
+from the current index, ids and chunk metadata. The API only uses (and keeps
+rewriting on merges) a snapshot that SNAPSHOT_PATH points at. Run from the
+project root:
+
+    python scripts/build_snapshot.py
+    python scripts/build_snapshot.py --verify faiss_index/companion.snapshot
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from core.retrieval.packed_snapshot import PackedSnapshot
+from core.retrieval.vector_store import (
+    DEFAULT_EMBEDDINGS_PATH, DEFAULT_IDS_PATH, DEFAULT_INDEX_PATH, DEFAULT_MANIFEST_PATH,
+    DEFAULT_METADATA_PATH, VectorStore
+)
+
+
+def verify(path: Path) -> int:
+    start = time.time()
+    try:
+        snapshot = PackedSnapshot(path, verify=True)
+    except (OSError, ValueError) as e:
+        print(f"INVALID: {e}")
+        return 1
+    header = snapshot.header
+    print(f"OK: {path} format v{header['format_version']}, {snapshot.count} chunks x {snapshot.dim} dims, "
+          f"index v{header['index_version']}, verified in {time.time() - start:.2f}s")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or verify a packed CompanionAI index snapshot")
+    parser.add_argument("output", nargs="?", default="faiss_index/companion.snapshot")
+    parser.add_argument("--verify", action="store_true", help="check an existing snapshot instead of building")
+    parser.add_argument("--index", default=str(DEFAULT_INDEX_PATH))
+    parser.add_argument("--ids", default=str(DEFAULT_IDS_PATH))
+    parser.add_argument("--embeddings", default=str(DEFAULT_EMBEDDINGS_PATH))
+    parser.add_argument("--metadata", default=str(DEFAULT_METADATA_PATH))
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST_PATH))
+    args = parser.parse_args()
+    
+    output = Path(args.output)
+    if args.verify:
+        return verify(output)
+    
+    start = time.time()
+    store = VectorStore.load(
+        index_path=Path(args.index),
+        ids_path=Path(args.ids),
+        metadata_path=Path(args.metadata),
+        embeddings_path=Path(args.embeddings),
+        manifest_path=Path(args.manifest)
+    )
+    if store.delta_size:
+        print(f"Merging {store.delta_size} delta vectors into the base first")
+    header = store.write_packed_snapshot(output)
+    print(f"Built {output}: {header['count']} chunks x {header['dim']} dims, "
+          f"index v{header['index_version']}, {output.stat().st_size / 1e6:.1f} MB in {time.time() - start:.2f}s")
+    
+    # Time a cold open + first search the way the API does it
+    start = time.time()
+    store = VectorStore.load(
+        index_path=Path(args.index),
+        ids_path=Path(args.ids),
+        metadata_path=Path(args.metadata),
+        embeddings_path=Path(args.embeddings),
+        manifest_path=Path(args.manifest),
+        snapshot_path=output
+    )
+    store.search(PackedSnapshot(output).vectors[:1], 5)
+    print(f"Cold open + first search: {(time.time() - start) * 1000:.1f} ms")
+    print(f"Serve it with SNAPSHOT_PATH={output}")
+    return verify(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
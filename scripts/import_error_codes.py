@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Import error-code rows into the error-code table (data/error_codes.json)
+from a CSV transcribed from a manual's error-code / information-code page.
+Columns are the ErrorCodeInfo fields; list fields (aliases,
+immediate_actions, troubleshooting_steps, ...) separate items with "|".
+Every row needs `source` - the manual file and page (or manufacturer
+document) it was taken from. Rows without one are rejected. Run from the
+project root:
+
+    python scripts/import_error_codes.py samsung_wf45_codes.csv
+    python scripts/import_error_codes.py --check
+
+then POST /admin/error-codes/reload (or restart) to serve the new table.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import fields
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from backend.error_codes import ErrorCodeInfo, ErrorCodeTable, normalize_code
+from core.retrieval.filters import normalize_appliance_type, normalize_facet
+
+LIST_FIELDS = {f.name for f in fields(ErrorCodeInfo) if isinstance(f.default, tuple)}
+
+
+def read_csv(path: Path):
+    """(ErrorCodeInfo rows, [(line, reason)] rejected)"""
+    rows, rejected = [], []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for line, record in enumerate(csv.DictReader(f), start=2):
+            record = {key.strip(): (value or "").strip() for key, value in record.items() if key}
+            record = {key: [item.strip() for item in value.split("|") if item.strip()] if key in LIST_FIELDS else value
+                      for key, value in record.items() if value}
+            if not record.get("source"):
+                rejected.append((line, "no source"))
+                continue
+            try:
+                rows.append(ErrorCodeInfo.from_record(record))
+            except TypeError as e:
+                rejected.append((line, str(e)))
+    return rows, rejected
+
+
+def _key(info: ErrorCodeInfo):
+    return normalize_facet(info.brand), normalize_appliance_type(info.appliance_type), normalize_code(info.code)
+
+
+def _record(info: ErrorCodeInfo):
+    return {**info.to_dict(), "aliases": list(info.aliases)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import error-code rows (CSV) into the error-code table")
+    parser.add_argument("csv", nargs="?", help="rows to add; a row replaces the table's row for the same code")
+    parser.add_argument("--table", default="data/error_codes.json")
+    parser.add_argument("--check", action="store_true", help="only load the table and print its stats")
+    args = parser.parse_args()
+    
+    table_path = Path(args.table)
+    if args.check or not args.csv:
+        print(json.dumps(ErrorCodeTable.load(table_path).stats(), indent=2))
+        return 0
+    
+    rows, rejected = read_csv(Path(args.csv))
+    for line, reason in rejected:
+        print(f"Rejected line {line}: {reason}")
+    
+    existing = ErrorCodeTable.load(table_path) if table_path.exists() else ErrorCodeTable()
+    merged = {_key(info): info for info in existing.entries()}
+    merged.update((_key(info), info) for info in rows)
+    # Building the table reports alias collisions before anything is written
+    table = ErrorCodeTable(merged.values())
+    
+    tmp = table_path.with_name(table_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"error_codes": [_record(info) for info in merged.values()]}, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, table_path)
+    print(f"Imported {len(rows)} rows ({len(rejected)} rejected): {table.size} entries in {table_path}")
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
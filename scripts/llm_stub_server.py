@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LLM backends, for exercising the async LLM client
+(pooling, per-backend limits, timeouts, cancellation) without a model.
+Serves Ollama's /api/chat and OpenAI/NIM's /v1/chat/completions, both
+streaming a canned answer word by word.
+
+    python scripts/llm_stub_server.py [--port 11500] [--token-delay 0.05] [--first-token-delay 0.2]
+
+then run the backend with e.g.
+    LLM_BACKENDS=ollama:stub OLLAMA_BASE_URL=http://localhost:11500
+    LLM_BACKENDS=nim:stub NIM_BASE_URL=http://localhost:11500/v1
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+ANSWER = ("Based on the manual, first unplug the appliance for one minute to reset the control board. "
+          "If the error returns, check that the drain hose is not kinked and clean the pump filter.")
+
+
+def _words():
+    words = ANSWER.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class StubState:
+    def __init__(self, token_delay: float, first_token_delay: float, fail_rate: float):
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.fail_rate = fail_rate
+        self.active = 0
+        self.max_active = 0
+        self.requests = 0
+        self.cancelled = 0
+    
+    def should_fail(self) -> bool:
+        """Deterministically fail `fail_rate` of the requests (evenly spread)"""
+        return int(self.requests * self.fail_rate) != int((self.requests - 1) * self.fail_rate)
+
+
+async def _stream(request: web.Request, frames) -> web.StreamResponse:
+    state: StubState = request.app["state"]
+    state.requests += 1
+    if state.should_fail():
+        return web.json_response({"error": "stub failure"}, status=500)
+    
+    response = web.StreamResponse()
+    await response.prepare(request)
+    state.active += 1
+    state.max_active = max(state.max_active, state.active)
+    try:
+        await asyncio.sleep(state.first_token_delay)
+        for frame in frames:
+            await response.write(frame)
+            await asyncio.sleep(state.token_delay)
+        await response.write_eof()
+    except (asyncio.CancelledError, ConnectionResetError):
+        state.cancelled += 1
+        raise
+    finally:
+        state.active -= 1
+    return response
+
+
+async def ollama_chat(request: web.Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    frames = [json.dumps({"model": model, "message": {"role": "assistant", "content": word}, "done": False}).encode() + b"\n"
+              for word in _words()]
+    frames.append(json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}).encode() + b"\n")
+    return await _stream(request, frames)
+
+
+async def openai_chat(request: web.Request):
+    body = await request.json()
+    created = int(time.time())
+    
+    def chunk(delta, finish_reason=None):
+        event = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": body.get("model", "stub"),
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return b"data: " + json.dumps(event).encode() + b"\n\n"
+    
+    frames = [chunk({"content": word}) for word in _words()]
+    frames += [chunk({}, "stop"), b"data: [DONE]\n\n"]
+    return await _stream(request, frames)
+
+
+async def stats(request: web.Request):
+    state: StubState = request.app["state"]
+    return web.json_response({"requests": state.requests, "active": state.active, "max_active": state.max_active,
+                              "cancelled": state.cancelled})
+
+
+def make_app(token_delay: float = 0.05, first_token_delay: float = 0.2, fail_rate: float = 0.0) -> web.Application:
+    app = web.Application()
+    app["state"] = StubState(token_delay, first_token_delay, fail_rate)
+    app.router.add_post("/api/chat", ollama_chat)
+    app.router.add_post("/v1/chat/completions", openai_chat)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming Ollama/OpenAI-compatible stub LLM server")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed words")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="seconds before the first word")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    args = parser.parse_args()
+    
+    web.run_app(make_app(args.token_delay, args.first_token_delay, args.fail_rate), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tune the base FAISS index: build Flat / IVF-Flat / IVF-PQ / HNSW candidates on
+the current corpus, measure recall@k against exact search and p99 latency, and
+report the cheapest configuration that reaches the target recall. With
+--apply the base is rebuilt as that configuration and the parameters are
+recorded in faiss_index/index_params.json. Run from the project root:
+
+    python scripts/tune_index.py --k 10 --target-recall 0.95
+    python scripts/tune_index.py --kinds flat,hnsw --max-p99-ms 5 --apply
+    python scripts/tune_index.py --queries logs/query_embeddings.npy
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from core.retrieval.ann import INDEX_TYPES, describe_index, tune
+from core.retrieval.vector_store import (
+    DEFAULT_EMBEDDINGS_PATH, DEFAULT_IDS_PATH, DEFAULT_INDEX_PATH, DEFAULT_MANIFEST_PATH,
+    DEFAULT_METADATA_PATH, VectorStore
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Auto-tune the CompanionAI base index type and parameters")
+    parser.add_argument("--k", type=int, default=10, help="recall@k to measure")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="also require p99 search latency <= this")
+    parser.add_argument("--num-queries", type=int, default=200, help="sampled corpus queries (without --queries)")
+    parser.add_argument("--queries", help=".npy of real query embeddings to measure with")
+    parser.add_argument("--kinds", default=",".join(INDEX_TYPES), help="index types to consider")
+    parser.add_argument("--apply", action="store_true", help="rebuild the base index as the chosen configuration")
+    parser.add_argument("--report", help="write the full trial table as JSON here")
+    parser.add_argument("--index", default=str(DEFAULT_INDEX_PATH))
+    parser.add_argument("--ids", default=str(DEFAULT_IDS_PATH))
+    parser.add_argument("--embeddings", default=str(DEFAULT_EMBEDDINGS_PATH))
+    parser.add_argument("--metadata", default=str(DEFAULT_METADATA_PATH))
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST_PATH))
+    args = parser.parse_args()
+    
+    store = VectorStore.load(
+        index_path=Path(args.index),
+        ids_path=Path(args.ids),
+        metadata_path=Path(args.metadata),
+        embeddings_path=Path(args.embeddings),
+        manifest_path=Path(args.manifest)
+    )
+    vectors = store.vectors()
+    queries = np.load(args.queries).astype(np.float32) if args.queries else None
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    print(f"Corpus: {vectors.shape[0]} x {vectors.shape[1]}, current index {describe_index(store.snapshot.base_index).label}")
+    
+    start = time.time()
+    result = tune(vectors, k=args.k, target_recall=args.target_recall, num_queries=args.num_queries,
+                  queries=queries, kinds=kinds, max_p99_ms=args.max_p99_ms)
+    print(f"Tried {len(result.trials)} configurations with {result.queries} queries in {time.time() - start:.1f}s\n")
+    
+    print(f"{'configuration':<44} {'recall@' + str(result.k):>10} {'p50 ms':>8} {'p99 ms':>8} {'memory MB':>10} {'build s':>8}")
+    for trial in result.trials:
+        marker = " <-" if trial is result.chosen else ""
+        print(f"{trial.spec.label:<44} {trial.recall:>10.3f} {trial.p50_ms:>8.3f} {trial.p99_ms:>8.3f} "
+              f"{trial.memory_bytes / 1e6:>10.1f} {trial.build_seconds:>8.2f}{marker}")
+    print(f"\nChosen: {result.chosen.spec.label}")
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result.to_dict(), f, indent=2)
+    
+    if args.apply:
+        start = time.time()
+        store.rebuild(result.chosen.spec, result.to_dict())
+        print(f"Rebuilt base as {describe_index(store.snapshot.base_index).label} in {time.time() - start:.1f}s; "
+              f"parameters recorded in {Path(args.index).with_name('index_params.json')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
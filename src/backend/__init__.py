@@ -0,0 +1,3 @@
+"""
+CompanionAI backend: FastAPI app (main.py) and its serving helpers
+"""
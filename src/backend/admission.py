@@ -0,0 +1,153 @@
+"""
+Admission control: per-stage concurrency limits with a bounded FIFO wait
+queue. A request that can't get a slot within the stage's max queue time,
+or arrives when the queue is full, is rejected with Overloaded so the API
+can answer 503 + Retry-After right away instead of timing out much later.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+
+class Overloaded(Exception):
+    """No slot for this stage - the caller should retry after `retry_after` seconds"""
+    
+    def __init__(self, stage: str, reason: str, retry_after: int):
+        super().__init__(f"{stage} overloaded ({reason})")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """At most `max_concurrency` holders; up to `max_queue` waiters for at most `max_queue_seconds`"""
+    
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_queue_seconds: float):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_seconds = max_queue_seconds
+        
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.queue_seconds_total = 0.0
+        self._service_seconds = 1.0  # EWMA of slot hold time, for Retry-After
+    
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+    
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queued work spread over the slots"""
+        estimate = self._service_seconds * (self.queued + 1) / self.max_concurrency
+        return int(min(max(math.ceil(estimate), 1), 60))
+    
+    def would_reject(self) -> bool:
+        """A new request would be turned away immediately"""
+        return self.active >= self.max_concurrency and self.queued >= self.max_queue
+    
+    async def acquire(self) -> float:
+        """Take a slot, waiting in line if needed; returns seconds spent queued"""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+        
+        if self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise Overloaded(self.name, "queue full", self.retry_after())
+        
+        start = time.time()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_queue_seconds)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                waiter.cancel()
+                self.rejected_timeout += 1
+                raise Overloaded(self.name, "queue timeout", self.retry_after())
+            # Slot handed over just as the wait expired - keep it
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+            raise
+        
+        waited = time.time() - start
+        self.queue_seconds_total += waited
+        self.admitted += 1
+        return waited
+    
+    def release(self, held_seconds: Optional[float] = None):
+        if held_seconds is not None:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+        self._release_slot()
+    
+    def _release_slot(self):
+        # Hand the slot straight to the next waiter (active stays the same)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    @asynccontextmanager
+    async def slot(self):
+        waited = await self.acquire()
+        start = time.time()
+        try:
+            yield waited
+        finally:
+            self.release(time.time() - start)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_queue_time": self.queue_seconds_total / self.admitted if self.admitted else 0.0
+        }
+
+
+class AdmissionController:
+    """Named StageLimiters; disabled controllers admit everything"""
+    
+    def __init__(self, stages: Dict[str, Dict[str, Any]], enabled: bool = True):
+        self.enabled = enabled
+        self.stages = {name: StageLimiter(name, **limits) for name, limits in stages.items()}
+    
+    @asynccontextmanager
+    async def slot(self, stage: str):
+        limiter = self.stages.get(stage)
+        if not self.enabled or limiter is None:
+            yield 0.0
+            return
+        async with limiter.slot() as waited:
+            yield waited
+    
+    def check(self, stage: str):
+        """Raise Overloaded now if `stage` would reject a new request"""
+        limiter = self.stages.get(stage)
+        if self.enabled and limiter is not None and limiter.would_reject():
+            limiter.rejected_queue_full += 1
+            raise Overloaded(stage, "queue full", limiter.retry_after())
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: limiter.stats() for name, limiter in self.stages.items()}
@@ -0,0 +1,148 @@
+"""
+Semantic answer cache: serves a stored answer when a new query embeds close
+enough to a previous one for the same brand/model/k
+
+The entries can be saved at shutdown and loaded at the next start, tagged
+with the index they were answered from, so a restarted process serves
+cached answers before CompanionAI has finished loading.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CacheScope = Tuple[Optional[str], Optional[str], int, Optional[str]]
+
+
+class AnswerCache:
+    """LRU + TTL cache keyed on query embedding similarity within a scope"""
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        # entry_id -> (scope, embedding, response, created_at); order = recency
+        self._entries: "OrderedDict[int, Tuple[CacheScope, np.ndarray, Dict[str, Any], float]]" = OrderedDict()
+        self._next_id = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def make_scope(brand: Optional[str], model: Optional[str], k: int,
+                   appliance_type: Optional[str] = None) -> CacheScope:
+        """Normalize brand/model so 'Samsung' and 'samsung ' share entries"""
+        return (
+            brand.strip().lower() if brand else None,
+            model.strip().lower() if model else None,
+            k,
+            appliance_type.strip().lower() if appliance_type else None
+        )
+    
+    def _expire(self, now: float):
+        expired = [
+            entry_id for entry_id, (_, _, _, created_at) in self._entries.items()
+            if now - created_at > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            del self._entries[entry_id]
+    
+    def get(self, embedding: np.ndarray, scope: CacheScope) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (response, similarity) of the closest entry above threshold, or None"""
+        self._expire(time.time())
+        
+        candidates = [
+            (entry_id, entry[1]) for entry_id, entry in self._entries.items()
+            if entry[0] == scope
+        ]
+        if candidates:
+            matrix = np.stack([vector for _, vector in candidates])
+            similarities = matrix @ embedding
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            
+            if similarity >= self.threshold:
+                entry_id = candidates[best][0]
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return self._entries[entry_id][2], similarity
+        
+        self.misses += 1
+        return None
+    
+    def put(self, embedding: np.ndarray, scope: CacheScope, response: Dict[str, Any]):
+        """Store a response, evicting the least recently used entries when full"""
+        self._entries[self._next_id] = (scope, embedding, response, time.time())
+        self._next_id += 1
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self):
+        """Drop every entry, e.g. after the FAISS index changed"""
+        self._entries.clear()
+        self.invalidations += 1
+    
+    def save(self, path: Path, tag: str = "") -> int:
+        """Write the unexpired entries (least recently used first); returns how many"""
+        self._expire(time.time())
+        data = {
+            "tag": tag,
+            "entries": [
+                {"scope": list(scope), "embedding": embedding.tolist(), "response": response, "created_at": created_at}
+                for scope, embedding, response, created_at in self._entries.values()
+            ]
+        }
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        return len(data["entries"])
+    
+    def load(self, path: Path, tag: str = "") -> int:
+        """
+        Add entries written by save() for the same `tag` (answers from another
+        index may cite stale sources); expired ones are dropped. Returns how many.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("tag", "") != tag:
+            logger.info(f"Ignoring answer cache {path}: saved for a different index")
+            return 0
+        now = time.time()
+        loaded = 0
+        for entry in data.get("entries", []):
+            if now - entry["created_at"] > self.ttl_seconds:
+                continue
+            self._entries[self._next_id] = (tuple(entry["scope"]), np.asarray(entry["embedding"], dtype=np.float32),
+                                            entry["response"], entry["created_at"])
+            self._next_id += 1
+            loaded += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return loaded
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold
+        }
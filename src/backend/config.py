@@ -0,0 +1,191 @@
+"""
+Backend configuration, read once from environment variables
+"""
+
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Embedding model used when CompanionAI does not expose its own encoder
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Semantic answer cache
+ANSWER_CACHE_ENABLED = _env_bool("ANSWER_CACHE_ENABLED", True)
+ANSWER_CACHE_THRESHOLD = _env_float("ANSWER_CACHE_THRESHOLD", 0.92)
+ANSWER_CACHE_MAX_ENTRIES = _env_int("ANSWER_CACHE_MAX_ENTRIES", 1024)
+ANSWER_CACHE_TTL_SECONDS = _env_float("ANSWER_CACHE_TTL_SECONDS", 3600.0)
+# Saved at shutdown and loaded at startup (for the same index), so cached answers are served
+# while CompanionAI loads; empty = in memory only
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "faiss_index/answer_cache.json")
+
+# Batch endpoint
+BATCH_MAX_QUERIES = _env_int("BATCH_MAX_QUERIES", 256)
+BATCH_LLM_WORKERS = _env_int("BATCH_LLM_WORKERS", 4)
+
+# Micro-batching of concurrent /answer searches
+SEARCH_BATCH_ENABLED = _env_bool("SEARCH_BATCH_ENABLED", True)
+SEARCH_BATCH_WINDOW_MS = _env_float("SEARCH_BATCH_WINDOW_MS", 3.0)
+SEARCH_BATCH_MAX_SIZE = _env_int("SEARCH_BATCH_MAX_SIZE", 32)
+
+# Request tracing
+TRACE_RING_SIZE = _env_int("TRACE_RING_SIZE", 200)
+SLOW_QUERY_THRESHOLD_MS = _env_float("SLOW_QUERY_THRESHOLD_MS", 8000.0)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.log")
+
+# Background log writer (logs/api_metrics.log, slow query log)
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
+LOG_FLUSH_INTERVAL = _env_float("LOG_FLUSH_INTERVAL", 1.0)
+LOG_FLUSH_BATCH = _env_int("LOG_FLUSH_BATCH", 256)
+LOG_MAX_BYTES = _env_int("LOG_MAX_BYTES", 50 * 1024 * 1024)
+LOG_ROTATE_SECONDS = _env_float("LOG_ROTATE_SECONDS", 86400.0)
+LOG_BACKUP_COUNT = _env_int("LOG_BACKUP_COUNT", 7)  # rotated files kept; 0 keeps none
+LOG_COMPRESS = _env_bool("LOG_COMPRESS", True)
+
+# Manual uploads
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = _env_int("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+MANUAL_REGISTRY_PATH = os.getenv("MANUAL_REGISTRY_PATH", "metadata/manual_registry.jsonl")
+
+# Out-of-process ingestion
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", "uploads/jobs")
+INGEST_WORKERS = _env_int("INGEST_WORKERS", 1)
+INGEST_NICE = _env_int("INGEST_NICE", 10)
+INGEST_EMBED_BATCH = _env_int("INGEST_EMBED_BATCH", 64)
+INGEST_THROTTLE_P95_SECONDS = _env_float("INGEST_THROTTLE_P95_SECONDS", 10.0)
+INGEST_JOB_RETENTION_SECONDS = _env_float("INGEST_JOB_RETENTION_SECONDS", 7 * 86400.0)  # finished job dirs
+CHUNK_WORDS = _env_int("CHUNK_WORDS", 200)
+CHUNK_OVERLAP_WORDS = _env_int("CHUNK_OVERLAP_WORDS", 40)
+
+# Incremental index: delta segment merged into the base in the background
+INDEX_MERGE_THRESHOLD = _env_int("INDEX_MERGE_THRESHOLD", 5000)
+INDEX_MERGE_INTERVAL_SECONDS = _env_float("INDEX_MERGE_INTERVAL_SECONDS", 3600.0)
+
+# Base index type: "" keeps whatever faiss.index is; flat / ivf_flat / ivf_pq / hnsw with optional
+# parameters ("ivf_flat:nlist=1024,nprobe=16", "hnsw:hnsw_m=32,ef_search=64") rebuild it on the
+# index writer; "auto" tunes for the cheapest config reaching INDEX_TARGET_RECALL at recall@INDEX_TUNE_K
+# (and p99 <= INDEX_TUNE_MAX_P99_MS when set), retuning once the corpus grows INDEX_RETUNE_GROWTH x
+INDEX_TYPE = os.getenv("INDEX_TYPE", "")
+INDEX_TARGET_RECALL = _env_float("INDEX_TARGET_RECALL", 0.95)
+INDEX_TUNE_K = _env_int("INDEX_TUNE_K", 10)
+INDEX_TUNE_QUERIES = _env_int("INDEX_TUNE_QUERIES", 200)
+INDEX_TUNE_MAX_P99_MS = _env_float("INDEX_TUNE_MAX_P99_MS", 0.0)  # 0 = no latency bound
+INDEX_RETUNE_GROWTH = _env_float("INDEX_RETUNE_GROWTH", 2.0)
+
+# Compressed base vectors held in memory instead of the float32 index: "" (off), float16 / int8
+# (scalar-quantized), float32 with dims only (truncation), or binary (sign bits + Hamming shortlist
+# rescored from the memory-mapped embeddings.npy). Options: dims=128|256, reduction=prefix|pca,
+# shortlist=N, e.g. "int8:dims=256,reduction=pca" or "binary:shortlist=400". INDEX_TYPE is not
+# applied while this is set; see scripts/bench_compression.py for memory / latency / recall per mode
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "")
+
+# Multi-worker serving: base index vectors and chunk metadata are memory-mapped
+# so uvicorn workers share one copy; one worker (leader lock) writes the index
+API_WORKERS = _env_int("API_WORKERS", _env_int("WEB_CONCURRENCY", 1))  # WEB_CONCURRENCY: uvicorn --workers default
+INDEX_MMAP = _env_bool("INDEX_MMAP", API_WORKERS > 1)
+INDEX_REFRESH_INTERVAL_SECONDS = _env_float("INDEX_REFRESH_INTERVAL_SECONDS", 5.0)
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", "faiss_index/.writer.lock")
+
+# Progressive startup: background component loading, retries and warm-up
+STARTUP_MAX_ATTEMPTS = _env_int("STARTUP_MAX_ATTEMPTS", 5)  # 0 = retry forever
+STARTUP_BACKOFF_SECONDS = _env_float("STARTUP_BACKOFF_SECONDS", 2.0)
+STARTUP_BACKOFF_MAX_SECONDS = _env_float("STARTUP_BACKOFF_MAX_SECONDS", 60.0)
+# "demo" = the safe queries from /demo/queries, "" = no warm-up, else "|"-separated queries
+WARMUP_QUERIES = os.getenv("WARMUP_QUERIES", "demo")
+WARMUP_TIMEOUT_SECONDS = _env_float("WARMUP_TIMEOUT_SECONDS", 120.0)
+
+# Packed single-file snapshot, opt-in: build it with scripts/build_snapshot.py and point this at it
+# (faiss_index/companion.snapshot). Used when built from the current base; every merge rewrites it
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_VERIFY = _env_bool("SNAPSHOT_VERIFY", False)  # checksum every section at load
+
+# Compiled safety matcher: "on" screens queries and only calls the checker for
+# hazards; "shadow" (opt-in, for verifying a new pattern set) runs both on every
+# query and counts disagreements; "off" disables it
+SAFETY_MATCHER_MODE = os.getenv("SAFETY_MATCHER_MODE", "on").lower()
+
+# Emergency short-circuit: precomputed instructions for these verdicts, no retrieval/LLM wait
+EMERGENCY_SHORT_CIRCUIT = _env_bool("EMERGENCY_SHORT_CIRCUIT", True)
+EMERGENCY_SHORT_CIRCUIT_LEVELS = tuple(
+    level.strip() for level in os.getenv("EMERGENCY_SHORT_CIRCUIT_LEVELS", "emergency,danger").split(",") if level.strip()
+)
+
+# Admission control: per-stage concurrency, bounded FIFO queue, 503 + Retry-After when full
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+LLM_MAX_CONCURRENCY = _env_int("LLM_MAX_CONCURRENCY", 4)
+LLM_MAX_QUEUE = _env_int("LLM_MAX_QUEUE", 32)
+LLM_MAX_QUEUE_SECONDS = _env_float("LLM_MAX_QUEUE_SECONDS", 10.0)
+SEARCH_MAX_CONCURRENCY = _env_int("SEARCH_MAX_CONCURRENCY", 32)
+SEARCH_MAX_QUEUE = _env_int("SEARCH_MAX_QUEUE", 256)
+SEARCH_MAX_QUEUE_SECONDS = _env_float("SEARCH_MAX_QUEUE_SECONDS", 2.0)
+
+# Single-flight: concurrent identical /answer requests share one search + generation
+SINGLE_FLIGHT_ENABLED = _env_bool("SINGLE_FLIGHT_ENABLED", True)
+
+# Async LLM client (core/models/async_llm): comma-separated "<ollama|nim>:<model>" list, first is
+# the default. Empty keeps generation on CompanionAI.process_query in a worker thread.
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+NIM_BASE_URL = os.getenv("NIM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
+LLM_BACKEND_CONCURRENCY = _env_int("LLM_BACKEND_CONCURRENCY", 8)
+LLM_POOL_SIZE = _env_int("LLM_POOL_SIZE", 100)
+LLM_KEEPALIVE_SECONDS = _env_float("LLM_KEEPALIVE_SECONDS", 60.0)
+LLM_CONNECT_TIMEOUT = _env_float("LLM_CONNECT_TIMEOUT", 5.0)
+LLM_READ_TIMEOUT = _env_float("LLM_READ_TIMEOUT", 60.0)
+LLM_REQUEST_TIMEOUT = _env_float("LLM_REQUEST_TIMEOUT", 120.0)
+LLM_MAX_TOKENS = _env_int("LLM_MAX_TOKENS", 512)
+LLM_TEMPERATURE = _env_float("LLM_TEMPERATURE", 0.2)
+# How often a pending /answer checks whether its client went away
+DISCONNECT_POLL_SECONDS = _env_float("DISCONNECT_POLL_SECONDS", 0.5)
+# Hedging across LLM_BACKENDS: fire at the next backend when the first token is later than
+# this percentile of the primary's recent first-token latencies (fixed delay until warm)
+LLM_HEDGE_ENABLED = _env_bool("LLM_HEDGE_ENABLED", True)
+LLM_HEDGE_PERCENTILE = _env_float("LLM_HEDGE_PERCENTILE", 95.0)
+LLM_HEDGE_DELAY_SECONDS = _env_float("LLM_HEDGE_DELAY_SECONDS", 2.0)
+LLM_HEDGE_MIN_DELAY_SECONDS = _env_float("LLM_HEDGE_MIN_DELAY_SECONDS", 0.25)
+# Circuit breaker: skip a backend after this many consecutive failures, retry it after the reset
+LLM_BREAKER_FAILURES = _env_int("LLM_BREAKER_FAILURES", 3)
+LLM_BREAKER_RESET_SECONDS = _env_float("LLM_BREAKER_RESET_SECONDS", 30.0)
+
+# Metadata-filtered retrieval: restrict search to manuals matching the request's
+# brand / model / appliance_type, relaxing the filter when fewer chunks than this match (0 = k)
+SEARCH_FILTER_ENABLED = _env_bool("SEARCH_FILTER_ENABLED", True)
+SEARCH_FILTER_MIN_CANDIDATES = _env_int("SEARCH_FILTER_MIN_CANDIDATES", 0)
+
+# Hybrid retrieval: BM25 inverted index next to the FAISS index, fused with dense results (RRF).
+# A decisive lexical match (every query term, score and margin over partial matches) skips the encoder;
+# on /answer it is checked before the answer-cache embedding, so such queries bypass the cache.
+LEXICAL_ENABLED = _env_bool("LEXICAL_ENABLED", True)
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "faiss_index/bm25.npz")
+LEXICAL_FAST_PATH = _env_bool("LEXICAL_FAST_PATH", True)
+LEXICAL_FAST_PATH_MIN_SCORE = _env_float("LEXICAL_FAST_PATH_MIN_SCORE", 8.0)
+LEXICAL_FAST_PATH_MARGIN = _env_float("LEXICAL_FAST_PATH_MARGIN", 1.5)
+HYBRID_CANDIDATES = _env_int("HYBRID_CANDIDATES", 20)
+HYBRID_RRF_K = _env_int("HYBRID_RRF_K", 60)
+
+# Error-code fast path: a code in this table ("E3", "dE") for a known brand/appliance - as written,
+# or a swapped/misread spelling only one row can mean - is answered from it with manual page
+# citations (BM25 over the code), skipping dense retrieval and the LLM; ambiguous spellings are
+# passed to the LLM as a hint. Every row needs a `source` (manual and page it was taken from);
+# rows without one are skipped. Import rows with scripts/import_error_codes.py
+ERROR_CODE_FAST_PATH = _env_bool("ERROR_CODE_FAST_PATH", True)
+ERROR_CODE_TABLE_PATH = os.getenv("ERROR_CODE_TABLE_PATH", "data/error_codes.json")
+ERROR_CODE_CITATIONS = _env_int("ERROR_CODE_CITATIONS", 3)
+# /admin endpoints require it in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
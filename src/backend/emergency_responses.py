@@ -0,0 +1,127 @@
+"""
+Precomputed emergency responses for the short-circuit path: when the safety
+verdict is emergency/danger, /answer returns these within milliseconds
+instead of waiting for retrieval and the LLM. The manual-grounded answer is
+still available (POST /answer/detail, or later frames of /answer/stream).
+"""
+
+import re
+from typing import Dict, Iterable, Optional
+
+# Checked in order - the first hazard whose keywords appear wins. Keywords are whole
+# words; gas keywords describe a leak, since "gas dryer" / "gas range" only name the appliance
+HAZARDS = {
+    "gas": {
+        "keywords": (r"smell(?:s|ing)?\s+(?:of\s+|like\s+)?(?:gas|propane)", r"(?:gas|propane)\s+(?:smell|odou?r)s?",
+                     r"(?:gas|propane)\s+leak(?:s|ing)?", r"leak(?:s|ing)?\s+(?:gas|propane)", r"hiss(?:es|ing)?",
+                     r"rotten\s+eggs?", r"sul(?:f|ph)ur\w*"),
+        "title": "Possible gas leak",
+        "steps": (
+            "Do not switch any lights, appliances or phones on or off near the appliance, and do not light anything.",
+            "Leave the building now and take everyone (and pets) with you.",
+            "From outside, call your gas utility's emergency line or 911.",
+            "If it is safe to reach on the way out, turn the gas supply valve off.",
+            "Do not go back inside until the utility or fire department says it is safe."
+        )
+    },
+    "carbon_monoxide": {
+        "keywords": (r"carbon\s+monoxide", r"co\s+(?:alarm|detector)s?", r"headaches?.*dizz\w*",
+                     r"dizz\w*.*headaches?"),
+        "title": "Possible carbon monoxide exposure",
+        "steps": (
+            "Get everyone into fresh air immediately.",
+            "Call 911 - carbon monoxide poisoning needs medical attention even if symptoms ease.",
+            "Do not go back inside until the fire department has cleared the building.",
+            "Have the appliance and its venting inspected before using it again."
+        )
+    },
+    "fire": {
+        "keywords": (r"fires?", r"flames?", r"smoke", r"smoking", r"burning", r"explo(?:sion|ded|sive)"),
+        "title": "Fire or smoke",
+        "steps": (
+            "If there are flames you cannot immediately put out, leave the building and call 911.",
+            "If it is safe to do so, switch the appliance off or unplug it; for a stove or oven, turn the gas off.",
+            "Keep an oven or microwave door closed to starve a fire inside it.",
+            "Never use water on a grease or electrical fire - use a class K/ABC extinguisher or smother it.",
+            "Do not use the appliance again until it has been inspected."
+        )
+    },
+    "electrical": {
+        "keywords": (r"spark(?:s|ing|ed)?", r"arc(?:s|ing|ed)?", r"shock(?:ed|s)?", r"electrocut\w*",
+                     r"exposed\s+wires?", r"melt(?:ed|ing)\s+(?:cord|plug|outlet)s?"),
+        "title": "Electrical hazard",
+        "steps": (
+            "Do not touch the appliance, its cord or anything metal it is touching.",
+            "Switch it off at the circuit breaker; only unplug it if the plug and outlet are dry and undamaged.",
+            "If someone has been shocked, do not touch them while they are in contact with the source - "
+            "cut the power first, then call 911.",
+            "Do not use the appliance again until a qualified technician has checked it."
+        )
+    },
+    "water_electrical": {
+        "keywords": (r"flood(?:ed|ing|s)?", r"standing\s+water", r"water.*(?:outlet|plug|cord|wire)s?"),
+        "title": "Water near electricity",
+        "steps": (
+            "Do not step into standing water near a plugged-in appliance.",
+            "Switch the power off at the circuit breaker before touching anything.",
+            "Turn off the water supply valve to the appliance.",
+            "Call a technician before using the appliance again."
+        )
+    }
+}
+
+GENERIC_STEPS = {
+    "emergency": (
+        "Stop using the appliance and move everyone away from it.",
+        "If anyone is in danger, leave the building and call 911.",
+        "If it is safe to do so, switch the appliance off at the breaker or supply valve.",
+        "Do not use it again until a qualified technician has inspected it."
+    ),
+    "danger": (
+        "Stop using the appliance now.",
+        "If it is safe to do so, switch it off and disconnect it from power (and gas/water supply).",
+        "Keep people and pets away from it.",
+        "Have a qualified technician inspect it before using it again."
+    )
+}
+
+# One pattern per hazard, so a long match of one ("water ... outlet") can't hide another inside it
+_HAZARD_PATTERNS = {
+    name: re.compile("|".join(rf"\b(?:{keyword})\b" for keyword in hazard["keywords"]), re.IGNORECASE)
+    for name, hazard in HAZARDS.items()
+}
+
+
+def _render(title: str, steps: Iterable[str], level: str) -> str:
+    header = "EMERGENCY" if level == "emergency" else "SAFETY WARNING"
+    lines = [f"{header}: {title}", ""]
+    lines.extend(f"{i}. {step}" for i, step in enumerate(steps, 1))
+    lines.extend(["", "Detailed guidance from your appliance manual follows once it is ready."])
+    return "\n".join(lines)
+
+
+# Rendered once at import - the short-circuit path only does a dict lookup
+RESPONSES: Dict[str, Dict[str, str]] = {
+    level: {
+        **{name: _render(hazard["title"], hazard["steps"], level) for name, hazard in HAZARDS.items()},
+        "general": _render("Stop using the appliance", GENERIC_STEPS[level], level)
+    }
+    for level in ("emergency", "danger")
+}
+
+
+def classify_hazard(query: str) -> str:
+    """Hazard name for a flagged query (the highest-priority keyword that appears), else "general" """
+    for name, pattern in _HAZARD_PATTERNS.items():
+        if pattern.search(query):
+            return name
+    return "general"
+
+
+def emergency_response(query: str, safety_level: str) -> Optional[Dict[str, str]]:
+    """{"hazard", "answer"} for emergency/danger verdicts, else None"""
+    responses = RESPONSES.get(safety_level)
+    if responses is None:
+        return None
+    hazard = classify_hazard(query)
+    return {"hazard": hazard, "answer": responses[hazard]}
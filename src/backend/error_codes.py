@@ -0,0 +1,357 @@
+"""
+Error-code fast path: questions like "Samsung WF45 E3" or "dE code" are
+answered straight from the error-code table (ErrorCodeInfo records) in
+milliseconds instead of going through retrieval and the LLM.
+
+Every row cites where it came from (`source`: the manual file and page, or
+the manufacturer document); rows without one are not loaded. Rows are
+imported with scripts/import_error_codes.py. A code matched exactly as
+written is answered from the table, and so is a swapped or misread spelling
+when every reading of it points at the same row. A spelling that could mean
+two rows is passed to the LLM as a hint next to the retrieved manual pages.
+
+Entries are keyed by normalized (brand, appliance type, code). Lookups also
+accept the ways codes get written or misread: "E-3", "3E" for "E3", and the
+OCR-style O/0, I/1, S/5, B/8 confusions. The exact code always wins over a
+variant, so "3E" still finds a brand's own 3E entry before its E3 one.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.retrieval.filters import appliance_in_text, normalize_appliance_type, normalize_facet
+
+logger = logging.getLogger(__name__)
+
+# Characters OCR (and people reading a 7-segment display) mix up
+OCR_CONFUSIONS = {"O": "0", "0": "O", "I": "1", "1": "I", "S": "5", "5": "S", "B": "8", "8": "B"}
+
+# Words that mark a letters-only token ("dE", "he") as a code rather than a word
+CODE_CONTEXT_WORDS = frozenset("""
+code codes error errors err fault display displays displayed showing shows shown flashing blinking
+says saying reads reading message light lights
+""".split())
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+(?:-[A-Za-z0-9]+)?")
+_LETTERS_DIGITS = re.compile(r"^([A-Z]+)(\d+)$")
+_DIGITS_LETTERS = re.compile(r"^(\d+)([A-Z]+)$")
+
+
+@dataclass(frozen=True)
+class ErrorCodeInfo:
+    """One table row (the ErrorCodeInfo fields of the architecture doc plus aliases and source)"""
+    code: str
+    brand: str
+    appliance_type: str
+    description: str
+    safety_level: str = "safe"
+    immediate_actions: Tuple[str, ...] = ()
+    troubleshooting_steps: Tuple[str, ...] = ()
+    common_causes: Tuple[str, ...] = ()
+    prevention_tips: Tuple[str, ...] = ()
+    when_to_call_professional: Tuple[str, ...] = ()
+    estimated_repair_cost: Optional[str] = None
+    difficulty_level: str = "beginner"
+    aliases: Tuple[str, ...] = ()
+    source: Optional[str] = None
+    
+    @classmethod
+    def from_record(cls, record: Any) -> "ErrorCodeInfo":
+        """From a table dict or any object with the ErrorCodeInfo attributes"""
+        if not isinstance(record, dict):
+            record = {f.name: getattr(record, f.name) for f in fields(cls) if hasattr(record, f.name)}
+        values = {}
+        for f in fields(cls):
+            if f.name not in record or record[f.name] is None:
+                continue
+            value = record[f.name]
+            if isinstance(f.default, tuple):
+                value = (value,) if isinstance(value, str) else tuple(str(item) for item in value)
+            elif f.name == "safety_level":
+                # SafetyLevel enums serialize by value
+                value = str(getattr(value, "value", value))
+            values[f.name] = value
+        return cls(**values)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: list(getattr(self, f.name)) if isinstance(f.default, tuple) else getattr(self, f.name)
+                for f in fields(self) if f.name != "aliases"}
+    
+    def render(self, written: Optional[str] = None) -> str:
+        """Answer text for the fast path; `written` is the code as the user typed it"""
+        shown = f" (shown as {written})" if written and normalize_code(written) != normalize_code(self.code) else ""
+        lines = [f"{self.brand} {self.appliance_type.replace('_', ' ')} error {self.code}{shown}: {self.description}"]
+        sections = (
+            ("Do this now", self.immediate_actions),
+            ("Troubleshooting", self.troubleshooting_steps),
+            ("Common causes", self.common_causes),
+            ("Call a professional if", self.when_to_call_professional),
+            ("Prevention", self.prevention_tips)
+        )
+        for title, items in sections:
+            if not items:
+                continue
+            lines.append("")
+            lines.append(f"{title}:")
+            if title == "Troubleshooting":
+                lines.extend(f"{i}. {item}" for i, item in enumerate(items, 1))
+            else:
+                lines.extend(f"- {item}" for item in items)
+        if self.estimated_repair_cost:
+            lines.append("")
+            lines.append(f"Estimated repair cost: {self.estimated_repair_cost} (difficulty: {self.difficulty_level})")
+        if self.source:
+            lines.append("")
+            lines.append(f"Source: {self.source}")
+        return "\n".join(lines)
+    
+    def hint(self, written: str) -> str:
+        """Prompt note for a code that only matched as a variant: the LLM weighs it against the manual"""
+        return (f"(The error-code table lists {self.brand} {self.appliance_type.replace('_', ' ')} error "
+                f"{self.code} - {self.description} - which \"{written}\" may be a misreading of. "
+                f"Only rely on it if the manual excerpts agree.)")
+
+
+def normalize_code(code: Any) -> str:
+    """"e-3" / "E 3" / "dE" -> "E3" / "E3" / "DE" """
+    return re.sub(r"[^0-9A-Z]+", "", str(code).upper())
+
+
+def code_variants(code: str) -> List[str]:
+    """
+    The normalized code, then its letter/digit swap ("3E" <-> "E3"), then
+    single-character OCR confusions of both - most to least likely
+    """
+    code = normalize_code(code)
+    variants = [code]
+    match = _LETTERS_DIGITS.match(code) or _DIGITS_LETTERS.match(code)
+    if match:
+        variants.append(match.group(2) + match.group(1))
+    for base in list(variants):
+        for i, char in enumerate(base):
+            swap = OCR_CONFUSIONS.get(char)
+            if swap:
+                variants.append(base[:i] + swap + base[i + 1:])
+    return list(dict.fromkeys(variants))
+
+
+@dataclass(frozen=True)
+class ErrorCodeMatch:
+    """A recognized code in a query and the entry it resolved to"""
+    info: ErrorCodeInfo
+    written: str
+    exact: bool
+    # No other reading of `written` names a different entry for these facets
+    unambiguous: bool = True
+    
+    @property
+    def answerable(self) -> bool:
+        return self.exact or self.unambiguous
+
+
+class ErrorCodeTable:
+    """
+    (brand, appliance type, code) -> ErrorCodeInfo, plus a variant map from
+    every accepted spelling to the codes it can mean, so recognizing and
+    resolving a code are dict lookups
+    """
+    
+    def __init__(self, entries: Iterable[ErrorCodeInfo] = (), source: Optional[Path] = None):
+        self.source = source
+        self.loaded_at: Optional[float] = None
+        self._by_key: Dict[Tuple[str, str, str], ErrorCodeInfo] = {}
+        self._by_code: Dict[str, List[ErrorCodeInfo]] = {}
+        # spelling -> ((code, exact), ...), most likely reading first
+        self._variants: Dict[str, Tuple[Tuple[str, bool], ...]] = {}
+        self.brands: Dict[str, str] = {}
+        self.appliance_types: Dict[str, str] = {}
+        self._build(entries)
+    
+    @classmethod
+    def load(cls, path: Path) -> "ErrorCodeTable":
+        """From a JSON file: a list of ErrorCodeInfo records, or {"error_codes": [...]}"""
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records = data.get("error_codes", []) if isinstance(data, dict) else data
+        entries = []
+        for record in records:
+            try:
+                info = ErrorCodeInfo.from_record(record)
+            except Exception as e:
+                logger.warning(f"Skipping error code record {record!r}: {str(e)}")
+                continue
+            if not info.source:
+                logger.warning(f"Skipping error code {info.brand}/{info.appliance_type}/{info.code}: no source")
+                continue
+            entries.append(info)
+        table = cls(entries, source=path)
+        table.loaded_at = time.time()
+        return table
+    
+    def _build(self, entries: Iterable[ErrorCodeInfo]):
+        # spelling -> code -> rank of that spelling among the code's variants (0 = exact)
+        spellings: Dict[str, Dict[str, int]] = {}
+        for info in entries:
+            brand = normalize_facet(info.brand)
+            appliance = normalize_appliance_type(info.appliance_type)
+            self.brands.setdefault(brand, info.brand)
+            self.appliance_types.setdefault(appliance, info.appliance_type)
+            
+            for written in (info.code, *info.aliases):
+                code = normalize_code(written)
+                if not code:
+                    continue
+                key = (brand, appliance, code)
+                if key in self._by_key and self._by_key[key] is not info:
+                    logger.warning(f"Duplicate error code {info.brand}/{info.appliance_type}/{written}, keeping the first")
+                    continue
+                self._by_key[key] = info
+                self._by_code.setdefault(code, []).append(info)
+                for rank, variant in enumerate(code_variants(code)):
+                    known = spellings.setdefault(variant, {})
+                    known[code] = min(known.get(code, rank), rank)
+        
+        self._variants = {
+            spelling: tuple((code, rank == 0) for code, rank in sorted(codes.items(), key=lambda item: item[1]))
+            for spelling, codes in spellings.items()
+        }
+    
+    @property
+    def size(self) -> int:
+        return len({id(info) for info in self._by_key.values()})
+    
+    def entries(self) -> List[ErrorCodeInfo]:
+        """Each row once, in load order"""
+        return list({id(info): info for info in self._by_key.values()}.values())
+    
+    def get(self, brand: str, appliance_type: str, code: str) -> Optional[ErrorCodeInfo]:
+        """Exact key lookup"""
+        return self._by_key.get((normalize_facet(brand), normalize_appliance_type(appliance_type), normalize_code(code)))
+    
+    def _entries(self, code: str, brand_key: str, appliance_key: str) -> List[ErrorCodeInfo]:
+        if brand_key and appliance_key:
+            info = self._by_key.get((brand_key, appliance_key, code))
+            return [info] if info is not None else []
+        return list({
+            id(info): info for info in self._by_code.get(code, ())
+            if (not brand_key or normalize_facet(info.brand) == brand_key)
+            and (not appliance_key or normalize_appliance_type(info.appliance_type) == appliance_key)
+        }.values())
+    
+    def resolve(self, code: str, brand: Optional[str] = None,
+                appliance_type: Optional[str] = None) -> Optional[Tuple[ErrorCodeInfo, bool, bool]]:
+        """
+        The entry a written code means for this brand / appliance type,
+        whether it matched exactly, and whether it is unambiguous (no other
+        reading of the code names a different entry). Unknown facets widen
+        the search, but an entry is only returned when the most likely
+        reading names exactly one - and without a brand, only for the code
+        exactly as written. An appliance type the table has no entries for
+        never borrows another appliance's code.
+        """
+        brand_key = normalize_facet(brand) if brand else ""
+        appliance_key = normalize_appliance_type(appliance_type) if appliance_type else ""
+        if appliance_key and appliance_key not in self.appliance_types:
+            return None
+        
+        found = None
+        readings = set()
+        for candidate, exact in self._variants.get(normalize_code(code), ()):
+            if not (exact or brand_key):
+                break
+            entries = self._entries(candidate, brand_key, appliance_key)
+            if found is None and entries:
+                if len(entries) > 1:
+                    return None
+                found = (entries[0], exact)
+            readings.update(id(info) for info in entries)
+        if found is None:
+            return None
+        info, exact = found
+        return info, exact, len(readings) == 1
+    
+    def _infer_facets(self, words: Sequence[str], text: str) -> Tuple[Optional[str], Optional[str]]:
+        # The appliance comes from the catalogue's vocabulary, not the table's keys, so a
+        # "microwave" the table knows nothing about still narrows the lookup (to nothing)
+        brand = next((self.brands[key] for key in (normalize_facet(word) for word in words) if key in self.brands), None)
+        return brand, appliance_in_text(text)
+    
+    def recognize(self, query: str, brand: Optional[str] = None,
+                  appliance_type: Optional[str] = None) -> Optional[ErrorCodeMatch]:
+        """
+        The first known code in the query, resolved against the request's
+        brand / appliance type (or ones named in the query). Letters-only
+        codes need an uppercase letter or a nearby "code"/"error"-type word,
+        so "he" or "de" in a sentence are left alone.
+        """
+        if not self._variants:
+            return None
+        words = _TOKEN.findall(query)
+        lowered = [word.lower() for word in words]
+        if not (brand and appliance_type):
+            inferred_brand, inferred_appliance = self._infer_facets(words, " ".join(lowered))
+            brand = brand or inferred_brand
+            appliance_type = appliance_type or inferred_appliance
+        
+        for i, word in enumerate(words):
+            code = normalize_code(word)
+            if code not in self._variants or normalize_facet(word) in self.brands:
+                continue
+            if code.isalpha():
+                nearby = lowered[max(0, i - 2):i] + lowered[i + 1:i + 3]
+                if word.islower() and not CODE_CONTEXT_WORDS.intersection(nearby):
+                    continue
+            resolved = self.resolve(code, brand, appliance_type)
+            if resolved:
+                info, exact, unambiguous = resolved
+                return ErrorCodeMatch(info=info, written=word, exact=exact, unambiguous=unambiguous)
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.size,
+            "keys": len(self._by_key),
+            "spellings": len(self._variants),
+            "brands": sorted(self.brands.values()),
+            "source": str(self.source) if self.source else None,
+            "loaded_at": self.loaded_at
+        }
+
+
+class ErrorCodeIndex:
+    """The serving table, swapped whole on reload so lookups never see a half-built one"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.table = ErrorCodeTable()
+        self.hits = 0
+        self.hints = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+    
+    def reload(self) -> Dict[str, Any]:
+        with self._lock:
+            table = ErrorCodeTable.load(self.path)
+            self.table = table
+            self.reloads += 1
+        logger.info(f"Error code table: {table.size} entries, {len(table.brands)} brands from {self.path}")
+        return table.stats()
+    
+    def recognize(self, query: str, brand: Optional[str] = None,
+                  appliance_type: Optional[str] = None) -> Optional[ErrorCodeMatch]:
+        match = self.table.recognize(query, brand, appliance_type)
+        if match and match.answerable:
+            self.hits += 1
+        elif match:
+            self.hints += 1
+        return match
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.table.stats(), "hits": self.hits, "hints": self.hints, "reloads": self.reloads}
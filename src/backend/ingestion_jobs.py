@@ -0,0 +1,287 @@
+"""
+Ingestion job queue: manuals are parsed and embedded by worker processes
+(backend/ingestion_worker.py) so PDF parsing never competes with query
+traffic for this process's CPU/GIL. The serving process only publishes the
+finished vectors into the index.
+
+Each job lives in <jobs_root>/<job_id>/ with a job.json that the worker
+rewrites atomically as it progresses; jobs that were not finished when the
+server stopped are resumed from their checkpoint on the next start. A job
+that fails drops its artifacts (uploaded PDF, partial outputs) right away;
+finished job directories expire after `retention_seconds`.
+
+With several API worker processes only one (the index writer) dispatches;
+the others are created with dispatch=False and just write queued jobs, which
+the dispatching process picks up on its next resume_pending() sweep.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = "job.json"
+CHUNKS_FILE = "chunks.jsonl"
+THROTTLE_FILE = "THROTTLE"
+
+# queued -> parsing -> embedding -> embedded -> completed | failed
+TERMINAL_STATUSES = ("completed", "failed", "duplicate")
+
+# A job directory without a readable job.json this old is not mid-submit (another process) but lost
+LOST_JOB_GRACE_SECONDS = 300.0
+
+
+def save_job(job_dir: Path, job: Dict[str, Any]):
+    """Atomically rewrite job.json"""
+    job["updated_at"] = time.time()
+    tmp = job_dir / (JOB_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    os.replace(tmp, job_dir / JOB_FILE)
+
+
+def load_job(job_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(job_dir / JOB_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_job_outputs(job_dir: Path, job: Dict[str, Any]):
+    """Delete a finished job's uploaded PDF and worker outputs; job.json stays for status queries"""
+    outputs = [job_dir / CHUNKS_FILE, *job_dir.glob("emb_*.npy")]
+    if job.get("path"):
+        outputs.append(Path(job["path"]))
+    for output in outputs:
+        try:
+            output.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"Could not remove ingestion artifact {output}: {str(e)}")
+
+
+def load_job_outputs(job_dir: Path):
+    """Chunk records and their embeddings (row-aligned) written by the worker"""
+    records = []
+    with open(job_dir / CHUNKS_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    
+    batches = sorted(job_dir.glob("emb_*.npy"))
+    embeddings = np.vstack([np.load(batch) for batch in batches]) if batches else np.zeros((0, 0), np.float32)
+    return records, embeddings
+
+
+def _lost_job(job_id: str) -> Dict[str, Any]:
+    """Stand-in record for a job whose job.json is gone - no upload or content hash to act on"""
+    return {"job_id": job_id, "filename": None, "path": None, "content_hash": None, "errors": [],
+            "created_at": time.time()}
+
+
+class IngestionQueue:
+    """Dispatches jobs to at most `max_workers` worker processes"""
+    
+    def __init__(self, jobs_root: Path, publish: Callable[[Dict[str, Any], List[Dict[str, Any]], np.ndarray], int],
+                 max_workers: int = 1, should_throttle: Optional[Callable[[], bool]] = None,
+                 throttle_poll: float = 1.0, dispatch: bool = True, retention_seconds: float = 7 * 86400.0):
+        self.jobs_root = Path(jobs_root)
+        self.jobs_root.mkdir(parents=True, exist_ok=True)
+        self.publish = publish
+        self.should_throttle = should_throttle or (lambda: False)
+        self.throttle_poll = throttle_poll
+        self.dispatch = dispatch
+        self.retention_seconds = retention_seconds
+        
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Each running job as it was started - what's left to report if its job.json goes missing
+        self._started: Dict[str, Dict[str, Any]] = {}
+        self._monitor: Optional[asyncio.Task] = None
+        self.throttled = False
+    
+    def _job_dir(self, job_id: str) -> Path:
+        return self.jobs_root / job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        # job_id comes from the URL - never let it escape jobs_root
+        if not job_id.isalnum():
+            return None
+        return load_job(self._job_dir(job_id))
+    
+    @property
+    def throttle_flag(self) -> Path:
+        return self.jobs_root / THROTTLE_FILE
+    
+    @property
+    def depth(self) -> int:
+        """Jobs submitted and not finished yet"""
+        return sum(1 for task in self._tasks.values() if not task.done())
+    
+    def submit(self, path: Path, filename: str, content_hash: str,
+               on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "path": str(path),
+            "content_hash": content_hash,
+            "status": "queued",
+            "pages_total": None,
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_published": 0,
+            "errors": [],
+            "created_at": time.time()
+        }
+        save_job(job_dir, job)
+        if self.dispatch:
+            self._start(job, on_done)
+        return job
+    
+    def resume_pending(self, on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        """
+        Start jobs left unfinished (or queued by another process); returns how
+        many. Also fails jobs whose job.json was lost and expires old ones.
+        """
+        if not self.dispatch:
+            return 0
+        resumed = 0
+        now = time.time()
+        for job_dir in sorted(self.jobs_root.iterdir()):
+            if not job_dir.is_dir() or job_dir.name in self._tasks:
+                continue
+            job = load_job(job_dir)
+            if job is None:
+                if now - job_dir.stat().st_mtime > LOST_JOB_GRACE_SECONDS:
+                    self._fail(job_dir, _lost_job(job_dir.name), "job.json missing or unreadable")
+            elif job["status"] not in TERMINAL_STATUSES:
+                logger.info(f"Starting ingestion job {job['job_id']} ({job['filename']}) from {job['status']}")
+                self._start(job, on_done)
+                resumed += 1
+            elif now - job.get("updated_at", now) > self.retention_seconds:
+                remove_job_outputs(job_dir, job)
+                shutil.rmtree(job_dir, ignore_errors=True)
+        return resumed
+    
+    def _start(self, job: Dict[str, Any], on_done):
+        if self._monitor is None:
+            self._monitor = asyncio.get_running_loop().create_task(self._throttle_monitor())
+        self._started[job["job_id"]] = job
+        self._tasks[job["job_id"]] = asyncio.get_running_loop().create_task(self._run(job["job_id"], on_done))
+    
+    def _fail(self, job_dir: Path, job: Dict[str, Any], reason: str):
+        """Record a terminal failure and drop the job's artifacts - nothing will resume it"""
+        job["status"] = "failed"
+        job.setdefault("errors", []).append(reason)
+        job["failed_at"] = time.time()
+        save_job(job_dir, job)
+        remove_job_outputs(job_dir, job)
+        logger.error(f"Ingestion job {job['job_id']} failed: {reason}")
+    
+    def _load_or_fail(self, job_dir: Path, job_id: str) -> Dict[str, Any]:
+        """job.json, or - when it is gone or corrupt - the job as last known, marked failed"""
+        job = load_job(job_dir)
+        if job is None:
+            job = {**(self._started.get(job_id) or _lost_job(job_id)), "errors": []}
+            self._fail(job_dir, job, "job.json missing or unreadable")
+        return job
+    
+    async def _throttle_monitor(self):
+        """Keep the THROTTLE flag file in sync with query latency; workers pause while it exists"""
+        flag = self.throttle_flag
+        while True:
+            try:
+                throttled = bool(self.should_throttle())
+            except Exception:
+                throttled = False
+            if throttled != self.throttled:
+                logger.info(f"Ingestion {'throttled' if throttled else 'resumed'} (query latency)")
+            self.throttled = throttled
+            if throttled:
+                flag.touch()
+            elif flag.exists():
+                flag.unlink()
+            await asyncio.sleep(self.throttle_poll)
+    
+    async def _run(self, job_id: str, on_done):
+        job_dir = self._job_dir(job_id)
+        async with self._slots:
+            # Don't start new work while queries are suffering
+            while self.throttled:
+                await asyncio.sleep(self.throttle_poll)
+            
+            job = None
+            process = None
+            try:
+                job = self._load_or_fail(job_dir, job_id)
+                if job["status"] not in ("embedded", "failed"):
+                    process = await asyncio.create_subprocess_exec(
+                        sys.executable, str(Path(__file__).with_name("ingestion_worker.py")),
+                        str(job_dir), str(self.throttle_flag)
+                    )
+                    await process.wait()
+                    job = self._load_or_fail(job_dir, job_id)
+                    if job["status"] == "failed":
+                        remove_job_outputs(job_dir, job)
+                    elif process.returncode != 0:
+                        self._fail(job_dir, job, f"worker exited with code {process.returncode}")
+                
+                if job["status"] == "embedded":
+                    records, embeddings = await asyncio.to_thread(load_job_outputs, job_dir)
+                    # A publish retried after a crash legitimately adds nothing the second time
+                    retried = job.get("publish_started", False)
+                    job["publish_started"] = True
+                    save_job(job_dir, job)
+                    added = await asyncio.to_thread(self.publish, job, records, embeddings)
+                    job["chunks_published"] = added or (len(records) if retried else 0)
+                    if records and added == 0 and not retried:
+                        # Every chunk id was already indexed: nothing of this upload became searchable
+                        self._fail(job_dir, job,
+                                   f"none of {len(records)} chunks were added (chunk ids already indexed)")
+                    else:
+                        job["status"] = "completed"
+                        job["completed_at"] = time.time()
+                        save_job(job_dir, job)
+                        logger.info(f"Ingestion job {job_id}: {job['filename']} published {added} chunks")
+                        
+                        # Outputs now live in the index
+                        remove_job_outputs(job_dir, job)
+            
+            except asyncio.CancelledError:
+                # Shutting down: stop the worker, its checkpoint is resumed next start
+                if process is not None and process.returncode is None:
+                    process.terminate()
+                on_done = None
+                raise
+            
+            except Exception as e:
+                job = load_job(job_dir) or job or {**(self._started.get(job_id) or _lost_job(job_id)), "errors": []}
+                self._fail(job_dir, job, str(e))
+            
+            finally:
+                self._tasks.pop(job_id, None)
+                self._started.pop(job_id, None)
+                if on_done:
+                    on_done(job)
+    
+    async def shutdown(self):
+        """Stop dispatching; running workers keep their checkpoints and resume next start"""
+        if self._monitor:
+            self._monitor.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Ingestion worker process: parses and embeds one manual for an ingestion job
+
+Usage: python ingestion_worker.py <job_dir> <throttle_flag_path>
+
+Progress (pages parsed, chunks embedded, errors) is checkpointed to
+<job_dir>/job.json after every page / embedding batch, so a killed worker
+resumes where it stopped. The worker pauses while <throttle_flag_path>
+exists, i.e. while the API reports elevated query latency.
+"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from backend import config
+from backend.ingestion_jobs import CHUNKS_FILE, load_job, save_job
+from backend.query_encoder import encode_queries
+from core.retrieval.chunking import chunk_page
+
+THROTTLE_SLEEP = 0.5
+
+
+def wait_if_throttled(flag: Path):
+    while flag.exists():
+        time.sleep(THROTTLE_SLEEP)
+
+
+def load_parsed_chunks(chunks_path: Path):
+    """Chunks already written, dropping a torn last line from a crash mid-write"""
+    if not chunks_path.exists():
+        return []
+    
+    records = []
+    valid_bytes = 0
+    with open(chunks_path, "rb") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_bytes += len(line)
+    
+    with open(chunks_path, "r+b") as f:
+        f.truncate(valid_bytes)
+    return records
+
+
+def parse(job_dir: Path, job: dict, flag: Path) -> list:
+    from PyPDF2 import PdfReader
+    
+    chunks_path = job_dir / CHUNKS_FILE
+    records = load_parsed_chunks(chunks_path)
+    
+    # Resume after the last checkpointed page; chunks of a page that was being
+    # written when the worker died are dropped and that page is parsed again
+    pages_done = job["pages_parsed"]
+    complete = [record for record in records if record["page"] <= pages_done]
+    if len(complete) != len(records):
+        with open(chunks_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in complete))
+    records = complete
+    
+    reader = PdfReader(job["path"])
+    job["pages_total"] = len(reader.pages)
+    job["status"] = "parsing"
+    save_job(job_dir, job)
+    
+    with open(chunks_path, "a", encoding="utf-8") as out:
+        for page_index in range(pages_done, len(reader.pages)):
+            wait_if_throttled(flag)
+            page_number = page_index + 1
+            
+            try:
+                text = reader.pages[page_index].extract_text() or ""
+            except Exception as e:
+                job["errors"].append(f"page {page_number}: {str(e)}")
+                text = ""
+            
+            # Namespaced by content hash: a different PDF under a known filename must not reuse its ids
+            page_chunks = chunk_page(text, page_number, len(records), job["filename"],
+                                     config.CHUNK_WORDS, config.CHUNK_OVERLAP_WORDS,
+                                     namespace=job.get("content_hash"))
+            if page_chunks:
+                out.write("".join(json.dumps(chunk) + "\n" for chunk in page_chunks))
+                out.flush()
+                os.fsync(out.fileno())
+                records.extend(page_chunks)
+            
+            job["pages_parsed"] = page_number
+            job["chunks_total"] = len(records)
+            save_job(job_dir, job)
+    
+    return records
+
+
+def embed(job_dir: Path, job: dict, records: list, flag: Path):
+    from sentence_transformers import SentenceTransformer
+    
+    job["status"] = "embedding"
+    save_job(job_dir, job)
+    
+    encoder = SentenceTransformer(config.EMBEDDING_MODEL)
+    batch_size = config.INGEST_EMBED_BATCH
+    
+    # Batches are saved as emb_<first row>.npy; resume after the last complete one
+    start = sum(np.load(batch, mmap_mode="r").shape[0] for batch in sorted(job_dir.glob("emb_*.npy")))
+    for first in range(start, len(records), batch_size):
+        wait_if_throttled(flag)
+        texts = [record["text"] for record in records[first:first + batch_size]]
+        vectors = encode_queries(encoder, texts)
+        
+        tmp = job_dir / f"emb_{first:09d}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp, job_dir / f"emb_{first:09d}.npy")
+        
+        job["chunks_embedded"] = first + len(texts)
+        save_job(job_dir, job)
+
+
+def main(job_dir: Path, flag: Path) -> int:
+    job = load_job(job_dir)
+    if job is None:
+        print(f"No job at {job_dir}", file=sys.stderr)
+        return 1
+    
+    # Yield the CPU to the serving process
+    if hasattr(os, "nice"):
+        os.nice(config.INGEST_NICE)
+    
+    try:
+        records = parse(job_dir, job, flag)
+        embed(job_dir, job, records, flag)
+        job["status"] = "embedded"
+        save_job(job_dir, job)
+        return 0
+    except Exception as e:
+        job["status"] = "failed"
+        job["errors"].append(str(e))
+        save_job(job_dir, job)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(Path(sys.argv[1]), Path(sys.argv[2])))
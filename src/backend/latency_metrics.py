@@ -0,0 +1,151 @@
+"""
+Fixed-memory streaming latency histograms with sliding-window percentiles
+
+Each stage keeps log-bucketed counts (about 9% relative error per bucket) in a
+ring of short time slices, so p50/p95/p99/max over 1m/5m/1h windows cost a
+sum over a few rows instead of a pass over every stored request.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Bucket layout: 8 buckets per power of two from 100us up to ~15 minutes
+MIN_LATENCY = 1e-4
+BUCKETS_PER_OCTAVE = 8
+NUM_BUCKETS = BUCKETS_PER_OCTAVE * 24
+
+SLICE_SECONDS = 10
+NUM_SLICES = 360  # 1 hour of history
+
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_index(seconds: float) -> int:
+    if seconds <= MIN_LATENCY:
+        return 0
+    index = int(math.log2(seconds / MIN_LATENCY) * BUCKETS_PER_OCTAVE) + 1
+    return min(index, NUM_BUCKETS - 1)
+
+
+def bucket_upper_bound(index: int) -> float:
+    return MIN_LATENCY * 2 ** (index / BUCKETS_PER_OCTAVE)
+
+
+class StageHistogram:
+    """Sliding-window + all-time latency histogram for one stage"""
+    
+    def __init__(self):
+        self.slices = np.zeros((NUM_SLICES, NUM_BUCKETS), dtype=np.uint32)
+        self.slice_max = np.zeros(NUM_SLICES, dtype=np.float64)
+        self.slice_epoch = np.full(NUM_SLICES, -1, dtype=np.int64)
+        
+        self.total_counts = np.zeros(NUM_BUCKETS, dtype=np.uint64)
+        self.total_count = 0
+        self.total_sum = 0.0
+        self.total_max = 0.0
+    
+    def _slot(self, epoch: int) -> int:
+        slot = epoch % NUM_SLICES
+        if self.slice_epoch[slot] != epoch:
+            # Slot last held data from an hour ago - recycle it
+            self.slices[slot] = 0
+            self.slice_max[slot] = 0.0
+            self.slice_epoch[slot] = epoch
+        return slot
+    
+    def record(self, seconds: float, now: float):
+        slot = self._slot(int(now // SLICE_SECONDS))
+        self.slices[slot, bucket_index(seconds)] += 1
+        if seconds > self.slice_max[slot]:
+            self.slice_max[slot] = seconds
+        
+        self.total_counts[bucket_index(seconds)] += 1
+        self.total_count += 1
+        self.total_sum += seconds
+        if seconds > self.total_max:
+            self.total_max = seconds
+    
+    def window(self, seconds: int, now: float) -> Dict[str, float]:
+        """Percentiles over the last `seconds` (rounded up to whole slices)"""
+        current = int(now // SLICE_SECONDS)
+        oldest = current - math.ceil(seconds / SLICE_SECONDS) + 1
+        live = (self.slice_epoch >= oldest) & (self.slice_epoch <= current)
+        
+        counts = self.slices[live].sum(axis=0, dtype=np.uint64)
+        count = int(counts.sum())
+        summary = {"count": count, "max": float(self.slice_max[live].max()) if count else 0.0}
+        
+        cumulative = np.cumsum(counts)
+        for p in PERCENTILES:
+            if count:
+                index = int(np.searchsorted(cumulative, math.ceil(count * p / 100)))
+                summary[f"p{p}"] = min(bucket_upper_bound(index), summary["max"])
+            else:
+                summary[f"p{p}"] = 0.0
+        return summary
+    
+    @property
+    def mean(self) -> float:
+        return self.total_sum / self.total_count if self.total_count else 0.0
+    
+    def cumulative(self, bounds: Iterable[float]) -> List[Tuple[float, int]]:
+        """All-time (le, count) pairs for coarser exposition buckets"""
+        upper = np.array([bucket_upper_bound(i) for i in range(NUM_BUCKETS)])
+        cumulative = np.cumsum(self.total_counts)
+        pairs = []
+        for bound in bounds:
+            covered = int(np.searchsorted(upper, bound, side="right"))
+            pairs.append((bound, int(cumulative[covered - 1]) if covered else 0))
+        return pairs
+
+
+class LatencyRecorder:
+    """Per-stage histograms (total, safety, search, llm, ...)"""
+    
+    def __init__(self, stages: Iterable[str] = ("total", "safety", "search", "llm")):
+        self.stages = {stage: StageHistogram() for stage in stages}
+        self._lock = threading.Lock()
+    
+    def record(self, stage: str, seconds: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.record(seconds, now)
+    
+    def count(self, stage: str = "total") -> int:
+        histogram = self.stages.get(stage)
+        return histogram.total_count if histogram else 0
+    
+    def mean(self, stage: str) -> float:
+        histogram = self.stages.get(stage)
+        return histogram.mean if histogram else 0.0
+    
+    def window(self, stage: str, seconds: int) -> Dict[str, float]:
+        """{count, p50, p95, p99, max} for one stage over the last `seconds`"""
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                return {"count": 0, "max": 0.0, **{f"p{p}": 0.0 for p in PERCENTILES}}
+            return histogram.window(seconds, time.time())
+    
+    def histograms(self) -> Dict[str, StageHistogram]:
+        return dict(self.stages)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{stage: {window: {count, p50, p95, p99, max}}} for every window"""
+        now = time.time()
+        with self._lock:
+            return {
+                stage: {
+                    name: histogram.window(seconds, now)
+                    for name, seconds in WINDOWS.items()
+                }
+                for stage, histogram in self.stages.items()
+            }
@@ -0,0 +1,219 @@
+"""
+Non-blocking log pipeline: request handlers only format a record and enqueue
+it; a background thread batches records to disk, rotates by size/time and
+optionally gzips rotated files. When the queue is full records are dropped
+(and counted) rather than stalling the event loop on a slow disk. Console
+output goes through the same kind of queue (BackgroundStreamWriter).
+
+A failed rotation (disk full, permissions) is reported on stderr and
+counted; the writer keeps appending to the live file and retries later.
+"""
+
+import gzip
+import logging
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, TextIO, Tuple
+
+
+class BackgroundLogWriter:
+    """
+    Single writer thread for one log file. backup_count rotated files are
+    kept; 0 keeps none, so rotation just starts the file over.
+    """
+    
+    def __init__(self, path: str, max_queue: int = 10000, flush_interval: float = 1.0,
+                 flush_batch: int = 256, max_bytes: int = 50 * 1024 * 1024,
+                 rotate_seconds: float = 86400.0, backup_count: int = 7, compress: bool = True,
+                 rotate_retry_seconds: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = max(0, backup_count)
+        self.compress = compress
+        self.rotate_retry_seconds = rotate_retry_seconds
+        
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.rotation_errors = 0
+        self.last_error: Optional[str] = None
+        self._next_rotation_attempt = 0.0
+        
+        self._file = self._open()
+        self._opened_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{self.path.name}", daemon=True)
+        self._thread.start()
+    
+    def _open(self) -> TextIO:
+        return open(self.path, "a", encoding="utf-8")
+    
+    def submit(self, line: str):
+        """Enqueue one formatted line; never blocks"""
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _drain(self) -> Tuple[List[str], bool]:
+        """Wait up to flush_interval for the first line, then take up to flush_batch"""
+        lines = []
+        stop = False
+        try:
+            first = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return lines, stop
+        
+        if first is None:
+            stop = True
+        else:
+            lines.append(first)
+        
+        while len(lines) < self.flush_batch:
+            try:
+                line = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if line is None:
+                stop = True
+                continue
+            lines.append(line)
+        return lines, stop
+    
+    def _run(self):
+        stop = False
+        while not stop:
+            lines, stop = self._drain()
+            if lines:
+                self._write(lines)
+            
+            if self._should_rotate():
+                try:
+                    self._rotate()
+                except OSError as e:
+                    self._report_rotation_error(e)
+        
+        self._close_output()
+    
+    def _write(self, lines: List[str]):
+        try:
+            if self._file.closed:
+                # A failed rotation could not reopen the file: try again now
+                self._file = self._open()
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self.written += len(lines)
+        except (OSError, ValueError):
+            self.dropped += len(lines)
+    
+    def _close_output(self):
+        self._file.close()
+    
+    def _should_rotate(self) -> bool:
+        if self._file.closed or time.time() < self._next_rotation_attempt:
+            return False
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds \
+            and self._file.tell() > 0
+    
+    def _rotate(self):
+        self._file.close()
+        try:
+            rotated = self.path.with_name(f"{self.path.name}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+            self.path.rename(rotated)
+            if self.compress:
+                self._compress(rotated)
+            self._prune()
+        finally:
+            # Whatever failed, keep writing to the live file
+            self._file = self._open()
+            self._opened_at = time.time()
+    
+    def _compress(self, rotated: Path):
+        compressed = Path(f"{rotated}.gz")
+        try:
+            with open(rotated, "rb") as src, gzip.open(compressed, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        except OSError:
+            # Keep the uncompressed copy rather than a truncated .gz
+            compressed.unlink(missing_ok=True)
+            raise
+        rotated.unlink()
+    
+    def _prune(self):
+        backups = sorted(self.path.parent.glob(f"{self.path.name}.*"))
+        for old in backups[:max(0, len(backups) - self.backup_count)]:
+            old.unlink()
+    
+    def _report_rotation_error(self, error: OSError):
+        """The writer thread must survive a failed rotation; logging here would only queue behind it"""
+        self.rotation_errors += 1
+        self.last_error = f"{type(error).__name__}: {str(error)}"
+        self._next_rotation_attempt = time.time() + self.rotate_retry_seconds
+        try:
+            sys.__stderr__.write(f"Log rotation of {self.path} failed ({self.last_error}), "
+                                 f"retrying in {self.rotate_retry_seconds:.0f}s\n")
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def close(self, timeout: float = 5.0):
+        """Flush what is queued and stop the writer thread"""
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+    
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotation_errors": self.rotation_errors,
+            "last_error": self.last_error
+        }
+
+
+class BackgroundStreamWriter(BackgroundLogWriter):
+    """Console output (stderr) through the same queue and writer thread; never rotated or closed"""
+    
+    def __init__(self, stream: Optional[TextIO] = None, max_queue: int = 10000, flush_interval: float = 1.0,
+                 flush_batch: int = 256):
+        self.stream = stream or sys.stderr
+        super().__init__(f"<{getattr(self.stream, 'name', 'stream')}>", max_queue=max_queue,
+                         flush_interval=flush_interval, flush_batch=flush_batch, max_bytes=0, rotate_seconds=0)
+    
+    def _open(self) -> TextIO:
+        return self.stream
+    
+    def _should_rotate(self) -> bool:
+        return False
+    
+    def _close_output(self):
+        try:
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+
+
+class QueueLogHandler(logging.Handler):
+    """logging.Handler that hands formatted records to a BackgroundLogWriter"""
+    
+    def __init__(self, writer: BackgroundLogWriter, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.writer = writer
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.writer.submit(self.format(record))
+        except Exception:
+            self.handleError(record)
@@ -3,17 +3,25 @@
 High-performance API with metrics logging and safety-first approach
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 import time
 import logging
 import json
+import hashlib
+import functools
+import uuid
+import os
 from pathlib import Path
 import uvicorn
 import asyncio
+import threading
+import secrets
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Import core components
@@ -23,21 +31,77 @@ sys.path.append(str(Path(__file__).parent.parent))
 from core.models.companion_ai import CompanionAI
 from core.models.safety_checker import ApplianceSafetyChecker
 from core.models.model_manager import ModelManager, model_manager
+from core.models.async_llm import AsyncLLMClient
+from core.retrieval import VectorStore, SearchFilter
+from core.retrieval.chunking import strip_namespace
+from core.retrieval.hybrid import is_decisive, lexical_relevance, reciprocal_rank_fusion
+from core.retrieval.ann import IndexSpec
+from core.retrieval.compressed import CompressionSpec
+from core.retrieval.vector_store import DEFAULT_MANIFEST_PATH
+from backend import config
+from backend.answer_cache import AnswerCache
+from backend.query_encoder import get_query_encoder, loaded_query_encoder, release_fallback_encoder, encode_queries
+from backend.search_batcher import SearchBatcher
+from backend.latency_metrics import LatencyRecorder
+from backend.prometheus import render_metrics
+from backend import tracing
+from backend.tracing import TraceLog
+from backend.log_pipeline import BackgroundLogWriter, BackgroundStreamWriter, QueueLogHandler
+from backend.manual_registry import ManualRegistry, stream_to_disk
+from backend.ingestion_jobs import IngestionQueue
+from backend.worker_role import acquire_leader_lock
+from backend.startup import StartupTracker, READY, FAILED
+from backend.safety_matcher import SafetyMatcher
+from backend.emergency_responses import emergency_response
+from backend.admission import AdmissionController, Overloaded
+from backend.single_flight import SingleFlight, normalize_query_key
+from backend.prompting import build_messages, result_fields
+from backend.error_codes import ErrorCodeIndex, ErrorCodeMatch
 
 # Create logs directory
 Path("logs").mkdir(exist_ok=True)
 
-# Configure logging with metrics
+def _log_writer(path: str) -> BackgroundLogWriter:
+    if config.API_WORKERS > 1:
+        # One file per worker process - rotation can't be shared across processes
+        path = str(Path(path).with_suffix(f".{os.getpid()}{Path(path).suffix}"))
+    return BackgroundLogWriter(
+        path,
+        max_queue=config.LOG_QUEUE_SIZE,
+        flush_interval=config.LOG_FLUSH_INTERVAL,
+        flush_batch=config.LOG_FLUSH_BATCH,
+        max_bytes=config.LOG_MAX_BYTES,
+        rotate_seconds=config.LOG_ROTATE_SECONDS,
+        backup_count=config.LOG_BACKUP_COUNT,
+        compress=config.LOG_COMPRESS
+    )
+
+# Configure logging with metrics - file and console output go through
+# background writers so request handlers never block on log I/O
+metrics_log_writer = _log_writer('logs/api_metrics.log')
+console_log_writer = BackgroundStreamWriter(
+    sys.stderr,
+    max_queue=config.LOG_QUEUE_SIZE,
+    flush_interval=config.LOG_FLUSH_INTERVAL,
+    flush_batch=config.LOG_FLUSH_BATCH
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('logs/api_metrics.log'),
-        logging.StreamHandler()
+        QueueLogHandler(metrics_log_writer),
+        QueueLogHandler(console_log_writer)
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Slow queries get their own file with the full span breakdown
+slow_query_log_writer = _log_writer(config.SLOW_QUERY_LOG)
+slow_query_logger = logging.getLogger("companion.slow_queries")
+slow_query_logger.addHandler(QueueLogHandler(slow_query_log_writer))
+slow_query_logger.propagate = False
+log_writers = (metrics_log_writer, slow_query_log_writer, console_log_writer)
+
 # FastAPI app with optimized configuration
 app = FastAPI(
     title="CompanionAI API",
@@ -56,11 +120,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _start_request(trace: tracing.Trace):
+    """An /answer* request arrived: into the in-flight gauge for the saturation metric"""
+    metrics_store["inflight_requests"] += 1
+
+def _finish_request(trace: tracing.Trace):
+    """An /answer* request is done (body included, or the client left): out of the gauge, trace recorded"""
+    metrics_store["inflight_requests"] -= 1
+    trace_log.record(trace)
+
+# Propagate X-Request-ID and trace /answer* requests. The middleware finishes a
+# request when its ASGI call returns, so streamed bodies and early disconnects
+# leave the gauge the same way as plain responses
+app.add_middleware(
+    tracing.TracingMiddleware,
+    prefix="/answer",
+    on_start=_start_request,
+    on_finish=_finish_request
+)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load fast: 503 + Retry-After instead of a queue that ends in client timeouts"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.stage} {exc.reason}). Please retry in {exc.retry_after}s.",
+                 "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Request/Response models
 class QueryRequest(BaseModel):
     query: str = Field(..., description="User's appliance question")
     brand: Optional[str] = Field(None, description="Appliance brand")
     model: Optional[str] = Field(None, description="Appliance model")
+    appliance_type: Optional[str] = Field(None, description="Appliance type (e.g. washingmachine, microwave)")
     k: int = Field(10, description="Number of chunks to retrieve", ge=1, le=20)
 
 class SourceInfo(BaseModel):
@@ -70,6 +164,21 @@ class SourceInfo(BaseModel):
     model: Optional[str] = None
     relevance_score: float
 
+class ErrorCodeInfo(BaseModel):
+    code: str
+    brand: str
+    appliance_type: str
+    description: str
+    safety_level: str
+    immediate_actions: List[str]
+    troubleshooting_steps: List[str]
+    common_causes: List[str]
+    prevention_tips: List[str]
+    when_to_call_professional: List[str]
+    estimated_repair_cost: Optional[str] = None
+    difficulty_level: str = "beginner"
+    source: Optional[str] = None
+
 class AnswerResponse(BaseModel):
     answer: str
     safety_flag: bool
@@ -81,12 +190,47 @@ class AnswerResponse(BaseModel):
     search_time: float
     llm_time: float
     confidence_score: float
+    # Precomputed emergency instructions; manual-grounded detail via POST /answer/detail
+    short_circuit: bool = False
+    hazard: Optional[str] = None
+    # Set when answered from the error-code table (no retrieval or LLM)
+    error_code_info: Optional[ErrorCodeInfo] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., description="Questions to answer", min_length=1,
+                                        max_length=config.BATCH_MAX_QUERIES)
+
+class BatchAnswerResponse(BaseModel):
+    answers: List[AnswerResponse]
+    total_queries: int
+    failed_queries: int
+    processing_time: float
+    safety_time: float
+    search_time: float
+    llm_time: float
 
 class UploadResponse(BaseModel):
     filename: str
     status: str
     chunks_processed: int
     processing_time: float
+    content_hash: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    job_id: Optional[str] = None
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    pages_total: Optional[int] = None
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_published: int
+    errors: List[str]
+    throttled: bool
+    created_at: float
+    updated_at: float
 
 class MetricsResponse(BaseModel):
     total_queries: int
@@ -94,61 +238,512 @@ class MetricsResponse(BaseModel):
     avg_search_time: float
     avg_llm_time: float
     safety_alerts_triggered: int
-    precision_at_5: float
+    precision_at_5: Optional[float] = None
+    avg_safety_time: float = 0.0
+    latency_percentiles: Dict[str, Dict[str, Dict[str, float]]] = {}
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_hit_rate: float = 0.0
+    search_batches: int = 0
+    avg_search_batch_size: float = 0.0
+    emergency_short_circuits: int = 0
+    avg_short_circuit_time: float = 0.0
+    admission: Dict[str, Dict[str, float]] = {}
+    coalesced_requests: int = 0
+    client_disconnects: int = 0
+    llm_backends: Dict[str, Dict[str, Any]] = {}
+    llm_hedging: Dict[str, int] = {}
+    retrieval_paths: Dict[str, int] = {}
+    error_code_hits: int = 0
+    error_code_hints: int = 0
+    avg_error_code_time: float = 0.0
+    error_code_table: Dict[str, Any] = {}
 
 # Global components
 companion_ai = None
 safety_checker = None
+safety_matcher = None
+vector_store = None
+search_batcher = None
+manual_registry = ManualRegistry(Path(config.MANUAL_REGISTRY_PATH))
+ingestion_queue = None
+index_writer = True  # this process publishes/merges the index (see worker_role)
+startup = StartupTracker(
+    max_attempts=config.STARTUP_MAX_ATTEMPTS,
+    backoff_seconds=config.STARTUP_BACKOFF_SECONDS,
+    backoff_max_seconds=config.STARTUP_BACKOFF_MAX_SECONDS
+)
+startup_task = None
+batch_llm_executor = ThreadPoolExecutor(max_workers=config.BATCH_LLM_WORKERS, thread_name_prefix="batch-llm")
+answer_cache = AnswerCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS
+) if config.ANSWER_CACHE_ENABLED else None
+admission = AdmissionController(
+    {
+        "search": {
+            "max_concurrency": config.SEARCH_MAX_CONCURRENCY,
+            "max_queue": config.SEARCH_MAX_QUEUE,
+            "max_queue_seconds": config.SEARCH_MAX_QUEUE_SECONDS
+        },
+        "llm": {
+            "max_concurrency": config.LLM_MAX_CONCURRENCY,
+            "max_queue": config.LLM_MAX_QUEUE,
+            "max_queue_seconds": config.LLM_MAX_QUEUE_SECONDS
+        }
+    },
+    enabled=config.ADMISSION_ENABLED
+)
+single_flight = SingleFlight()
+llm_client = None
+error_codes = ErrorCodeIndex(Path(config.ERROR_CODE_TABLE_PATH)) if config.ERROR_CODE_FAST_PATH else None
+latency_metrics = LatencyRecorder(stages=("total", "safety", "search", "llm", "short_circuit", "error_code"))
+trace_log = TraceLog(
+    capacity=config.TRACE_RING_SIZE,
+    slow_threshold_ms=config.SLOW_QUERY_THRESHOLD_MS,
+    slow_logger=slow_query_logger
+)
 metrics_store = {
-    "queries": [],
-    "response_times": [],
-    "search_times": [],
-    "llm_times": [],
     "safety_alerts": 0,
-    "precision_scores": []
+    "requests_by_safety_level": {},
+    "inflight_requests": 0,
+    "ingestion_pending": 0,
+    "safety_matcher_disagreements": 0,
+    "short_circuits": 0,
+    "client_disconnects": 0,
+    "search_filtered": 0,
+    "search_filter_relaxed": 0,
+    "retrieval_lexical": 0,
+    "retrieval_hybrid": 0,
+    "retrieval_dense": 0
 }
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize components on startup"""
-    global companion_ai, safety_checker
+    """Start serving right away; the index and models load in the background"""
+    global safety_checker, safety_matcher, startup_task, llm_client
     
     logger.info("Initializing CompanionAI components...")
     
+    # Safety checker is fast and is all the degraded (safety-only) mode needs
+    safety_checker = await startup.load("safety_checker", ApplianceSafetyChecker, in_thread=False)
+    
+    # Its patterns compiled into one regex scan (see safety_matcher)
+    if safety_checker and config.SAFETY_MATCHER_MODE in ("on", "shadow"):
+        try:
+            safety_matcher = SafetyMatcher.from_checker(safety_checker)
+        except Exception as e:
+            logger.error(f"Safety matcher compile error: {str(e)}")
+        if safety_matcher:
+            logger.info(f"Safety matcher ({config.SAFETY_MATCHER_MODE}): {safety_matcher.literal_count} phrases, "
+                        f"{safety_matcher.pattern_count} patterns")
+    
+    # Native async LLM path (pooled keep-alive connections, no thread per generation)
+    if config.LLM_BACKENDS:
+        try:
+            llm_client = AsyncLLMClient.from_spec(
+                config.LLM_BACKENDS,
+                base_urls={"ollama": config.OLLAMA_BASE_URL, "nim": config.NIM_BASE_URL, "openai": config.NIM_BASE_URL},
+                api_keys={"nim": config.NVIDIA_API_KEY, "openai": config.NVIDIA_API_KEY},
+                pool_size=config.LLM_POOL_SIZE,
+                keepalive_seconds=config.LLM_KEEPALIVE_SECONDS,
+                client_options={
+                    "hedge": config.LLM_HEDGE_ENABLED,
+                    "hedge_percentile": config.LLM_HEDGE_PERCENTILE,
+                    "hedge_delay_seconds": config.LLM_HEDGE_DELAY_SECONDS,
+                    "hedge_min_delay_seconds": config.LLM_HEDGE_MIN_DELAY_SECONDS
+                },
+                breaker_failures=config.LLM_BREAKER_FAILURES,
+                breaker_reset_seconds=config.LLM_BREAKER_RESET_SECONDS,
+                max_concurrency=config.LLM_BACKEND_CONCURRENCY,
+                request_timeout=config.LLM_REQUEST_TIMEOUT,
+                connect_timeout=config.LLM_CONNECT_TIMEOUT,
+                read_timeout=config.LLM_READ_TIMEOUT,
+                temperature=config.LLM_TEMPERATURE,
+                max_tokens=config.LLM_MAX_TOKENS
+            )
+            logger.info(f"Async LLM client: {', '.join(llm_client.backends)}")
+        except Exception as e:
+            logger.error(f"Async LLM client config error: {str(e)}")
+    
+    # Error-code table (small JSON, reloadable via POST /admin/error-codes/reload)
+    if error_codes:
+        try:
+            table_stats = await asyncio.to_thread(error_codes.reload)
+            if not table_stats["entries"]:
+                logger.warning(f"Error code table {config.ERROR_CODE_TABLE_PATH} is empty, nothing will be answered "
+                               f"from it (import rows with scripts/import_error_codes.py)")
+        except FileNotFoundError:
+            logger.warning(f"No error code table at {config.ERROR_CODE_TABLE_PATH}, error-code fast path disabled")
+        except Exception as e:
+            logger.error(f"Error code table load error: {str(e)}")
+    
+    # Answers cached before the last shutdown, served while CompanionAI loads
+    if answer_cache and config.ANSWER_CACHE_PATH and Path(config.ANSWER_CACHE_PATH).exists():
+        try:
+            loaded = await asyncio.to_thread(answer_cache.load, Path(config.ANSWER_CACHE_PATH), _index_fingerprint())
+            logger.info(f"Answer cache: {loaded} entries from {config.ANSWER_CACHE_PATH}")
+        except Exception as e:
+            logger.error(f"Answer cache load error: {str(e)}")
+    
+    startup.register("vector_store", required=False)
+    startup.register("companion_ai")
+    startup.register("warmup")
+    startup_task = asyncio.get_running_loop().create_task(_load_components())
+
+def _index_fingerprint() -> str:
+    """Identifies the on-disk index a saved answer cache was answered from"""
     try:
-        # Initialize safety checker (fast)
-        safety_checker = ApplianceSafetyChecker()
-        logger.info("Safety checker initialized")
-        
-        # Initialize companion AI (may take time for model loading)
-        companion_ai = CompanionAI()
-        logger.info("CompanionAI initialized successfully")
-        
+        return hashlib.sha256(DEFAULT_MANIFEST_PATH.read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+async def _load_components():
+    """Load retrieval and CompanionAI concurrently, then warm up before reporting ready"""
+    global search_batcher
+    
+    await asyncio.gather(_load_retrieval(), _load_companion_ai(), _load_query_encoder())
+    if companion_ai:
+        release_fallback_encoder(companion_ai)
+    
+    # Coalesce concurrent /answer searches into micro-batches
+    if companion_ai and config.SEARCH_BATCH_ENABLED:
+        search_batcher = SearchBatcher(
+            _search_batch_scatter,
+            window_ms=config.SEARCH_BATCH_WINDOW_MS,
+            max_batch_size=config.SEARCH_BATCH_MAX_SIZE
+        )
+    
+    await _warm_up()
+    if startup.ready:
+        logger.info(f"CompanionAI ready in {startup.ready_at - startup.started_at:.2f}s")
+
+async def _load_companion_ai():
+    """CompanionAI (embedding model, FAISS, LLM clients) - the slow part of startup"""
+    global companion_ai
+    companion_ai = await startup.load("companion_ai", CompanionAI)
+
+async def _load_query_encoder():
+    """
+    Just the embedding model, ahead of CompanionAI, when there are cached
+    answers to serve meanwhile; released once CompanionAI brings its own
+    """
+    if not (answer_cache and answer_cache.stats()["size"]):
+        return
+    await startup.load("query_encoder", lambda: get_query_encoder(None), required=False, max_attempts=1)
+
+async def _load_retrieval():
+    """VectorStore plus everything that writes to it (registry seeding, merges, ingestion)"""
+    global vector_store, ingestion_queue, index_writer
+    
+    # Vectorized store for batched retrieval (optional - falls back to search_chunks)
+    vector_store = await startup.load(
+        "vector_store",
+        lambda: VectorStore.load(
+            merge_threshold=config.INDEX_MERGE_THRESHOLD,
+            mmap=config.INDEX_MMAP,
+            snapshot_path=Path(config.SNAPSHOT_PATH) if config.SNAPSHOT_PATH else None,
+            verify_snapshot=config.SNAPSHOT_VERIFY,
+            lexical_path=Path(config.LEXICAL_INDEX_PATH) if config.LEXICAL_ENABLED else None,
+            index_spec=IndexSpec.parse(config.INDEX_TYPE) if config.INDEX_TYPE else None,
+            compression=CompressionSpec.parse(config.VECTOR_COMPRESSION) if config.VECTOR_COMPRESSION else None
+        ),
+        required=False
+    )
+    if vector_store is None:
+        logger.warning("VectorStore unavailable, batch search will run per query")
+    
+    # With several uvicorn workers exactly one writes the index; the rest follow it
+    index_writer = acquire_leader_lock(Path(config.LEADER_LOCK_PATH))
+    
+    # Register manuals the index already holds so re-uploads are skipped
+    if vector_store and index_writer:
+        indexed_names = {strip_namespace(chunk_id.rsplit("_", 1)[0]) for chunk_id in vector_store.ids}
+        try:
+            await asyncio.to_thread(manual_registry.seed_from_directory, Path("data_raw"), indexed_names)
+        except Exception as e:
+            logger.warning(f"Could not seed manual registry: {str(e)}")
+    
+    # Fold the delta segment into the base index off-peak
+    if vector_store and index_writer:
+        asyncio.get_running_loop().create_task(_index_merge_loop())
+    
+    # Rebuild / auto-tune the base for INDEX_TYPE without holding up serving
+    if vector_store and vector_store.index_spec and vector_store.compression:
+        logger.warning("INDEX_TYPE is ignored while VECTOR_COMPRESSION is set")
+    elif vector_store and index_writer and vector_store.index_spec:
+        asyncio.get_running_loop().create_task(_ensure_index_type())
+    
+    # Parse/embed uploads in worker processes; publish into the VectorStore here
+    # (other API workers only queue jobs for the index writer)
+    if vector_store:
+        ingestion_queue = IngestionQueue(
+            Path(config.INGEST_JOBS_DIR),
+            publish=_publish_ingested_chunks,
+            max_workers=config.INGEST_WORKERS,
+            should_throttle=_ingestion_should_throttle,
+            dispatch=index_writer,
+            retention_seconds=config.INGEST_JOB_RETENTION_SECONDS
+        )
+        resumed = ingestion_queue.resume_pending(on_done=_on_ingestion_done)
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished ingestion jobs")
+    
+    if vector_store and config.API_WORKERS > 1:
+        asyncio.get_running_loop().create_task(_index_sync_loop())
+
+async def _warmup_queries() -> List[Dict[str, Any]]:
+    if config.WARMUP_QUERIES == "demo":
+        return (await get_demo_queries())["safe_queries"]
+    return [{"query": query.strip()} for query in config.WARMUP_QUERIES.split("|") if query.strip()]
+
+async def _warm_up():
+    """
+    Run warm-up queries through search and the LLM so the first real request
+    doesn't pay for lazy initialization (encoder, index pages, LLM model load).
+    A failed or slow warm-up is reported but does not hold back readiness.
+    """
+    queries = await _warmup_queries()
+    if not queries or companion_ai is None:
+        startup.mark("warmup", READY if companion_ai else FAILED,
+                     error=None if companion_ai else "CompanionAI not loaded")
+        return
+    
+    def warm():
+        chunks, _ = _search_many([(item["query"], 5, None, None) for item in queries])
+        for item, item_chunks in zip(queries, chunks):
+            companion_ai.process_query(item["query"], item_chunks, item.get("brand"), item.get("model"))
+        return len(queries)
+    
+    try:
+        await asyncio.wait_for(startup.load("warmup", warm, max_attempts=1), timeout=config.WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        startup.mark("warmup", FAILED, error=f"timed out after {config.WARMUP_TIMEOUT_SECONDS:.0f}s")
+    
+    if startup.components["warmup"].state == FAILED:
+        logger.warning(f"Warm-up incomplete: {startup.components['warmup'].error}")
+        startup.components["warmup"].required = False
+
+async def _index_merge_loop():
+    """Periodically merge the index delta segment in the background"""
+    while True:
+        await asyncio.sleep(config.INDEX_MERGE_INTERVAL_SECONDS)
+        if vector_store and vector_store.delta_size:
+            try:
+                await asyncio.to_thread(vector_store.merge)
+            except Exception as e:
+                logger.error(f"Index merge failed: {str(e)}")
+            # "auto" retunes once the corpus has grown enough
+            if vector_store.index_spec:
+                await _ensure_index_type()
+
+async def _ensure_index_type():
+    """Match the base index to INDEX_TYPE; searches keep using the current base until the swap"""
+    try:
+        params = await asyncio.to_thread(
+            vector_store.ensure_index_type,
+            k=config.INDEX_TUNE_K,
+            target_recall=config.INDEX_TARGET_RECALL,
+            num_queries=config.INDEX_TUNE_QUERIES,
+            max_p99_ms=config.INDEX_TUNE_MAX_P99_MS or None,
+            retune_growth=config.INDEX_RETUNE_GROWTH
+        )
     except Exception as e:
-        logger.error(f"Startup error: {str(e)}")
-        # Continue with limited functionality
-        companion_ai = None
+        logger.error(f"Index type update failed: {str(e)}")
+        return
+    if params:
+        logger.info(f"Base index is now {params['label']}")
+
+async def _index_sync_loop():
+    """
+    Multi-worker: the writer picks up jobs queued by other workers; the others
+    adopt index versions and registry entries the writer published
+    """
+    while True:
+        await asyncio.sleep(config.INDEX_REFRESH_INTERVAL_SECONDS)
+        try:
+            if index_writer:
+                ingestion_queue.resume_pending(on_done=_on_ingestion_done)
+                continue
+            
+            await asyncio.to_thread(manual_registry.refresh)
+            if await asyncio.to_thread(vector_store.refresh) and answer_cache:
+                answer_cache.invalidate()
+        except Exception as e:
+            logger.error(f"Index sync failed: {str(e)}")
+
+def _publish_ingested_chunks(job: Dict[str, Any], records: List[Dict[str, Any]], embeddings: np.ndarray) -> int:
+    """Add a finished ingestion job's chunks to the serving index"""
+    return vector_store.add(embeddings, records)
+
+def _ingestion_should_throttle() -> bool:
+    """Back off ingestion while query p95 (last minute) is over budget"""
+    return latency_metrics.window("total", 60)["p95"] > config.INGEST_THROTTLE_P95_SECONDS
+
+def _on_ingestion_done(job: Dict[str, Any]):
+    if job["status"] == "completed":
+        manual_registry.mark_indexed(job["content_hash"], job["chunks_published"], filename=job["filename"])
+        # Index changed - cached answers may cite stale sources
+        if answer_cache:
+            answer_cache.invalidate()
+    else:
+        manual_registry.release(job["content_hash"])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools and flush logs"""
+    if startup_task and not startup_task.done():
+        startup_task.cancel()
+    if ingestion_queue:
+        await ingestion_queue.shutdown()
+    if search_batcher:
+        search_batcher.shutdown()
+    if llm_client:
+        await llm_client.close()
+    batch_llm_executor.shutdown(wait=False)
+    
+    if answer_cache and config.ANSWER_CACHE_PATH:
+        try:
+            saved = await asyncio.to_thread(answer_cache.save, Path(config.ANSWER_CACHE_PATH), _index_fingerprint())
+            logger.info(f"Answer cache: saved {saved} entries to {config.ANSWER_CACHE_PATH}")
+        except Exception as e:
+            logger.error(f"Answer cache save error: {str(e)}")
+    
+    # Flush queued log records (console last, so it shows everything above)
+    metrics_log_writer.close()
+    slow_query_log_writer.close()
+    console_log_writer.close()
+
+def _analyze_safety(query: str) -> Tuple[str, str]:
+    """
+    (safety_level, safety_message). With SAFETY_MATCHER_MODE=on the compiled
+    matcher screens the query and the checker only words hazard verdicts;
+    in shadow mode the checker decides and disagreements are counted.
+    """
+    if safety_checker is None:
+        return "safe", ""
+    
+    match = safety_matcher.classify(query) if safety_matcher else None
+    if match is not None and config.SAFETY_MATCHER_MODE == "on" and match.level == "safe":
+        return "safe", ""
+    
+    safety_level, safety_message, _ = safety_checker.analyze_safety(query)
+    if match is not None:
+        tracing.annotate(safety_spans=[span["text"] for span in match.spans])
+        if match.level != safety_level:
+            metrics_store["safety_matcher_disagreements"] += 1
+            logger.debug(f"Safety matcher said {match.level}, checker {safety_level}: {query!r}")
+    return safety_level, safety_message
+
+def _emergency_for(query: str, safety_level: str) -> Optional[Dict[str, str]]:
+    """Precomputed emergency response when this verdict takes the short-circuit path"""
+    if not config.EMERGENCY_SHORT_CIRCUIT or safety_level not in config.EMERGENCY_SHORT_CIRCUIT_LEVELS:
+        return None
+    return emergency_response(query, safety_level)
+
+def _short_circuit_answer(query: str, emergency: Dict[str, str], safety_level: str, safety_message: str,
+                          start_time: float, safety_time: float) -> AnswerResponse:
+    """Emergency instructions without retrieval or LLM; latency tracked as its own stage"""
+    processing_time = time.time() - start_time
+    latency_metrics.record("short_circuit", processing_time)
+    metrics_store["short_circuits"] += 1
+    log_metrics(query, processing_time, None, None, True, safety_time, safety_level)
+    tracing.annotate(short_circuit=True, hazard=emergency["hazard"])
+    
+    return AnswerResponse(
+        answer=emergency["answer"],
+        safety_flag=True,
+        safety_level=safety_level,
+        safety_message=safety_message if safety_message else None,
+        sources=[],
+        chunks_used=0,
+        processing_time=processing_time,
+        search_time=0.0,
+        llm_time=0.0,
+        confidence_score=1.0,
+        short_circuit=True,
+        hazard=emergency["hazard"]
+    )
+
+_SAFETY_RANK = {"safe": 0, "caution": 1, "danger": 2, "emergency": 3}
+
+def _error_code_citations(info: Any, written: str) -> List[SourceInfo]:
+    """Manual pages mentioning the code (any of its spellings) for that brand and appliance type"""
+    if not (vector_store and config.ERROR_CODE_CITATIONS):
+        return []
+    spellings = " ".join(dict.fromkeys((info.code, written, *info.aliases)))
+    hits = vector_store.search_lexical(spellings, config.ERROR_CODE_CITATIONS,
+                                       SearchFilter(brand=info.brand, appliance_type=info.appliance_type))
+    return [_to_source_info(vector_store.chunk(chunk_id, lexical_relevance(score))) for chunk_id, score, _ in hits]
+
+def _error_code_match(request: QueryRequest) -> Optional[ErrorCodeMatch]:
+    """The known error code the query names, if any"""
+    if error_codes is None:
+        return None
+    return error_codes.recognize(request.query, request.brand, request.appliance_type)
+
+def _error_code_hint(match: Optional[ErrorCodeMatch]) -> str:
+    """Prompt suffix for an ambiguous variant spelling; answered codes and no code add nothing"""
+    if match is None or match.answerable:
+        return ""
+    tracing.annotate(error_code_hint=match.info.code)
+    return "\n\n" + match.info.hint(match.written)
+
+async def _error_code_answer(request: QueryRequest, match: Optional[ErrorCodeMatch], safety_level: str,
+                             safety_message: str, start_time: float, safety_time: float) -> Optional[AnswerResponse]:
+    """
+    Answer straight from the error-code table when the query names a known
+    code exactly as written, or a variant spelling only one entry can mean;
+    else None (ambiguous variants go through retrieval and the LLM with
+    _error_code_hint)
+    """
+    if match is None or not match.answerable:
+        return None
+    
+    info = match.info
+    with tracing.span("error_code_citations"):
+        sources = await asyncio.to_thread(_error_code_citations, info, match.written)
+    # The code's own level unless the query itself was flagged higher
+    level = max(safety_level, info.safety_level, key=lambda name: _SAFETY_RANK.get(name, 0))
+    
+    processing_time = time.time() - start_time
+    latency_metrics.record("error_code", processing_time)
+    log_metrics(request.query, processing_time, None, None, level != "safe", safety_time, level)
+    tracing.annotate(error_code=info.code, error_code_brand=info.brand)
+    
+    return AnswerResponse(
+        answer=info.render(match.written),
+        safety_flag=level != "safe",
+        safety_level=level,
+        safety_message=safety_message if safety_message else None,
+        sources=sources,
+        chunks_used=len(sources),
+        processing_time=processing_time,
+        search_time=0.0,
+        llm_time=0.0,
+        confidence_score=0.95 if match.exact else 0.85,
+        error_code_info=ErrorCodeInfo(**info.to_dict())
+    )
 
-def log_metrics(query: str, response_time: float, search_time: float, llm_time: float, safety_flag: bool):
-    """Log performance metrics"""
+def log_metrics(query: str, response_time: float, search_time: Optional[float], llm_time: Optional[float],
+                safety_flag: bool, safety_time: float = 0.0, safety_level: str = "safe"):
+    """Log performance metrics; search_time / llm_time are None when that stage didn't run"""
     timestamp = datetime.now().isoformat()
     
-    # Store in memory for quick access
-    metrics_store["queries"].append({
-        "timestamp": timestamp,
-        "query": query,
-        "response_time": response_time,
-        "search_time": search_time,
-        "llm_time": llm_time,
-        "safety_flag": safety_flag
-    })
+    # Streaming histograms (fixed memory, no per-query list); skipped stages would drag percentiles to 0
+    now = time.time()
+    latency_metrics.record("total", response_time, now)
+    latency_metrics.record("safety", safety_time, now)
+    if search_time is not None:
+        latency_metrics.record("search", search_time, now)
+    if llm_time is not None:
+        latency_metrics.record("llm", llm_time, now)
     
     if safety_flag:
         metrics_store["safety_alerts"] += 1
-    
-    # Keep only last 1000 queries in memory
-    if len(metrics_store["queries"]) > 1000:
-        metrics_store["queries"] = metrics_store["queries"][-1000:]
+    by_level = metrics_store["requests_by_safety_level"]
+    by_level[safety_level] = by_level.get(safety_level, 0) + 1
     
     # Log to file
     log_entry = {
@@ -157,130 +752,327 @@ def log_metrics(query: str, response_time: float, search_time: float, llm_time:
         "response_time": response_time,
         "search_time": search_time,
         "llm_time": llm_time,
+        "safety_time": safety_time,
         "safety_flag": safety_flag
     }
     
     logger.info(f"METRICS: {json.dumps(log_entry)}")
 
+def _to_source_info(source: Dict[str, Any]) -> SourceInfo:
+    """Convert a source/chunk dict from CompanionAI into a SourceInfo"""
+    metadata = source.get("metadata") or {}
+    
+    # Convert page to int, handle non-numeric values
+    page_value = source.get("page", metadata.get("page"))
+    if isinstance(page_value, str):
+        try:
+            page_int = int(page_value)
+        except (ValueError, TypeError):
+            page_int = None
+    elif isinstance(page_value, int):
+        page_int = page_value
+    else:
+        page_int = None
+    
+    return SourceInfo(
+        filename=source.get("filename", metadata.get("filename", "unknown")),
+        page=page_int,
+        brand=source.get("brand", metadata.get("brand")),
+        model=source.get("model", metadata.get("model")),
+        relevance_score=source.get("relevance_score", source.get("score", 0.0))
+    )
+
+def _answer_from_result(result: Dict[str, Any], processing_time: float,
+                        search_time: float, llm_time: float) -> AnswerResponse:
+    """Build an AnswerResponse from a CompanionAI.process_query result"""
+    # Build sources from result
+    sources = [_to_source_info(source) for source in result.get("sources", [])]
+    safety_message = result.get("safety_message", "")
+    
+    return AnswerResponse(
+        answer=result.get("answer", "No answer generated"),
+        safety_flag=result.get("safety_flag", False),
+        safety_level=result.get("safety_level", "safe"),
+        safety_message=safety_message if safety_message else None,
+        sources=sources,
+        chunks_used=len(sources),
+        processing_time=processing_time,
+        search_time=search_time,
+        llm_time=llm_time,
+        confidence_score=result.get("confidence_score", 0.85)
+    )
+
+def _record_llm_spans(result: Dict[str, Any]):
+    """Engine-reported sub-stage timings (e.g. prompt_build, llm_first_token) in seconds"""
+    for name, seconds in (result.get("timings") or {}).items():
+        if isinstance(seconds, (int, float)):
+            tracing.add_span(name, float(seconds), source="companion_ai")
+
+def _json_response(response: BaseModel) -> Response:
+    """Serialize a response model, timing the serialization as its own span"""
+    with tracing.span("response_serialization"):
+        body = response.model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+async def _embed_for_cache(query: str):
+    """
+    Embed a query for the answer cache, or None when the cache can't be used.
+    Needs only an encoder in memory, so cached answers are served while
+    CompanionAI is still loading.
+    """
+    if not answer_cache:
+        return None
+    encoder = loaded_query_encoder(companion_ai)
+    if encoder is None:
+        return None
+    with tracing.span("query_embedding", purpose="answer_cache"):
+        embeddings = await asyncio.to_thread(encode_queries, encoder, [query])
+    return embeddings[0]
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _iter_answer_tokens(query: str, chunks: List[Dict[str, Any]], brand: Optional[str],
+                              model: Optional[str], final: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Yield answer tokens as the LLM produces them.
+    Uses CompanionAI.process_query_stream when available (a sync generator run in a
+    worker thread); otherwise falls back to process_query and yields the whole answer.
+    The non-token fields of the final result are written into `final`.
+    With LLM_BACKENDS set, tokens come straight from the async LLM client.
+    """
+    if llm_client is not None:
+        async for token in llm_client.stream(build_messages(companion_ai, query, chunks, brand, model)):
+            yield token
+        final.update(result_fields(chunks))
+        return
+    
+    stream_fn = getattr(companion_ai, "process_query_stream", None)
+    
+    if stream_fn is None:
+        result = await asyncio.to_thread(companion_ai.process_query, query, chunks, brand, model)
+        final.update(result)
+        yield result.get("answer", "No answer generated")
+        return
+    
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    # Set when the consumer goes away (client disconnect): the worker thread stops at the next item
+    stop = threading.Event()
+    
+    def produce():
+        items = None
+        try:
+            # Inside the try: a generator that fails to start must still end the stream
+            items = stream_fn(query, chunks, brand, model)
+            for item in items:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            close = getattr(items, "close", None) if items is not None else None
+            if close:
+                close()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+    
+    producer = loop.run_in_executor(None, produce)
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                finished = True
+                break
+            if isinstance(item, Exception):
+                raise item
+            if isinstance(item, dict):
+                # Generators may end with a dict holding the full result
+                final.update(item)
+                continue
+            yield str(item)
+    finally:
+        stop.set()
+        # After a cancellation the thread winds down on its own - don't hold the request for it
+        if finished:
+            await producer
+
 @app.get("/health")
 async def health_check():
     """Optimized health check"""
     return {
-        "status": "healthy",
+        "status": "healthy" if startup.ready else "starting",
         "companion_ai_loaded": companion_ai is not None,
         "safety_checker_loaded": safety_checker is not None,
         "timestamp": datetime.now().isoformat(),
         "version": "2.0.0"
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Process is up and serving (possibly degraded: safety-only while loading)"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """200 once every required component is loaded and warmed up, else 503"""
+    snapshot = startup.snapshot()
+    snapshot["status"] = "ready" if snapshot["ready"] else "starting"
+    return JSONResponse(content=snapshot, status_code=200 if snapshot["ready"] else 503)
+
 @app.post("/answer", response_model=AnswerResponse)
-async def get_answer(request: QueryRequest):
+async def get_answer(request: QueryRequest, http_request: Request):
     """
     Optimized answer endpoint with comprehensive metrics
     Target: <2s response time, >80% precision@5
+    Emergency/danger verdicts return precomputed instructions immediately
+    (short_circuit=true); POST /answer/detail has the manual-grounded answer.
     """
+    return await _until_disconnected(http_request, _answer(request, allow_short_circuit=True))
+
+@app.post("/answer/detail", response_model=AnswerResponse)
+async def get_answer_detail(request: QueryRequest, http_request: Request):
+    """Manual-grounded answer, never short-circuited (follow-up to an emergency response)"""
+    return await _until_disconnected(http_request, _answer(request, allow_short_circuit=False))
+
+async def _until_disconnected(http_request: Request, work):
+    """
+    Await `work`, cancelling it if the client disconnects first so its
+    generation (and upstream LLM request) doesn't run for nobody
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=config.DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    metrics_store["client_disconnects"] += 1
+    tracing.annotate(client_disconnected=True)
+    # Nobody reads this; 499 is nginx's "client closed request" for the access log
+    return Response(status_code=499)
+
+async def _answer(request: QueryRequest, allow_short_circuit: bool):
     start_time = time.time()
     search_time = 0
     llm_time = 0
+    shared = False
     
     try:
         # Safety check (fast, <50ms)
         safety_start = time.time()
-        if safety_checker:
-            safety_level, safety_message, _ = safety_checker.analyze_safety(request.query)
+        with tracing.span("safety"):
+            safety_level, safety_message = _analyze_safety(request.query)
             safety_flag = safety_level != "safe"
-        else:
-            safety_level = "safe"
-            safety_message = ""
-            safety_flag = False
+        safety_time = time.time() - safety_start
+        
+        # Emergencies don't wait for retrieval and the LLM
+        emergency = _emergency_for(request.query, safety_level) if allow_short_circuit else None
+        if emergency:
+            return _json_response(_short_circuit_answer(request.query, emergency, safety_level, safety_message,
+                                                        start_time, safety_time))
         
-        # Search phase
+        # Known error codes are answered from the table
+        error_code = _error_code_match(request) if allow_short_circuit else None
+        error_code_response = await _error_code_answer(request, error_code, safety_level, safety_message,
+                                                       start_time, safety_time)
+        if error_code_response:
+            return _json_response(error_code_response)
+        
+        # A query BM25 settles alone never pays for the encoder, not even for the cache key
         search_start = time.time()
+        lexical_chunks = await _lexical_fast_path(request.query, request.k, _search_filter(request)) \
+            if companion_ai else None
+        lexical_time = time.time() - search_start
+        
+        # Answer cache (only for safe queries - hazards always get a fresh answer)
+        cache_scope = AnswerCache.make_scope(request.brand, request.model, request.k, request.appliance_type)
+        cache_embedding = await _embed_for_cache(request.query) \
+            if safety_level == "safe" and lexical_chunks is None else None
+        if cache_embedding is not None:
+            cached = answer_cache.get(cache_embedding, cache_scope)
+            if cached:
+                cached_response, _ = cached
+                processing_time = time.time() - start_time
+                log_metrics(request.query, processing_time, None, None, cached_response["safety_flag"], safety_time,
+                            cached_response["safety_level"])
+                tracing.annotate(cache_hit=True)
+                return _json_response(AnswerResponse(**{
+                    **cached_response,
+                    "processing_time": processing_time,
+                    "search_time": 0.0,
+                    "llm_time": 0.0
+                }))
+        
         if companion_ai:
-            # Get relevant chunks with timing
-            chunks = await asyncio.to_thread(
-                companion_ai.search_chunks,
-                request.query,
-                request.k
-            )
-            search_time = time.time() - search_start
+            # Identical questions in flight share one search + generation
+            generate = functools.partial(_generate_answer, request, cache_embedding, safety_level, safety_message,
+                                         _error_code_hint(error_code), lexical_chunks, lexical_time)
+            if config.SINGLE_FLIGHT_ENABLED:
+                flight_key = normalize_query_key(request.query, request.brand, request.model, request.k,
+                                                 request.appliance_type)
+                generated, shared = await single_flight.do(flight_key, generate)
+            else:
+                generated, shared = await generate(), False
+            if shared:
+                tracing.annotate(coalesced=True)
             
-            # LLM generation phase
-            llm_start = time.time()
-            result = await asyncio.to_thread(
-                companion_ai.process_query,
+            search_time = generated.search_time
+            llm_time = generated.llm_time
+            response = generated.model_copy(update={"processing_time": time.time() - start_time})
+            
+            # Log metrics
+            log_metrics(
                 request.query,
-                chunks,
-                request.brand,
-                request.model
+                response.processing_time,
+                search_time,
+                llm_time,
+                response.safety_flag,
+                safety_time,
+                response.safety_level
             )
-            llm_time = time.time() - llm_start
-            
-            
-            # Build sources from result
-            sources = []
-            for source in result.get("sources", []):
-                # Convert page to int, handle non-numeric values
-                page_value = source.get("page")
-                if isinstance(page_value, str):
-                    try:
-                        page_int = int(page_value)
-                    except (ValueError, TypeError):
-                        page_int = None
-                elif isinstance(page_value, int):
-                    page_int = page_value
-                else:
-                    page_int = None
-                
-                source_info = SourceInfo(
-                    filename=source.get("filename", "unknown"),
-                    page=page_int,
-                    brand=source.get("brand"),
-                    model=source.get("model"),
-                    relevance_score=source.get("relevance_score", 0.0)
-                )
-                sources.append(source_info)
-            
-            # Extract values from result
-            answer = result.get("answer", "No answer generated")
-            confidence_score = result.get("confidence_score", 0.85)
-            safety_flag = result.get("safety_flag", False)
-            safety_level = result.get("safety_level", "safe")
-            safety_message = result.get("safety_message", "")
-            
+        
         else:
             # Fallback mode
-            answer = "System is initializing. Please try again in a moment."
-            sources = []
-            confidence_score = 0.0
-        
-        # Calculate total processing time
-        processing_time = time.time() - start_time
-        
-        # Log metrics
-        log_metrics(
-            request.query,
-            processing_time,
-            search_time,
-            llm_time,
-            safety_flag
-        )
-        
-        response = AnswerResponse(
-            answer=answer,
-            safety_flag=safety_flag,
-            safety_level=safety_level,
-            safety_message=safety_message if safety_message else None,
-            sources=sources,
-            chunks_used=len(sources),
-            processing_time=processing_time,
-            search_time=search_time,
-            llm_time=llm_time,
-            confidence_score=confidence_score
-        )
+            processing_time = time.time() - start_time
+            log_metrics(request.query, processing_time, None, None, safety_flag, safety_time, safety_level)
+            
+            # Still loading: hazards get their safety guidance, everything else a retry hint
+            response = AnswerResponse(
+                answer=safety_message if safety_flag and safety_message else
+                       "System is initializing. Please try again in a moment.",
+                safety_flag=safety_flag,
+                safety_level=safety_level,
+                safety_message=safety_message if safety_message else None,
+                sources=[],
+                chunks_used=0,
+                processing_time=processing_time,
+                search_time=search_time,
+                llm_time=llm_time,
+                confidence_score=0.0
+            )
         
-        return response
+        if cache_embedding is not None and companion_ai and response.safety_level == "safe" and not shared:
+            answer_cache.put(cache_embedding, cache_scope, response.model_dump())
         
+        return _json_response(response)
+    
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         processing_time = time.time() - start_time
@@ -297,6 +1089,475 @@ async def get_answer(request: QueryRequest):
             confidence_score=0.0
         )
 
+async def _generate_answer(request: QueryRequest, cache_embedding: Any, safety_level: str,
+                           safety_message: str, hint: str = "", chunks: Optional[List[Dict[str, Any]]] = None,
+                           search_time: float = 0.0) -> AnswerResponse:
+    """
+    Search + LLM for one request; processing_time covers only this part.
+    `hint` is appended to the question; `chunks` (with the `search_time` they
+    took) were already retrieved by the lexical fast path.
+    """
+    start_time = time.time()
+    
+    # Get relevant chunks with timing
+    if chunks is None:
+        chunks = await _search_chunks(request.query, request.k, cache_embedding, _search_filter(request))
+        search_time = time.time() - start_time
+    
+    # LLM generation phase (bounded by admission control)
+    async with admission.slot("llm") as queued:
+        if queued:
+            tracing.add_span("llm_queue", queued)
+        llm_start = time.time()
+        with tracing.span("llm"):
+            if llm_client is not None:
+                # Awaits a pooled connection instead of pinning a thread; cancellable
+                messages = build_messages(companion_ai, request.query + hint, chunks, request.brand, request.model)
+                result = {
+                    "answer": await llm_client.generate(messages),
+                    **result_fields(chunks, safety_level, safety_message)
+                }
+            else:
+                result = await asyncio.to_thread(
+                    companion_ai.process_query,
+                    request.query + hint,
+                    chunks,
+                    request.brand,
+                    request.model
+                )
+        llm_time = time.time() - llm_start
+    _record_llm_spans(result)
+    
+    return _answer_from_result(result, time.time() - start_time, search_time, llm_time)
+
+def _search_filter(request: QueryRequest) -> Optional[SearchFilter]:
+    """Metadata filter for a request's brand / model / appliance_type, if any"""
+    if not config.SEARCH_FILTER_ENABLED:
+        return None
+    search_filter = SearchFilter(request.brand, request.model, request.appliance_type)
+    return None if search_filter.empty else search_filter
+
+def _search_many(items: List[Tuple[str, int, Any, Optional[SearchFilter]]]
+                 ) -> Tuple[List[List[Dict[str, Any]]], Dict[str, float]]:
+    """
+    Retrieve chunks for many queries: one encoder call + one index.search over
+    the whole query matrix. Items are (query, k, embedding or None, filter or None);
+    embeddings already computed (e.g. for the answer cache) are reused. Filtered
+    items are searched per filter, scoring only the matching manuals' chunks.
+    With the lexical index, BM25 runs first: a decisive exact-token match is
+    answered without encoding the query, otherwise both rankings are fused (RRF).
+    Falls back to per-query search_chunks (unfiltered) when the VectorStore is unavailable.
+    Returns (chunks per item, stage timings in seconds for the whole batch).
+    """
+    timings = {}
+    encoder = get_query_encoder(companion_ai) if vector_store else None
+    
+    if encoder is None:
+        stage_start = time.perf_counter()
+        results = [companion_ai.search_chunks(query, k) for query, k, _, _ in items]
+        timings["search_chunks"] = time.perf_counter() - stage_start
+        return results, timings
+    
+    results: List[List[Dict[str, Any]]] = [[] for _ in items]
+    embeddings = [embedding for _, _, embedding, _ in items]
+    lexical_hits: List[List[Tuple[str, float, float]]] = [[] for _ in items]
+    dense = list(range(len(items)))
+    
+    if config.LEXICAL_ENABLED and vector_store.lexical is not None:
+        stage_start = time.perf_counter()
+        for i, (query, k, _, search_filter) in enumerate(items):
+            lexical_hits[i] = vector_store.search_lexical(query, max(k, config.HYBRID_CANDIDATES), search_filter)
+        timings["lexical_search"] = time.perf_counter() - stage_start
+        
+        # Exact-token matches that settle the query skip the encoder entirely
+        if config.LEXICAL_FAST_PATH:
+            for i, (_, k, embedding, _) in enumerate(items):
+                if embedding is None and is_decisive(lexical_hits[i], config.LEXICAL_FAST_PATH_MIN_SCORE,
+                                                     config.LEXICAL_FAST_PATH_MARGIN):
+                    results[i] = [vector_store.chunk(chunk_id, lexical_relevance(score))
+                                  for chunk_id, score, _ in lexical_hits[i][:k]]
+            dense = [i for i in dense if not results[i]]
+            metrics_store["retrieval_lexical"] += len(items) - len(dense)
+    
+    missing = [i for i in dense if embeddings[i] is None]
+    if missing:
+        stage_start = time.perf_counter()
+        encoded = encode_queries(encoder, [items[i][0] for i in missing])
+        for row, i in enumerate(missing):
+            embeddings[i] = encoded[row]
+        timings["query_embedding"] = time.perf_counter() - stage_start
+    
+    dense_hits = _dense_search_many(items, embeddings, dense, timings)
+    
+    stage_start = time.perf_counter()
+    for i in dense:
+        k = items[i][1]
+        if not lexical_hits[i]:
+            results[i] = dense_hits[i][:k]
+            metrics_store["retrieval_dense"] += 1
+            continue
+        by_id = {chunk["id"]: chunk for chunk in dense_hits[i]}
+        lexical_scores = {chunk_id: score for chunk_id, score, _ in lexical_hits[i]}
+        fused = reciprocal_rank_fusion(
+            [[chunk["id"] for chunk in dense_hits[i]], [chunk_id for chunk_id, _, _ in lexical_hits[i]]],
+            k, rrf_k=config.HYBRID_RRF_K
+        )
+        results[i] = [by_id.get(chunk_id) or vector_store.chunk(chunk_id, lexical_relevance(lexical_scores[chunk_id]))
+                      for chunk_id, _ in fused]
+        metrics_store["retrieval_hybrid"] += 1
+    if any(lexical_hits[i] for i in dense):
+        timings["rank_fusion"] = time.perf_counter() - stage_start
+    
+    return results, timings
+
+def _dense_search_many(items: List[Tuple[str, int, Any, Optional[SearchFilter]]], embeddings: List[Any],
+                       selected: List[int], timings: Dict[str, float]) -> Dict[int, List[Dict[str, Any]]]:
+    """Vector search for the selected items: one call for the unfiltered ones, one per distinct filter"""
+    depth = config.HYBRID_CANDIDATES if config.LEXICAL_ENABLED and vector_store.lexical is not None else 0
+    hits: Dict[int, List[Dict[str, Any]]] = {}
+    if not selected:
+        return hits
+    unfiltered = [i for i in selected if items[i][3] is None]
+    filtered: Dict[SearchFilter, List[int]] = {}
+    for i in selected:
+        if items[i][3] is not None:
+            filtered.setdefault(items[i][3], []).append(i)
+    timings["chunk_fetch"] = 0.0
+    
+    if unfiltered:
+        max_k = max(max(items[i][1] for i in unfiltered), depth)
+        stage_start = time.perf_counter()
+        scores, rows = vector_store.search_rows(np.stack([embeddings[i] for i in unfiltered]), max_k)
+        timings["faiss_search"] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
+        hits.update(zip(unfiltered, vector_store.resolve(scores, rows)))
+        timings["chunk_fetch"] += time.perf_counter() - stage_start
+    
+    for search_filter, members in filtered.items():
+        max_k = max(max(items[i][1] for i in members), depth)
+        stage_start = time.perf_counter()
+        scores, rows, applied = vector_store.search_filtered_rows(
+            np.stack([embeddings[i] for i in members]), max_k, search_filter,
+            min_candidates=config.SEARCH_FILTER_MIN_CANDIDATES or None
+        )
+        timings["filtered_search"] = timings.get("filtered_search", 0.0) + time.perf_counter() - stage_start
+        metrics_store["search_filtered"] += len(members)
+        if applied != search_filter:
+            metrics_store["search_filter_relaxed"] += len(members)
+            logger.debug(f"Search filter {search_filter.to_dict()} too narrow, used {applied.to_dict()}")
+        
+        stage_start = time.perf_counter()
+        hits.update(zip(members, vector_store.resolve(scores, rows)))
+        timings["chunk_fetch"] += time.perf_counter() - stage_start
+    
+    return hits
+
+def _search_batch_scatter(items: List[Tuple[str, int, Any, Optional[SearchFilter]]]) -> List[Tuple[List[Dict[str, Any]], Dict[str, float]]]:
+    """SearchBatcher batch function: every item gets its chunks plus the shared batch timings"""
+    results, timings = _search_many(items)
+    timings["batch_size"] = len(items)
+    return [(hits, timings) for hits in results]
+
+def _record_search_spans(timings: Dict[str, float], chunks: List[Dict[str, Any]]):
+    """Copy retrieval stage timings and chunk ids onto the current trace"""
+    trace = tracing.current_trace()
+    if trace is None:
+        return
+    batch_size = timings.get("batch_size", 1)
+    for name, seconds in timings.items():
+        if name != "batch_size":
+            trace.add_span(name, seconds, batch_size=batch_size)
+    trace.chunk_ids.extend(str(chunk.get("id")) for chunk in chunks if isinstance(chunk, dict))
+
+async def _lexical_fast_path(query: str, k: int, search_filter: Optional[SearchFilter]
+                             ) -> Optional[List[Dict[str, Any]]]:
+    """
+    Chunks for a query whose BM25 result is decisive on its own, else None.
+    Run before the answer-cache embedding, which would otherwise make every
+    /answer query pay for the encoder.
+    """
+    if not (config.LEXICAL_ENABLED and config.LEXICAL_FAST_PATH and vector_store
+            and vector_store.lexical is not None):
+        return None
+    async with admission.slot("search") as queued:
+        if queued:
+            tracing.add_span("search_queue", queued)
+        stage_start = time.perf_counter()
+        hits = await asyncio.to_thread(vector_store.search_lexical, query, max(k, config.HYBRID_CANDIDATES),
+                                       search_filter)
+        timings = {"lexical_search": time.perf_counter() - stage_start}
+    if not is_decisive(hits, config.LEXICAL_FAST_PATH_MIN_SCORE, config.LEXICAL_FAST_PATH_MARGIN):
+        _record_search_spans(timings, [])
+        return None
+    chunks = [vector_store.chunk(chunk_id, lexical_relevance(score)) for chunk_id, score, _ in hits[:k]]
+    metrics_store["retrieval_lexical"] += 1
+    _record_search_spans(timings, chunks)
+    return chunks
+
+async def _search_chunks(query: str, k: int, embedding: Any = None,
+                         search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+    """Search for one query, coalesced with concurrent requests when batching is on"""
+    async with admission.slot("search") as queued:
+        if queued:
+            tracing.add_span("search_queue", queued)
+        if search_batcher:
+            chunks, timings = await search_batcher.submit((query, k, embedding, search_filter))
+        else:
+            results, timings = await asyncio.to_thread(_search_many, [(query, k, embedding, search_filter)])
+            chunks = results[0]
+    _record_search_spans(timings, chunks)
+    return chunks
+
+@app.post("/answer/batch", response_model=BatchAnswerResponse)
+async def get_answers_batch(request: BatchQueryRequest):
+    """
+    Batch answer endpoint for offline workloads
+    Retrieval is vectorized across the batch; generation runs on a bounded
+    worker pool (BATCH_LLM_WORKERS). Per-item search_time is the amortized share
+    of the batch search.
+    """
+    start_time = time.time()
+    items = request.queries
+    
+    # Safety checks
+    safety_start = time.time()
+    verdicts = []
+    for item in items:
+        verdicts.append(_analyze_safety(item.query))
+    safety_time = time.time() - safety_start
+    emergencies = [_emergency_for(item.query, safety_level) for item, (safety_level, _) in zip(items, verdicts)]
+    tracing.add_span("safety", safety_time, batch_size=len(items))
+    
+    # Error-code table answers (no generation needed); variants become prompt hints
+    matches = [None if emergency else _error_code_match(item) for item, emergency in zip(items, emergencies)]
+    table_answers = [
+        await _error_code_answer(item, match, safety_level, safety_message, start_time, safety_time / len(items))
+        for item, match, (safety_level, safety_message) in zip(items, matches, verdicts)
+    ]
+    
+    # Only these need retrieval and generation (and CompanionAI, which may still be loading)
+    pending = [i for i in range(len(items)) if not (emergencies[i] or table_answers[i])]
+    if pending and not companion_ai:
+        raise HTTPException(status_code=503, detail="System is initializing. Please try again in a moment.",
+                            headers={"Retry-After": "5"})
+    
+    # Vectorized retrieval
+    search_start = time.time()
+    search_items = [(items[i].query, items[i].k, None, _search_filter(items[i])) for i in pending]
+    found, search_timings = await asyncio.to_thread(_search_many, search_items) if pending else ([], {})
+    chunks_per_item = dict(zip(pending, found))
+    _record_search_spans({**search_timings, "batch_size": len(pending)}, [])
+    search_time = time.time() - search_start
+    item_search_time = search_time / max(len(pending), 1)
+    
+    # Generation on the bounded pool
+    loop = asyncio.get_running_loop()
+    
+    def generate(item: QueryRequest, chunks: List[Dict[str, Any]], hint: str):
+        llm_start = time.time()
+        result = companion_ai.process_query(item.query + hint, chunks, item.brand, item.model)
+        return result, time.time() - llm_start
+    
+    llm_start = time.time()
+    outcomes = await asyncio.gather(*[
+        loop.run_in_executor(batch_llm_executor, generate, items[i], chunks_per_item[i], _error_code_hint(matches[i]))
+        for i in pending
+    ], return_exceptions=True)
+    outcomes = iter(outcomes)
+    llm_time = time.time() - llm_start
+    tracing.add_span("llm", llm_time, batch_size=len(items))
+    
+    answers = []
+    failed = 0
+    for item, (safety_level, safety_message), emergency, table_answer in zip(items, verdicts, emergencies,
+                                                                              table_answers):
+        if emergency:
+            answers.append(_short_circuit_answer(item.query, emergency, safety_level, safety_message,
+                                                 start_time, safety_time / len(items)))
+            continue
+        if table_answer:
+            answers.append(table_answer)
+            continue
+        
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            logger.error(f"Batch item error: {str(outcome)}")
+            failed += 1
+            answers.append(AnswerResponse(
+                answer="I apologize, but I encountered an error processing your request. Please try again.",
+                safety_flag=safety_level != "safe",
+                safety_level=safety_level,
+                safety_message=safety_message if safety_message else None,
+                sources=[],
+                chunks_used=0,
+                processing_time=0.0,
+                search_time=item_search_time,
+                llm_time=0.0,
+                confidence_score=0.0
+            ))
+            continue
+        
+        result, item_llm_time = outcome
+        answer = _answer_from_result(result, item_search_time + item_llm_time, item_search_time, item_llm_time)
+        log_metrics(item.query, answer.processing_time, item_search_time, item_llm_time, answer.safety_flag,
+                    safety_time / len(items), answer.safety_level)
+        answers.append(answer)
+    
+    return BatchAnswerResponse(
+        answers=answers,
+        total_queries=len(items),
+        failed_queries=failed,
+        processing_time=time.time() - start_time,
+        safety_time=safety_time,
+        search_time=search_time,
+        llm_time=llm_time
+    )
+
+@app.post("/answer/stream")
+async def stream_answer(request: QueryRequest):
+    """
+    Streaming answer endpoint (Server-Sent Events)
+    Frames: safety -> [emergency] -> [error_code] -> sources -> token* -> done (timing fields of AnswerResponse)
+    emergency carries the precomputed instructions for emergency/danger
+    verdicts; the manual-grounded answer streams after it. A known error code
+    (as written, or a variant only one entry can mean) is answered from the
+    table (error_code frame, then its sources and text).
+    """
+    # Full queues get a plain 503 before the stream starts
+    admission.check("search")
+    admission.check("llm")
+    
+    # The body outlives this handler; its spans still go on this request's trace
+    trace = tracing.current_trace()
+    
+    async def event_stream() -> AsyncIterator[str]:
+        tracing.activate(trace)
+        start_time = time.time()
+        search_time = 0
+        llm_time = 0
+        safety_flag = False
+        
+        try:
+            # Safety verdict goes out first
+            safety_start = time.time()
+            with tracing.span("safety"):
+                safety_level, safety_message = _analyze_safety(request.query)
+                safety_flag = safety_level != "safe"
+            safety_time = time.time() - safety_start
+            
+            yield _sse_event("safety", {
+                "safety_flag": safety_flag,
+                "safety_level": safety_level,
+                "safety_message": safety_message if safety_message else None
+            })
+            
+            # Precomputed instructions right away; the manual-grounded detail streams after
+            emergency = _emergency_for(request.query, safety_level)
+            error_code = None if emergency else _error_code_match(request)
+            if emergency:
+                yield _sse_event("emergency", emergency)
+                latency_metrics.record("short_circuit", time.time() - start_time)
+                metrics_store["short_circuits"] += 1
+                tracing.annotate(short_circuit=True, hazard=emergency["hazard"])
+            else:
+                table_answer = await _error_code_answer(request, error_code, safety_level, safety_message,
+                                                        start_time, safety_time)
+                if table_answer:
+                    yield _sse_event("error_code", table_answer.error_code_info.model_dump())
+                    yield _sse_event("sources", {"sources": [source.model_dump() for source in table_answer.sources]})
+                    yield _sse_event("token", {"text": table_answer.answer})
+                    yield _sse_event("done", {
+                        "safety_flag": table_answer.safety_flag,
+                        "safety_level": table_answer.safety_level,
+                        "chunks_used": table_answer.chunks_used,
+                        "processing_time": time.time() - start_time,
+                        "search_time": 0.0,
+                        "llm_time": 0.0,
+                        "first_token_time": None,
+                        "confidence_score": table_answer.confidence_score
+                    })
+                    return
+            
+            if not companion_ai:
+                yield _sse_event("token", {"text": "System is initializing. Please try again in a moment."})
+                yield _sse_event("done", {
+                    "chunks_used": 0,
+                    "processing_time": time.time() - start_time,
+                    "search_time": search_time,
+                    "llm_time": llm_time,
+                    "confidence_score": 0.0
+                })
+                return
+            
+            # Sources from retrieval
+            search_start = time.time()
+            chunks = await _search_chunks(request.query, request.k, search_filter=_search_filter(request))
+            search_time = time.time() - search_start
+            
+            sources = [_to_source_info(chunk).model_dump() for chunk in chunks]
+            yield _sse_event("sources", {"sources": sources})
+            
+            # LLM tokens as they are produced
+            first_token_time = None
+            final: Dict[str, Any] = {}
+            async with admission.slot("llm") as queued:
+                if queued:
+                    tracing.add_span("llm_queue", queued)
+                llm_start = time.time()
+                async for token in _iter_answer_tokens(request.query + _error_code_hint(error_code), chunks,
+                                                       request.brand, request.model, final):
+                    if first_token_time is None:
+                        first_token_time = time.time() - llm_start
+                        tracing.add_span("llm_first_token", first_token_time)
+                    yield _sse_event("token", {"text": token})
+                llm_time = time.time() - llm_start
+            tracing.add_span("llm", llm_time)
+            _record_llm_spans(final)
+            
+            safety_flag = final.get("safety_flag", safety_flag)
+            processing_time = time.time() - start_time
+            
+            log_metrics(
+                request.query,
+                processing_time,
+                search_time,
+                llm_time,
+                safety_flag,
+                safety_time,
+                final.get("safety_level", safety_level)
+            )
+            
+            yield _sse_event("done", {
+                "safety_flag": safety_flag,
+                "safety_level": final.get("safety_level", safety_level),
+                "chunks_used": len(final.get("sources", sources)),
+                "processing_time": processing_time,
+                "search_time": search_time,
+                "llm_time": llm_time,
+                "first_token_time": first_token_time,
+                "confidence_score": final.get("confidence_score", 0.85)
+            })
+        
+        except Overloaded as e:
+            yield _sse_event("error", {
+                "message": f"Server busy. Please retry in {e.retry_after}s.",
+                "retry_after": e.retry_after,
+                "processing_time": time.time() - start_time
+            })
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield _sse_event("error", {
+                "message": "I apologize, but I encountered an error processing your request. Please try again.",
+                "processing_time": time.time() - start_time
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/upload", response_model=UploadResponse)
 async def upload_manual(
     background_tasks: BackgroundTasks,
@@ -304,42 +1565,104 @@ async def upload_manual(
 ):
     """
     Handle manual upload with background processing
+    Streams to disk, and skips ingestion when the same content is already indexed
     """
     start_time = time.time()
+    partial_path = None
     
     try:
         # Validate file
-        if not file.filename.endswith('.pdf'):
+        filename = Path(file.filename or "").name
+        if not filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
         
-        # Save file temporarily
-        upload_dir = Path("uploads")
+        # Nothing can ingest it until the index or CompanionAI has loaded
+        if ingestion_queue is None and companion_ai is None:
+            raise HTTPException(status_code=503, detail="System is initializing. Please try again in a moment.",
+                                headers={"Retry-After": "5"})
+        
+        # Stream to a unique temporary file so concurrent uploads never collide
+        upload_dir = Path(config.UPLOAD_DIR)
         upload_dir.mkdir(exist_ok=True)
+        partial_path = upload_dir / f".{uuid.uuid4().hex}.part"
         
-        file_path = upload_dir / file.filename
+        content_hash, size = await stream_to_disk(file.read, partial_path, config.UPLOAD_CHUNK_SIZE)
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Same bytes already indexed (or being indexed) under any name?
+        existing = manual_registry.claim(content_hash, filename, size)
+        if existing:
+            partial_path.unlink()
+            logger.info(f"Skipping duplicate upload {filename} (same content as {existing.get('filename')})")
+            return UploadResponse(
+                filename=filename,
+                status="duplicate" if existing.get("status") == "indexed" else "already_processing",
+                chunks_processed=existing.get("chunks") or 0,
+                processing_time=time.time() - start_time,
+                content_hash=content_hash,
+                duplicate_of=existing.get("filename")
+            )
+        
+        # Keep the original filename (used for citations) inside a per-content directory
+        file_path = upload_dir / content_hash[:16] / filename
+        file_path.parent.mkdir(exist_ok=True)
+        partial_path.replace(file_path)
+        partial_path = None
         
-        # Process in background
-        background_tasks.add_task(process_uploaded_file, file_path)
+        # Parse and embed in a worker process; progress at GET /upload/{job_id}
+        job_id = None
+        if ingestion_queue:
+            job_id = ingestion_queue.submit(file_path, filename, content_hash, on_done=_on_ingestion_done)["job_id"]
+        else:
+            # No VectorStore to publish into - let CompanionAI ingest it in-process
+            metrics_store["ingestion_pending"] += 1
+            background_tasks.add_task(process_uploaded_file, file_path, content_hash)
         
         processing_time = time.time() - start_time
         
         return UploadResponse(
-            filename=file.filename,
+            filename=filename,
             status="processing",
-            chunks_processed=0,  # Will be updated by background task
-            processing_time=processing_time
+            chunks_processed=0,  # Progress is reported by GET /upload/{job_id}
+            processing_time=processing_time,
+            content_hash=content_hash,
+            job_id=job_id
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if partial_path is not None and partial_path.exists():
+            partial_path.unlink()
+        await file.close()
+
+@app.get("/upload/{job_id}", response_model=IngestionJobStatus)
+async def get_upload_status(job_id: str):
+    """Progress of an ingestion job (pages parsed, chunks embedded, errors)"""
+    job = await asyncio.to_thread(ingestion_queue.get, job_id) if ingestion_queue else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown upload job")
+    
+    return IngestionJobStatus(
+        job_id=job["job_id"],
+        filename=job["filename"],
+        status=job["status"],
+        pages_total=job.get("pages_total"),
+        pages_parsed=job.get("pages_parsed", 0),
+        chunks_total=job.get("chunks_total", 0),
+        chunks_embedded=job.get("chunks_embedded", 0),
+        chunks_published=job.get("chunks_published", 0),
+        errors=job.get("errors", []),
+        throttled=ingestion_queue.throttled or ingestion_queue.throttle_flag.exists(),
+        created_at=job["created_at"],
+        updated_at=job.get("updated_at", job["created_at"])
+    )
 
-async def process_uploaded_file(file_path: Path):
+async def process_uploaded_file(file_path: Path, content_hash: str):
     """Background task to process uploaded PDF"""
+    indexed = False
     try:
         if companion_ai:
             # Process PDF and add to knowledge base
@@ -348,50 +1671,144 @@ async def process_uploaded_file(file_path: Path):
                 str(file_path)
             )
             logger.info(f"Processed {file_path.name}: {chunks_processed} chunks")
+            await asyncio.to_thread(manual_registry.mark_indexed, content_hash, chunks_processed)
+            indexed = True
+            
+            # Index changed - cached answers may cite stale sources
+            if answer_cache:
+                answer_cache.invalidate()
         
         # Clean up temporary file
         file_path.unlink()
-        
+        file_path.parent.rmdir()
+    
     except Exception as e:
         logger.error(f"Background processing error: {str(e)}")
+    finally:
+        if not indexed:
+            manual_registry.release(content_hash)
+        metrics_store["ingestion_pending"] -= 1
 
 @app.get("/metrics", response_model=MetricsResponse)
 async def get_metrics():
     """Get system performance metrics"""
     try:
-        queries = metrics_store["queries"]
-        
-        if not queries:
-            return MetricsResponse(
-                total_queries=0,
-                avg_response_time=0.0,
-                avg_search_time=0.0,
-                avg_llm_time=0.0,
-                safety_alerts_triggered=0,
-                precision_at_5=0.0
-            )
-        
-        # Calculate averages
-        avg_response_time = sum(q["response_time"] for q in queries) / len(queries)
-        avg_search_time = sum(q["search_time"] for q in queries) / len(queries)
-        avg_llm_time = sum(q["llm_time"] for q in queries) / len(queries)
-        
-        # Estimate precision@5 (would need evaluation dataset for real calculation)
-        precision_at_5 = 0.85  # Placeholder - implement with evaluation script
+        extra_fields = {}
+        cache_stats = answer_cache.stats() if answer_cache else {}
+        extra_fields["cache_hits"] = cache_stats.get("hits", 0)
+        extra_fields["cache_misses"] = cache_stats.get("misses", 0)
+        extra_fields["cache_hit_rate"] = cache_stats.get("hit_rate", 0.0)
+        if search_batcher:
+            batch_stats = search_batcher.stats()
+            extra_fields["search_batches"] = batch_stats["batches"]
+            extra_fields["avg_search_batch_size"] = batch_stats["avg_batch_size"]
         
+        # precision@5 needs labelled queries - measured offline by scripts/evaluate.py
         return MetricsResponse(
-            total_queries=len(queries),
-            avg_response_time=avg_response_time,
-            avg_search_time=avg_search_time,
-            avg_llm_time=avg_llm_time,
+            total_queries=latency_metrics.count("total"),
+            avg_response_time=latency_metrics.mean("total"),
+            avg_search_time=latency_metrics.mean("search"),
+            avg_llm_time=latency_metrics.mean("llm"),
+            avg_safety_time=latency_metrics.mean("safety"),
             safety_alerts_triggered=metrics_store["safety_alerts"],
-            precision_at_5=precision_at_5
+            precision_at_5=None,
+            latency_percentiles=latency_metrics.snapshot(),
+            emergency_short_circuits=metrics_store["short_circuits"],
+            avg_short_circuit_time=latency_metrics.mean("short_circuit"),
+            admission=admission.stats(),
+            coalesced_requests=single_flight.coalesced,
+            client_disconnects=metrics_store["client_disconnects"],
+            llm_backends=llm_client.stats() if llm_client else {},
+            llm_hedging=llm_client.counters() if llm_client else {},
+            retrieval_paths={path: metrics_store[f"retrieval_{path}"] for path in ("lexical", "hybrid", "dense")},
+            error_code_hits=error_codes.hits if error_codes else 0,
+            error_code_hints=error_codes.hints if error_codes else 0,
+            avg_error_code_time=latency_metrics.mean("error_code"),
+            error_code_table=error_codes.table.stats() if error_codes else {},
+            **extra_fields
         )
-        
+    
     except Exception as e:
         logger.error(f"Metrics error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error retrieving metrics")
 
+def _index_size() -> Optional[int]:
+    """Number of vectors in the serving index, if known"""
+    if vector_store:
+        return vector_store.size
+    index = getattr(companion_ai, "index", None)
+    return getattr(index, "ntotal", None)
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Prometheus/OpenMetrics scrape endpoint"""
+    cache_stats = answer_cache.stats() if answer_cache else {}
+    admission_stats = admission.stats()
+    
+    payload = render_metrics(
+        latency_metrics,
+        metrics_store["requests_by_safety_level"],
+        gauges={
+            "inflight_requests": metrics_store["inflight_requests"],
+            "ingestion_queue_depth": metrics_store["ingestion_pending"] + (ingestion_queue.depth if ingestion_queue else 0),
+            "index_vectors": _index_size(),
+            "index_version": vector_store.version if vector_store else None,
+            "index_delta_vectors": vector_store.delta_size if vector_store else None,
+            **{f"admission_{stage}_{field}": stats[field]
+               for stage, stats in admission_stats.items() for field in ("active", "queued")}
+        },
+        counters={
+            "answer_cache_hits": cache_stats.get("hits"),
+            "answer_cache_misses": cache_stats.get("misses"),
+            "log_records_dropped": sum(writer.dropped for writer in log_writers),
+            "log_rotation_errors": sum(writer.rotation_errors for writer in log_writers),
+            "safety_matcher_disagreements": metrics_store["safety_matcher_disagreements"] if safety_matcher else None,
+            "emergency_short_circuits": metrics_store["short_circuits"],
+            "answer_coalesced_requests": single_flight.coalesced,
+            "search_filtered": metrics_store["search_filtered"],
+            "search_filter_relaxed": metrics_store["search_filter_relaxed"],
+            **{f"{path}_searches": metrics_store[path]
+               for path in ("retrieval_lexical", "retrieval_hybrid", "retrieval_dense")},
+            "client_disconnects": metrics_store["client_disconnects"],
+            "error_code_answers": error_codes.hits if error_codes else None,
+            "error_code_hints": error_codes.hints if error_codes else None,
+            "error_code_table_reloads": error_codes.reloads if error_codes else None,
+            **{f"llm_{name}": value for name, value in (llm_client.counters() if llm_client else {}).items()},
+            **{f"admission_{stage}_rejected": stats["rejected_queue_full"] + stats["rejected_timeout"]
+               for stage, stats in admission_stats.items()}
+        }
+    )
+    return PlainTextResponse(payload, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _check_admin_token(token: Optional[str]):
+    """Admin endpoints are off unless ADMIN_TOKEN is set"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not token or not secrets.compare_digest(token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/error-codes/reload")
+async def reload_error_codes(x_admin_token: Optional[str] = Header(None)):
+    """Re-read the error-code table from ERROR_CODE_TABLE_PATH; the old table keeps serving if it fails"""
+    _check_admin_token(x_admin_token)
+    if error_codes is None:
+        raise HTTPException(status_code=404, detail="Error-code fast path is disabled")
+    try:
+        table_stats = await asyncio.to_thread(error_codes.reload)
+    except Exception as e:
+        logger.error(f"Error code table reload error: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Could not load {config.ERROR_CODE_TABLE_PATH}: {str(e)}")
+    return {"status": "reloaded", **table_stats}
+
+@app.get("/debug/traces")
+async def get_recent_traces(limit: int = 50, slow_only: bool = False):
+    """Most recent request traces (newest first) with their span breakdown"""
+    return {
+        "slow_threshold_ms": trace_log.slow_threshold_ms,
+        "slow_queries_logged": trace_log.slow_count,
+        "traces": trace_log.recent(limit=min(max(limit, 1), config.TRACE_RING_SIZE), slow_only=slow_only)
+    }
+
 @app.get("/demo/queries")
 async def get_demo_queries():
     """Get predefined demo queries for testing"""
@@ -434,7 +1851,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        workers=1,  # Adjust based on system resources
+        workers=config.API_WORKERS,  # >1 shares the memory-mapped index (INDEX_MMAP)
         log_level="info",
         access_log=True,
         reload=False  # Disable in production
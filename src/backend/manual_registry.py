@@ -0,0 +1,150 @@
+"""
+Content-hash registry of ingested manuals, used to skip re-ingesting a PDF
+that is already in the index (under any filename)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+async def stream_to_disk(read: Callable[[int], Awaitable[bytes]], destination: Path,
+                         chunk_size: int = HASH_CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    Copy an upload (`read` as UploadFile.read) to disk in chunk_size pieces,
+    hashing as it goes. Disk writes and hashing run off the event loop.
+    Returns (sha256, size).
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    
+    def write_chunk(out, chunk: bytes):
+        hasher.update(chunk)
+        out.write(chunk)
+    
+    out = await asyncio.to_thread(open, destination, "wb")
+    try:
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            await asyncio.to_thread(write_chunk, out, chunk)
+    finally:
+        await asyncio.to_thread(out.close)
+    
+    return hasher.hexdigest(), size
+
+
+class ManualRegistry:
+    """
+    sha256 -> {filename, size, status, chunks, ...}
+    status is "processing" while ingestion runs and "indexed" once done;
+    indexed entries are appended to a JSONL file so they survive restarts.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._load()
+        logger.info(f"Manual registry: {len(self._entries)} manuals indexed")
+    
+    def _load(self) -> int:
+        """Read entries appended since the last call; returns how many"""
+        if not self.path.exists():
+            return 0
+        loaded = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written by another process
+                self._offset += len(line)
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["sha256"]] = entry
+                    loaded += 1
+        return loaded
+    
+    def refresh(self) -> int:
+        """Pick up manuals indexed by other worker processes"""
+        with self._lock:
+            return self._load()
+    
+    def _append(self, entry: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(sha256)
+    
+    def claim(self, sha256: str, filename: str, size: int) -> Optional[Dict[str, Any]]:
+        """
+        Reserve a hash for ingestion. Returns the existing entry when the
+        content is already indexed or being processed, else None (claimed).
+        """
+        with self._lock:
+            existing = self._entries.get(sha256)
+            if existing:
+                return existing
+            self._entries[sha256] = {
+                "sha256": sha256,
+                "filename": filename,
+                "size": size,
+                "status": "processing",
+                "claimed_at": time.time()
+            }
+            return None
+    
+    def mark_indexed(self, sha256: str, chunks: Optional[int] = None, source: str = "upload", **details):
+        with self._lock:
+            entry = self._entries.get(sha256, {"sha256": sha256})
+            entry.update(details)
+            entry.update(status="indexed", chunks=chunks, source=source, indexed_at=time.time())
+            self._entries[sha256] = entry
+            self._append(entry)
+            self._load()
+    
+    def release(self, sha256: str):
+        """Forget a failed claim so the manual can be uploaded again"""
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry and entry.get("status") == "processing":
+                del self._entries[sha256]
+    
+    def seed_from_directory(self, directory: Path, indexed_names: Iterable[str]):
+        """
+        Register PDFs under `directory` that the index already contains
+        (matched by filename) and warn about byte-identical duplicates.
+        """
+        indexed_names = set(indexed_names)
+        for pdf in sorted(Path(directory).rglob("*.pdf")):
+            sha256 = file_sha256(pdf)
+            existing = self.get(sha256)
+            if existing:
+                if existing.get("filename") not in (pdf.name, pdf.stem):
+                    logger.warning(f"Duplicate manual content: {pdf} matches {existing.get('filename')}")
+                continue
+            if pdf.name in indexed_names or pdf.stem in indexed_names:
+                self.mark_indexed(sha256, source=str(directory), filename=pdf.name, size=pdf.stat().st_size)
@@ -0,0 +1,103 @@
+"""
+Prometheus text exposition (format 0.0.4) rendered from the backend's own
+in-memory counters and histograms - no extra client library, and collection
+is a handful of array sums so it can stay on under full load.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from backend.latency_metrics import LatencyRecorder
+
+# Exposition buckets (seconds) - coarse enough for Prometheus, wide enough for local LLMs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc, ru_maxrss elsewhere)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+    
+    def header(self, name: str, metric_type: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+    
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.lines.append(f"{name}{_labels(labels or {})} {value}")
+    
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(latency: LatencyRecorder,
+                   requests_by_safety_level: Dict[str, int],
+                   gauges: Dict[str, float],
+                   counters: Optional[Dict[str, float]] = None) -> str:
+    """
+    Render the exposition payload.
+    gauges: metric suffix -> value (e.g. "inflight_requests": 3); None values are skipped
+    counters: metric suffix -> monotonic value (cache hits, coalesced requests, ...)
+    """
+    out = _Writer()
+    
+    out.header("companion_requests_total", "counter", "Answered requests by safety level")
+    for level, count in sorted(requests_by_safety_level.items()):
+        out.sample("companion_requests_total", count, {"safety_level": level})
+    
+    out.header("companion_stage_latency_seconds", "histogram", "Latency per request stage")
+    for stage, histogram in sorted(latency.histograms().items()):
+        for bound, count in histogram.cumulative(LATENCY_BUCKETS):
+            out.sample("companion_stage_latency_seconds_bucket", count,
+                       {"stage": stage, "le": _format_bound(bound)})
+        out.sample("companion_stage_latency_seconds_bucket", histogram.total_count,
+                   {"stage": stage, "le": "+Inf"})
+        out.sample("companion_stage_latency_seconds_sum", histogram.total_sum, {"stage": stage})
+        out.sample("companion_stage_latency_seconds_count", histogram.total_count, {"stage": stage})
+    
+    for name, value in sorted((counters or {}).items()):
+        if value is None:
+            continue
+        out.header(f"companion_{name}_total", "counter", name.replace("_", " ").capitalize())
+        out.sample(f"companion_{name}_total", value)
+    
+    for name, value in sorted(gauges.items()):
+        if value is None:
+            continue
+        out.header(f"companion_{name}", "gauge", name.replace("_", " ").capitalize())
+        out.sample(f"companion_{name}", value)
+    
+    rss = process_rss_bytes()
+    if rss is not None:
+        out.header("process_resident_memory_bytes", "gauge", "Resident memory size in bytes")
+        out.sample("process_resident_memory_bytes", rss)
+    
+    return out.text()
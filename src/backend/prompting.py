@@ -0,0 +1,69 @@
+"""
+Prompt and result assembly for the async LLM path (core/models/async_llm),
+which generates without going through CompanionAI.process_query
+"""
+
+from typing import Any, Dict, List, Optional
+
+SYSTEM_PROMPT = (
+    "You are CompanionAI, an appliance troubleshooting assistant. Answer using only the manual "
+    "excerpts provided, cite the manual and page you used, and keep steps short and numbered. "
+    "If the question involves gas, electrical, fire or water hazards, put safety instructions first "
+    "and recommend a qualified technician. If the excerpts don't cover the question, say so."
+)
+
+MAX_CONTEXT_CHUNKS = 5
+
+
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    return chunk.get("text") or chunk.get("content") or chunk.get("chunk") or ""
+
+
+def _chunk_label(chunk: Dict[str, Any]) -> str:
+    metadata = chunk.get("metadata", {})
+    filename = chunk.get("filename", metadata.get("filename", "manual"))
+    page = chunk.get("page", metadata.get("page"))
+    return f"{filename}, page {page}" if page is not None else filename
+
+
+def build_messages(companion_ai: Any, query: str, chunks: List[Dict[str, Any]],
+                   brand: Optional[str], model: Optional[str]) -> List[Dict[str, str]]:
+    """Chat messages for a query, using CompanionAI's own prompt builder when it has one"""
+    builder = getattr(companion_ai, "build_messages", None)
+    if builder is not None:
+        return builder(query, chunks, brand, model)
+    builder = getattr(companion_ai, "build_prompt", None)
+    if builder is not None:
+        return [{"role": "user", "content": builder(query, chunks, brand, model)}]
+    
+    context = "\n\n".join(
+        f"[{i}] ({_chunk_label(chunk)})\n{_chunk_text(chunk)}"
+        for i, chunk in enumerate(chunks[:MAX_CONTEXT_CHUNKS], 1)
+    )
+    appliance = " ".join(part for part in (brand, model) if part)
+    question = f"Appliance: {appliance}\n\n{query}" if appliance else query
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Manual excerpts:\n\n{context}\n\nQuestion: {question}"}
+    ]
+
+
+def confidence_from_chunks(chunks: List[Dict[str, Any]]) -> float:
+    """Mean relevance of the context chunks, clipped to [0, 1]"""
+    scores = [chunk.get("relevance_score", chunk.get("score")) for chunk in chunks[:MAX_CONTEXT_CHUNKS]]
+    scores = [float(score) for score in scores if isinstance(score, (int, float))]
+    if not scores:
+        return 0.0
+    return min(1.0, max(0.0, sum(scores) / len(scores)))
+
+
+def result_fields(chunks: List[Dict[str, Any]], safety_level: Optional[str] = None,
+                  safety_message: str = "") -> Dict[str, Any]:
+    """The fields of a process_query result besides the answer (safety ones only when a verdict is given)"""
+    fields = {
+        "sources": chunks[:MAX_CONTEXT_CHUNKS],
+        "confidence_score": confidence_from_chunks(chunks)
+    }
+    if safety_level is not None:
+        fields.update(safety_flag=safety_level != "safe", safety_level=safety_level, safety_message=safety_message)
+    return fields
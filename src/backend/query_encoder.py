@@ -0,0 +1,72 @@
+"""
+Query embedding helpers shared by the answer cache and batched retrieval
+"""
+
+import logging
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+
+from backend import config
+
+logger = logging.getLogger(__name__)
+
+# Attribute names CompanionAI may keep its sentence-transformers model under
+_ENCODER_ATTRS = ("embedding_model", "encoder", "embedder", "model")
+
+_fallback_encoder = None
+_fallback_lock = threading.Lock()
+
+
+def get_query_encoder(companion_ai: Any) -> Optional[Any]:
+    """
+    Return an object with a sentence-transformers style `encode` method.
+    Reuses the encoder already loaded by CompanionAI when there is one so the
+    model is not held in memory twice; otherwise loads EMBEDDING_MODEL once.
+    """
+    global _fallback_encoder
+    
+    for attr in _ENCODER_ATTRS:
+        encoder = getattr(companion_ai, attr, None)
+        if encoder is not None and callable(getattr(encoder, "encode", None)):
+            return encoder
+    
+    with _fallback_lock:
+        if _fallback_encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _fallback_encoder = SentenceTransformer(config.EMBEDDING_MODEL)
+                logger.info(f"Loaded query encoder {config.EMBEDDING_MODEL}")
+            except Exception as e:
+                logger.error(f"Query encoder unavailable: {str(e)}")
+                return None
+    return _fallback_encoder
+
+
+def loaded_query_encoder(companion_ai: Any) -> Optional[Any]:
+    """
+    The encoder get_query_encoder would return, but only if it is already in
+    memory - never loads one, so it is safe on the request path while
+    CompanionAI is still starting
+    """
+    if companion_ai is not None:
+        return get_query_encoder(companion_ai)
+    return _fallback_encoder
+
+
+def release_fallback_encoder(companion_ai: Any):
+    """Drop the standalone encoder once CompanionAI has its own, so the model is never held twice"""
+    global _fallback_encoder
+    if any(callable(getattr(getattr(companion_ai, attr, None), "encode", None)) for attr in _ENCODER_ATTRS):
+        with _fallback_lock:
+            _fallback_encoder = None
+
+
+def encode_queries(encoder: Any, queries: List[str]) -> np.ndarray:
+    """Encode queries in one forward pass, returning L2-normalized float32 rows"""
+    embeddings = encoder.encode(queries, convert_to_numpy=True, show_progress_bar=False)
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(queries), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
@@ -0,0 +1,235 @@
+"""
+Compiled single-pass safety matcher.
+
+All hazard patterns and keywords for every safety level are compiled once,
+so classifying a query costs one scan whose price barely grows with the
+number of phrases:
+
+- literal phrases (plain keywords, and patterns like r'\\b(gas\\s+leak|smell\\s+gas)\\b'
+  that are only alternatives of words) go into one Aho-Corasick automaton
+  over all levels; a match counts only on word boundaries, and any
+  whitespace run in the query matches a space in a phrase
+- everything else is kept as-is and joined into one alternation regex,
+  levels highest first inside a zero-width lookahead
+
+Where phrases of different levels start at the same place the highest level
+wins; every matched phrase is reported as a span.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Highest first
+SAFETY_LEVELS = ("emergency", "danger", "caution")
+
+# r'\b(a|b\s+c)\b' / r'\b(?:a|b)\b' / r'\ba\b' with only words inside
+_WORD_ALTERNATION = re.compile(r"^\\b\(?(?:\?:)?((?:[\w'-]+(?:\\s\+|\\s\*| )?)+(?:\|(?:[\w'-]+(?:\\s\+|\\s\*| )?)+)*)\)?\\b$")
+_PHRASE = re.compile(r"^\w(?:[\w' -]*\w)?$")
+_WHITESPACE = re.compile(r"\s")
+
+
+@dataclass
+class SafetyMatch:
+    level: str = "safe"
+    # {"level", "start", "end", "text"} per matched phrase, in query order
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def literal_phrases(pattern: str) -> Optional[List[str]]:
+    """Phrases a word-only pattern matches (whitespace runs as single spaces), else None"""
+    match = _WORD_ALTERNATION.match(pattern)
+    if not match:
+        return None
+    phrases = []
+    for alternative in match.group(1).split("|"):
+        phrase = re.sub(r"\\s[+*]", " ", alternative).strip().lower()
+        phrase = re.sub(r" +", " ", phrase)
+        if not _PHRASE.match(phrase):
+            return None
+        phrases.append(phrase)
+    return phrases
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over lowercase phrases, each tagged with the rank
+    (index into SAFETY_LEVELS) of its level: one pass over the query finds
+    every phrase, however many there are
+    """
+    
+    def __init__(self, phrases: Dict[str, int]):
+        # Node 0 is the root; goto[node][char] -> node, fail[node] -> longest proper suffix node
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # (phrase length, rank) for every phrase ending at the node, suffixes included
+        self.output: List[Tuple[Tuple[int, int], ...]] = [()]
+        for phrase, rank in phrases.items():
+            node = 0
+            for char in phrase:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                node = child
+            self.output[node] += ((len(phrase), rank),)
+        
+        # Breadth-first, so a node's failure target is finished before the node
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self.goto[node].items():
+                pending.append(child)
+                target = self.fail[node]
+                while target and char not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[child] = self.goto[target].get(char, 0) if node else 0
+                self.output[child] += self.output[self.fail[child]]
+    
+    @property
+    def states(self) -> int:
+        return len(self.goto)
+    
+    def matches(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, rank) of every phrase in `text` that sits on word boundaries"""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few characters lowercase to two; keep offsets aligned with `text`
+            lowered = "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+        lowered = _WHITESPACE.sub(" ", lowered)
+        
+        goto, fail, output = self.goto, self.fail, self.output
+        found = []
+        node = 0
+        previous = ""
+        for end, char in enumerate(lowered, 1):
+            if char == " " and previous == " ":
+                continue  # a whitespace run reads as one space
+            previous = char
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not output[node] or (end < len(lowered) and _is_word(lowered[end])):
+                continue
+            for length, rank in output[node]:
+                start = self._start(lowered, end, length)
+                if start == 0 or not _is_word(lowered[start - 1]):
+                    found.append((start, end, rank))
+        return found
+    
+    @staticmethod
+    def _start(lowered: str, end: int, length: int) -> int:
+        """Where a phrase of `length` characters (whitespace runs counting as one) ending at `end` starts"""
+        start = end
+        while length:
+            start -= 1
+            if lowered[start] == " ":
+                while start and lowered[start - 1] == " ":
+                    start -= 1
+            length -= 1
+        return start
+
+
+def _by_level(values: Any) -> Dict[str, List[str]]:
+    """{level: [str, ...]} from a mapping keyed by level names or SafetyLevel-style enums"""
+    lists: Dict[str, List[str]] = {level: [] for level in SAFETY_LEVELS}
+    for key, level_values in dict(values or {}).items():
+        level = str(getattr(key, "value", key)).lower()
+        if level in lists:
+            lists[level].extend(str(value) for value in level_values)
+    return lists
+
+
+class SafetyMatcher:
+    """Classifies a query against every safety level in one automaton pass plus one regex scan"""
+    
+    def __init__(self, patterns: Dict[str, Iterable[str]], keywords: Optional[Dict[str, Iterable[str]]] = None):
+        keywords = keywords or {}
+        self.literal_count = 0
+        self.pattern_count = 0
+        
+        phrases: Dict[str, int] = {}
+        alternatives = []
+        for rank, level in enumerate(SAFETY_LEVELS):
+            literals = {str(keyword).strip().lower() for keyword in keywords.get(level, ()) if str(keyword).strip()}
+            regexes = []
+            for pattern in patterns.get(level, ()):
+                literal = literal_phrases(pattern)
+                if literal is None:
+                    re.compile(pattern)  # fail at build time, naming the bad pattern
+                    regexes.append(pattern)
+                else:
+                    literals.update(literal)
+            
+            bounded = sorted(phrase for phrase in literals if _PHRASE.match(phrase))
+            # Keywords with leading/trailing punctuation can't take word boundaries; match them verbatim
+            regexes.extend(re.escape(phrase) for phrase in literals if not _PHRASE.match(phrase))
+            self.literal_count += len(bounded)
+            self.pattern_count += len(regexes)
+            
+            for phrase in bounded:
+                phrases.setdefault(phrase, rank)  # a phrase listed at two levels counts as the higher
+            if regexes:
+                alternatives.append(f"(?P<{level}>{'|'.join(f'(?:{regex})' for regex in regexes)})")
+        
+        self.levels = [level for rank, level in enumerate(SAFETY_LEVELS)
+                       if rank in phrases.values() or f"(?P<{level}>" in "".join(alternatives)]
+        self._automaton = PhraseAutomaton(phrases) if phrases else None
+        self._regex = re.compile(f"(?=(?:{'|'.join(alternatives)}))", re.IGNORECASE) if alternatives else None
+    
+    @classmethod
+    def from_checker(cls, checker: Any) -> Optional["SafetyMatcher"]:
+        """
+        Build from the checker's own lists: its safety_patterns() accessor
+        ({level: [regex, ...]}, plus safety_keywords() when it has one), else
+        the EMERGENCY_PATTERNS / DANGER_PATTERNS / CAUTION_PATTERNS constants.
+        None when it exposes neither.
+        """
+        accessor = getattr(checker, "safety_patterns", None)
+        if callable(accessor):
+            patterns = _by_level(accessor())
+            keyword_accessor = getattr(checker, "safety_keywords", None)
+            keywords = _by_level(keyword_accessor()) if callable(keyword_accessor) else {}
+        else:
+            patterns = _by_level({level: getattr(checker, f"{level.upper()}_PATTERNS", ()) for level in SAFETY_LEVELS})
+            keywords = {}
+        
+        if not any(patterns.values()) and not any((keywords or {}).values()):
+            return None
+        return cls(patterns, keywords)
+    
+    def classify(self, text: str) -> SafetyMatch:
+        """Highest matched level and every matched span"""
+        # start -> (rank, -end): per start position the highest level, then the longest phrase
+        best_at: Dict[int, Tuple[int, int]] = {}
+        if self._automaton is not None:
+            for start, end, rank in self._automaton.matches(text):
+                best_at[start] = min(best_at.get(start, (rank, -end)), (rank, -end))
+        if self._regex is not None:
+            for match in self._regex.finditer(text):
+                level = match.lastgroup
+                start, end = match.span(level)
+                key = (SAFETY_LEVELS.index(level), -end)
+                best_at[start] = min(best_at.get(start, key), key)
+        if not best_at:
+            return SafetyMatch()
+        
+        spans = []
+        for start in sorted(best_at):
+            rank, end = best_at[start]
+            level, end = SAFETY_LEVELS[rank], -end
+            if spans and spans[-1]["level"] == level and start < spans[-1]["end"]:
+                continue  # same phrase seen again from inside (e.g. an unbounded pattern)
+            spans.append({"level": level, "start": start, "end": end, "text": text[start:end]})
+        return SafetyMatch(SAFETY_LEVELS[min(rank for rank, _ in best_at.values())], spans)
+    
+    def level(self, text: str) -> str:
+        return self.classify(text).level
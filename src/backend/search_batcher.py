@@ -0,0 +1,105 @@
+"""
+Micro-batching scheduler: coalesces concurrent search requests that arrive
+within a short window into one encoder pass + one index search
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBatcher:
+    """
+    Collect requests for up to `window_ms` (or until `max_batch_size` are
+    waiting), run `batch_fn` once on a dedicated thread, then scatter results
+    back to the waiting coroutines in order. If the batch call fails, its
+    items are retried one at a time so only the failing ones see the error.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 window_ms: float = 3.0, max_batch_size: int = 32):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        
+        # One worker: batches are CPU-bound and would only contend with each other
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-batch")
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        
+        self.batches = 0
+        self.requests = 0
+        self.max_observed_batch = 0
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue one request and wait for its share of the batch result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.requests += 1
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        self.batches += 1
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+        asyncio.get_running_loop().create_task(self._run(batch))
+    
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        
+        try:
+            results = await loop.run_in_executor(self._executor, self.batch_fn, items)
+            outcomes = [(True, result) for result in results]
+        except Exception as e:
+            if len(items) == 1:
+                outcomes = [(False, e)]
+            else:
+                logger.error(f"Search batch of {len(items)} failed, retrying one by one: {str(e)}")
+                outcomes = await loop.run_in_executor(self._executor, self._run_each, items)
+        
+        for (_, future), (ok, result) in zip(batch, outcomes):
+            if not future.done():
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+    
+    def _run_each(self, items: List[Any]) -> List[Tuple[bool, Any]]:
+        """batch_fn per item -> (ok, result or exception), so one bad request fails alone"""
+        outcomes = []
+        for item in items:
+            try:
+                outcomes.append((True, self.batch_fn([item])[0]))
+            except Exception as e:
+                logger.error(f"Search request failed: {str(e)}")
+                outcomes.append((False, e))
+        return outcomes
+    
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_observed_batch
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
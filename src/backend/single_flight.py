@@ -0,0 +1,69 @@
+"""
+Single-flight: concurrent callers with the same key share one in-flight
+computation instead of each running their own (e.g. hundreds of identical
+questions right after a recall notice).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_query_key(query: str, brand: Optional[str], model: Optional[str], k: int,
+                        appliance_type: Optional[str] = None) -> Tuple:
+    """Case- and whitespace-insensitive key for an /answer request"""
+    def norm(value: Optional[str]) -> str:
+        return " ".join((value or "").lower().split())
+    return norm(query), norm(brand), norm(model), k, norm(appliance_type)
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key; the result (or exception) is shared"""
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+    
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless a call with `key` is already in flight, in which case
+        wait for that one. Returns (result, shared). The computation runs as
+        its own task, so one caller disconnecting doesn't cancel it for the rest;
+        it is cancelled only once every caller waiting on it has gone.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+    
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+    
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": self.inflight, "leaders": self.leaders, "coalesced": self.coalesced,
+                "abandoned": self.abandoned}
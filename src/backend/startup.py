@@ -0,0 +1,136 @@
+"""
+Progressive startup: components load in the background with retry/backoff
+while the API already serves what it can (safety checks, cached answers).
+Load state and timings feed /health/ready.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+class Component:
+    """Load state of one startup component"""
+    
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+        self.state = PENDING
+        self.attempts = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.last_attempt_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.next_retry_at: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None:
+            duration = (self.finished_at or time.time()) - self.started_at
+        return {
+            "state": self.state,
+            "required": self.required,
+            "attempts": self.attempts,
+            "duration_seconds": round(duration, 3) if duration is not None else None,
+            "last_attempt_seconds": round(self.last_attempt_seconds, 3) if self.last_attempt_seconds is not None else None,
+            "error": self.error,
+            "next_retry_in_seconds": round(max(self.next_retry_at - time.time(), 0.0), 1) if self.next_retry_at else None
+        }
+
+
+class StartupTracker:
+    """Runs component loaders with exponential backoff and reports readiness"""
+    
+    def __init__(self, max_attempts: int = 5, backoff_seconds: float = 2.0, backoff_max_seconds: float = 60.0):
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.components: Dict[str, Component] = {}
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+    
+    def register(self, name: str, required: bool = True) -> Component:
+        component = self.components.get(name)
+        if component is None:
+            component = self.components[name] = Component(name, required)
+        return component
+    
+    async def load(self, name: str, loader: Callable[[], Any], required: bool = True,
+                   in_thread: bool = True, max_attempts: Optional[int] = None) -> Any:
+        """
+        Call `loader` (in a worker thread unless in_thread=False) until it
+        succeeds or max_attempts is reached (0 = retry forever).
+        Returns its result, or None once the component is marked failed.
+        """
+        max_attempts = self.max_attempts if max_attempts is None else max_attempts
+        component = self.register(name, required)
+        component.required = required
+        component.state = LOADING
+        component.started_at = time.time()
+        delay = self.backoff_seconds
+        
+        while True:
+            component.attempts += 1
+            attempt_start = time.time()
+            try:
+                result = await asyncio.to_thread(loader) if in_thread else loader()
+            except Exception as e:
+                component.last_attempt_seconds = time.time() - attempt_start
+                component.error = str(e)
+                if max_attempts and component.attempts >= max_attempts:
+                    component.state = FAILED
+                    component.finished_at = time.time()
+                    component.next_retry_at = None
+                    logger.error(f"{name} failed to load after {component.attempts} attempts: {str(e)}")
+                    return None
+                
+                logger.warning(f"{name} load attempt {component.attempts} failed, retrying in {delay:.0f}s: {str(e)}")
+                component.next_retry_at = time.time() + delay
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max_seconds)
+                continue
+            
+            component.last_attempt_seconds = time.time() - attempt_start
+            component.state = READY
+            component.finished_at = time.time()
+            component.error = None
+            component.next_retry_at = None
+            logger.info(f"{name} ready in {component.finished_at - component.started_at:.2f}s "
+                        f"({component.attempts} attempt{'s' if component.attempts > 1 else ''})")
+            return result
+    
+    def mark(self, name: str, state: str, error: Optional[str] = None, required: bool = True):
+        """Record a state change for a component not loaded through load()"""
+        component = self.register(name, required)
+        now = time.time()
+        if state == LOADING:
+            component.started_at = now
+        elif state in (READY, FAILED):
+            component.started_at = component.started_at or now
+            component.finished_at = now
+        component.state = state
+        component.error = error
+    
+    @property
+    def ready(self) -> bool:
+        """Every required component loaded"""
+        ready = bool(self.components) and all(
+            component.state == READY for component in self.components.values() if component.required
+        )
+        if ready and self.ready_at is None:
+            self.ready_at = time.time()
+        return ready
+    
+    def snapshot(self) -> Dict[str, Any]:
+        ready = self.ready
+        return {
+            "ready": ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "time_to_ready_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "components": {name: component.to_dict() for name, component in self.components.items()}
+        }
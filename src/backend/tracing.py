@@ -0,0 +1,194 @@
+"""
+Per-request stage tracing: spans for each pipeline stage, request id
+propagation, an in-memory ring of recent traces and a slow-query log
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class Trace:
+    """Span timeline for one request; offsets and durations are in milliseconds"""
+    
+    def __init__(self, request_id: str, path: str):
+        self.request_id = request_id
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.attributes: Dict[str, Any] = {}
+        self.chunk_ids: List[str] = []
+        self.duration_ms: Optional[float] = None
+    
+    def _offset_ms(self, at: float) -> float:
+        return (at - self._start) * 1000
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start, start=start, **attributes)
+    
+    def add_span(self, name: str, seconds: float, start: Optional[float] = None, **attributes):
+        """Record a span measured elsewhere (e.g. inside a batched search)"""
+        end = time.perf_counter() if start is None else start + seconds
+        span = {
+            "name": name,
+            "offset_ms": round(self._offset_ms(end - seconds), 3),
+            "duration_ms": round(seconds * 1000, 3)
+        }
+        if attributes:
+            span["attributes"] = attributes
+        self.spans.append(span)
+    
+    def mark(self, name: str):
+        """Point event relative to request start (e.g. LLM first token)"""
+        self.add_span(name, 0.0)
+    
+    def finish(self) -> float:
+        if self.duration_ms is None:
+            self.duration_ms = self._offset_ms(time.perf_counter())
+        return self.duration_ms
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "spans": self.spans,
+            "chunk_ids": self.chunk_ids,
+            "attributes": self.attributes
+        }
+
+
+def start_trace(request_id: str, path: str) -> Trace:
+    trace = Trace(request_id, path)
+    _current_trace.set(trace)
+    return trace
+
+
+def activate(trace: Optional[Trace]):
+    """Make `trace` current in this context (e.g. inside a streaming body)"""
+    _current_trace.set(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span on the current trace; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attributes):
+        yield
+
+
+def add_span(name: str, seconds: float, **attributes):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, seconds, **attributes)
+
+
+def annotate(**attributes):
+    """Attach attributes (cache hit, verdict, ...) to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: propagates X-Request-ID and traces requests under
+    `prefix`. A traced request ends when its ASGI call returns - after the
+    last chunk of a streamed body, or once the client has gone away before or
+    during the body - so on_finish runs exactly once for every on_start.
+    """
+    
+    def __init__(self, app: Any, prefix: str = "/answer", on_start: Optional[Callable[[Trace], None]] = None,
+                 on_finish: Optional[Callable[[Trace], None]] = None):
+        self.app = app
+        self.prefix = prefix
+        self.on_start = on_start
+        self.on_finish = on_finish
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or new_request_id()
+        
+        async def send_with_request_id(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-request-id", request_id.encode("latin-1"))]}
+            await send(message)
+        
+        if not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send_with_request_id)
+            return
+        
+        trace = Trace(request_id, scope["path"])
+        token = _current_trace.set(trace)
+        if self.on_start:
+            self.on_start(trace)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _current_trace.reset(token)
+            if self.on_finish:
+                self.on_finish(trace)
+
+
+class TraceLog:
+    """Ring buffer of recent traces; traces over the threshold also go to the slow-query log"""
+    
+    def __init__(self, capacity: int = 200, slow_threshold_ms: float = 8000.0,
+                 slow_logger: Optional[logging.Logger] = None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.slow_logger = slow_logger or logging.getLogger("companion.slow_queries")
+        self._recent: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.slow_count = 0
+    
+    def record(self, trace: Trace):
+        duration = trace.finish()
+        entry = trace.to_dict()
+        slow = duration >= self.slow_threshold_ms
+        entry["slow"] = slow
+        
+        with self._lock:
+            self._recent.append(entry)
+            if slow:
+                self.slow_count += 1
+        
+        if slow:
+            self.slow_logger.warning(f"SLOW_QUERY: {json.dumps(entry)}")
+    
+    def recent(self, limit: int = 50, slow_only: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._recent)
+        if slow_only:
+            entries = [entry for entry in entries if entry["slow"]]
+        return list(reversed(entries[-limit:]))
@@ -0,0 +1,46 @@
+"""
+Picks the single index-writer process when uvicorn runs several workers.
+
+Every worker serves queries from the shared memory-mapped index, but only
+the one holding an exclusive lock on LEADER_LOCK_PATH publishes ingested
+manuals, merges the delta segment and dispatches ingestion jobs. The lock is
+held for the life of the process and released by the OS when it exits.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_lock_file = None
+
+
+def acquire_leader_lock(path: Path) -> bool:
+    """Try (without blocking) to become the index writer; True on success"""
+    global _lock_file
+    if _lock_file is not None:
+        return True
+    
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): uvicorn runs a single worker there anyway
+        return True
+    
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_file = open(path, "a+")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    _lock_file = lock_file
+    logger.info(f"Worker {os.getpid()} is the index writer")
+    return True
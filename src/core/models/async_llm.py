@@ -0,0 +1,412 @@
+"""
+Native asyncio client for ModelManager's LLM backends: Ollama and Nvidia NIM
+(or any OpenAI-compatible /chat/completions endpoint).
+
+All backends share one aiohttp session whose connector keeps a pool of
+keep-alive connections, so a pending generation is a coroutine waiting on a
+socket instead of an executor thread blocked inside a sync client, and
+requests reuse warm connections. Each backend has its own concurrency limit
+and timeouts. Cancelling the awaiting task (e.g. because the HTTP client
+disconnected) aborts the upstream request and returns its connection.
+
+With several backends registered the client hedges: when the primary has
+not produced a first token within its recent first-token latency percentile,
+the same request goes to the next backend and whichever streams first wins
+(the other is cancelled). Backends that keep failing are skipped by a circuit
+breaker, and a request whose backend fails before streaming fails over to
+the next one.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class LLMBackendError(Exception):
+    """Upstream error, bad status or timeout from one backend"""
+    
+    def __init__(self, backend: str, message: str):
+        super().__init__(f"{backend}: {message}")
+        self.backend = backend
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; after
+    `reset_seconds` one trial request is let through (half-open) and its
+    outcome closes or re-opens the breaker
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.trips = 0
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        """Whether a request may go to this backend now (claims the half-open trial)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_running:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+    
+    def record_abandoned(self):
+        """Request cancelled (e.g. lost a hedge) - no verdict on the backend"""
+        self.trial_running = False
+
+
+class LLMBackend:
+    """One model on one endpoint, with its own concurrency limit and timeouts"""
+    
+    kind = ""
+    
+    def __init__(self, model: str, base_url: str, name: Optional[str] = None, max_concurrency: int = 4,
+                 request_timeout: float = 120.0, connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 temperature: float = 0.2, max_tokens: int = 512, api_key: Optional[str] = None,
+                 breaker: Optional[CircuitBreaker] = None, latency_window: int = 200):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.name = name or f"{self.kind}:{model}"
+        self.max_concurrency = max(1, max_concurrency)
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.api_key = api_key
+        # read timeout applies between chunks, so a stalled stream fails fast
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout, sock_connect=connect_timeout,
+                                             sock_read=read_timeout)
+        
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        self.first_token_latencies = deque(maxlen=latency_window)
+        self.active = 0
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+    
+    def request(self, messages: Messages) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+        """(url, json payload, headers) for a streaming chat request"""
+        raise NotImplementedError
+    
+    def parse_line(self, line: bytes) -> Tuple[str, bool]:
+        """(text delta, done) for one line of the streamed response"""
+        raise NotImplementedError
+    
+    @property
+    def saturated(self) -> bool:
+        return self.active >= self.max_concurrency
+    
+    def first_token_percentile(self, percentile: float) -> Optional[float]:
+        """Recent first-token latency at `percentile` (0-100), None without samples"""
+        if not self.first_token_latencies:
+            return None
+        ordered = sorted(self.first_token_latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))]
+    
+    async def stream(self, session: aiohttp.ClientSession, messages: Messages) -> AsyncIterator[str]:
+        """Yield text deltas as the backend produces them"""
+        url, payload, headers = self.request(messages)
+        start = time.monotonic()
+        first_token = True
+        async with self._slots:
+            self.active += 1
+            self.requests += 1
+            try:
+                async with session.post(url, json=payload, headers=headers, timeout=self.timeout) as response:
+                    if response.status != 200:
+                        body = await response.text()
+                        raise LLMBackendError(self.name, f"HTTP {response.status}: {body[:200]}")
+                    
+                    done = False
+                    async for line in response.content:
+                        line = line.strip()
+                        if done or not line:
+                            # Read to EOF so the connection goes back to the pool
+                            continue
+                        text, done = self.parse_line(line)
+                        if text:
+                            if first_token:
+                                first_token = False
+                                self.first_token_latencies.append(time.monotonic() - start)
+                            yield text
+                self.breaker.record_success()
+            except (asyncio.CancelledError, GeneratorExit):
+                self.cancelled += 1
+                self.breaker.record_abandoned()
+                raise
+            except LLMBackendError:
+                self.errors += 1
+                self.breaker.record_failure()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.errors += 1
+                self.breaker.record_failure()
+                raise LLMBackendError(self.name, f"{type(e).__name__}: {str(e)}") from e
+            finally:
+                self.active -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "first_token_p50": self.first_token_percentile(50),
+            "first_token_p95": self.first_token_percentile(95)
+        }
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama /api/chat (NDJSON stream)"""
+    
+    kind = "ollama"
+    
+    def request(self, messages: Messages):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            # Keep the model resident between requests (cold load is the slow part)
+            "keep_alive": "30m",
+            "options": {"temperature": self.temperature, "num_predict": self.max_tokens}
+        }
+        return f"{self.base_url}/api/chat", payload, {}
+    
+    def parse_line(self, line: bytes):
+        event = json.loads(line)
+        if event.get("error"):
+            raise LLMBackendError(self.name, str(event["error"]))
+        return (event.get("message") or {}).get("content", ""), bool(event.get("done"))
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Nvidia NIM and other OpenAI-compatible /chat/completions endpoints (SSE stream)"""
+    
+    kind = "nim"
+    
+    def request(self, messages: Messages):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return f"{self.base_url}/chat/completions", payload, headers
+    
+    def parse_line(self, line: bytes):
+        if not line.startswith(b"data:"):
+            return "", False
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return "", True
+        event = json.loads(data)
+        if event.get("error"):
+            raise LLMBackendError(self.name, str(event["error"]))
+        choices = event.get("choices") or [{}]
+        text = (choices[0].get("delta") or {}).get("content") or ""
+        return text, choices[0].get("finish_reason") is not None
+
+
+BACKEND_TYPES = {"ollama": OllamaBackend, "nim": OpenAICompatibleBackend, "openai": OpenAICompatibleBackend}
+
+
+class AsyncLLMClient:
+    """Pooled async access to the configured backends (first one is the default)"""
+    
+    def __init__(self, backends: List[LLMBackend], pool_size: int = 100, keepalive_seconds: float = 60.0,
+                 hedge: bool = True, hedge_percentile: float = 95.0, hedge_delay_seconds: float = 2.0,
+                 hedge_min_delay_seconds: float = 0.25, hedge_min_samples: int = 20):
+        if not backends:
+            raise ValueError("AsyncLLMClient needs at least one backend")
+        self.backends = {backend.name: backend for backend in backends}
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+    
+    @classmethod
+    def from_spec(cls, spec: str, base_urls: Dict[str, str], api_keys: Optional[Dict[str, str]] = None,
+                  pool_size: int = 100, keepalive_seconds: float = 60.0, client_options: Optional[Dict[str, Any]] = None,
+                  breaker_failures: int = 3, breaker_reset_seconds: float = 30.0,
+                  **backend_options) -> "AsyncLLMClient":
+        """
+        Build from a comma-separated "<kind>:<model>" list, e.g.
+        "ollama:phi3:mini,nim:meta/llama-3.1-8b-instruct"
+        """
+        backends = []
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            kind, _, model = entry.partition(":")
+            backend_type = BACKEND_TYPES.get(kind.lower())
+            if backend_type is None or not model:
+                raise ValueError(f"Bad LLM backend spec {entry!r} (expected <{'|'.join(BACKEND_TYPES)}>:<model>)")
+            backends.append(backend_type(
+                model,
+                base_urls[kind.lower()],
+                api_key=(api_keys or {}).get(kind.lower()),
+                breaker=CircuitBreaker(breaker_failures, breaker_reset_seconds),
+                **backend_options
+            ))
+        return cls(backends, pool_size=pool_size, keepalive_seconds=keepalive_seconds, **(client_options or {}))
+    
+    @property
+    def default(self) -> LLMBackend:
+        return next(iter(self.backends.values()))
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_seconds)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    def hedge_delay(self, backend: LLMBackend) -> float:
+        """How long to wait for `backend`'s first token before hedging"""
+        if len(backend.first_token_latencies) < self.hedge_min_samples:
+            return self.hedge_delay_seconds
+        return max(self.hedge_min_delay_seconds, backend.first_token_percentile(self.hedge_percentile))
+    
+    def _candidates(self, backend: Optional[str]) -> List[LLMBackend]:
+        """Backends to try in order: the named (or default) one first, then the rest"""
+        first = self.backends[backend] if backend else self.default
+        return [first] + [other for other in self.backends.values() if other is not first]
+    
+    async def stream(self, messages: Messages, backend: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yield text deltas from the first backend to start streaming: the named
+        (or default) one, hedged and failed over to the others in order.
+        Once tokens flow the request is committed to that backend.
+        """
+        session = self._get_session()
+        # Not launched yet; a backend passed over for one hedge stays available for failover
+        pending = self._candidates(backend)
+        racing: Dict[asyncio.Future, Tuple[LLMBackend, AsyncIterator[str]]] = {}
+        hedges = set()
+        errors: List[str] = []
+        
+        def launch(hedging: bool) -> bool:
+            for candidate in pending:
+                if hedging and candidate.saturated:
+                    continue  # a hedge must not queue behind the backend's own limit
+                if not candidate.breaker.allow():
+                    continue
+                pending.remove(candidate)
+                generator = candidate.stream(session, messages)
+                racing[asyncio.ensure_future(generator.__anext__())] = (candidate, generator)
+                if hedging:
+                    hedges.add(candidate.name)
+                return True
+            return False
+        
+        winner = None
+        try:
+            launch(hedging=False)
+            while racing and winner is None:
+                timeout = None
+                if self.hedge and len(racing) == 1:
+                    # Wait on the backend actually in flight (after a failover, not the one that failed)
+                    timeout = self.hedge_delay(next(iter(racing.values()))[0])
+                done, _ = await asyncio.wait(racing, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    # First token is late: race the next backend
+                    if launch(hedging=True):
+                        self.hedged += 1
+                    else:
+                        done, _ = await asyncio.wait(racing, return_when=asyncio.FIRST_COMPLETED)
+                
+                for future in done:
+                    candidate, generator = racing.pop(future)
+                    error = future.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = (candidate, generator, None if error else future.result())
+                        break
+                    errors.append(str(error))
+                    logger.warning(f"LLM backend {candidate.name} failed: {str(error)}")
+                    if not racing and launch(hedging=False):
+                        self.failovers += 1
+        finally:
+            # Losers (or everything, if we were cancelled) stop here
+            for future, (_, generator) in racing.items():
+                future.cancel()
+            for future, (_, generator) in racing.items():
+                try:
+                    await future
+                except BaseException:
+                    pass
+                await generator.aclose()
+        
+        if winner is None:
+            errors += [f"{candidate.name}: circuit open" for candidate in pending]
+            raise LLMBackendError("all", "; ".join(errors) or "no LLM backend available")
+        
+        candidate, generator, first_text = winner
+        if candidate.name in hedges:
+            self.hedge_wins += 1
+        if first_text is None:
+            return
+        yield first_text
+        async for text in generator:
+            yield text
+    
+    async def generate(self, messages: Messages, backend: Optional[str] = None) -> str:
+        start = time.time()
+        parts = [text async for text in self.stream(messages, backend)]
+        logger.debug(f"LLM generation ({backend or self.default.name}) took {time.time() - start:.2f}s")
+        return "".join(parts)
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: backend.stats() for name, backend in self.backends.items()}
+    
+    def counters(self) -> Dict[str, int]:
+        return {"hedged": self.hedged, "hedge_wins": self.hedge_wins, "failovers": self.failovers}
@@ -0,0 +1,9 @@
+"""
+Vectorized retrieval over the on-disk FAISS index and chunk metadata
+"""
+
+from .vector_store import VectorStore
+from .filters import SearchFilter
+from .chunking import chunk_page, manual_metadata, manual_name
+
+__all__ = ["VectorStore", "SearchFilter", "chunk_page", "manual_metadata", "manual_name"]
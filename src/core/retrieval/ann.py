@@ -0,0 +1,390 @@
+"""
+Index types for the base segment and an auto-tuner that picks one.
+
+IndexSpec describes a FAISS inner-product index: flat (exact), ivf_flat,
+ivf_pq or hnsw, with its build parameters (nlist, PQ size, M) and search
+parameters (nprobe, efSearch). tune() builds candidates on the live corpus,
+measures recall@k against exact search and p99 single-query latency, and
+picks the cheapest one that reaches the target recall.
+
+The chosen spec (and the measurements behind it) is written next to the
+index file as index_params.json and re-applied when the index is opened.
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .shared_store import MmapFlatIndex
+from .compressed import CompressedIndex
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+PARAMS_FILENAME = "index_params.json"
+
+# Sweeps for the tuner (values above nlist / below k are skipped)
+NPROBE_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256, 512)
+HNSW_M_SWEEP = (16, 32)
+# k-means wants ~39 training points per centroid; below that nlist is not considered
+MIN_POINTS_PER_CENTROID = 39
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Index type + parameters; unset parameters take FAISS defaults (or are derived from the corpus)"""
+    kind: str = "flat"
+    nlist: Optional[int] = None
+    nprobe: Optional[int] = None
+    pq_m: Optional[int] = None
+    pq_bits: int = 8
+    hnsw_m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    ef_search: Optional[int] = None
+    
+    @classmethod
+    def parse(cls, text: str) -> "IndexSpec":
+        """"hnsw" / "ivf_flat:nlist=1024,nprobe=16" / "auto" (tune on load)"""
+        kind, _, params = text.strip().lower().partition(":")
+        kind = kind.replace("-", "_")
+        if kind not in INDEX_TYPES + ("auto",):
+            raise ValueError(f"Unknown index type {kind!r} (expected one of {', '.join(INDEX_TYPES)} or auto)")
+        names = {f.name for f in fields(cls)} - {"kind"}
+        values: Dict[str, Any] = {}
+        for item in filter(None, (part.strip() for part in params.split(","))):
+            name, _, value = item.partition("=")
+            name = name.strip().replace("-", "_")
+            if name not in names:
+                raise ValueError(f"Unknown index parameter {name!r} for {kind}")
+            values[name] = int(value)
+        return cls(kind=kind, **values)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexSpec":
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items()
+                if value is not None and not (key == "pq_bits" and self.kind != "ivf_pq")}
+    
+    def resolved(self, n: int, d: int) -> "IndexSpec":
+        """Fill in build parameters that depend on the corpus size / dimension"""
+        spec = self
+        if spec.kind in ("ivf_flat", "ivf_pq") and spec.nlist is None:
+            spec = replace(spec, nlist=default_nlist(n))
+        if spec.kind == "ivf_pq" and spec.pq_m is None:
+            spec = replace(spec, pq_m=next(m for m in (d // 8, d // 4, d // 2, d) if m and d % m == 0))
+        if spec.kind == "hnsw" and spec.hnsw_m is None:
+            spec = replace(spec, hnsw_m=32)
+        return spec
+    
+    def factory_string(self) -> str:
+        if self.kind == "flat":
+            return "Flat"
+        if self.kind == "ivf_flat":
+            return f"IVF{self.nlist},Flat"
+        if self.kind == "ivf_pq":
+            return f"IVF{self.nlist},PQ{self.pq_m}x{self.pq_bits}"
+        if self.kind == "hnsw":
+            return f"HNSW{self.hnsw_m},Flat"
+        raise ValueError(f"No FAISS index for {self.kind!r}")
+    
+    def same_structure(self, other: "IndexSpec") -> bool:
+        """Whether an index built as `other` is this spec up to search parameters"""
+        build = ("kind", "nlist", "pq_m", "pq_bits", "hnsw_m")
+        return all(getattr(self, name) is None or getattr(self, name) == getattr(other, name) for name in build)
+    
+    @property
+    def label(self) -> str:
+        params = {key: value for key, value in self.to_dict().items() if key != "kind"}
+        return self.kind + (":" + ",".join(f"{key}={value}" for key, value in params.items()) if params else "")
+
+
+def default_nlist(n: int) -> int:
+    """Power of two near 4*sqrt(n), with enough points per centroid to train"""
+    nlist = 1 << max(2, int(round(np.log2(max(4.0 * np.sqrt(max(n, 1)), 1.0)))))
+    while nlist > 4 and nlist * MIN_POINTS_PER_CENTROID > n:
+        nlist //= 2
+    return nlist
+
+
+def estimate_memory_bytes(spec: IndexSpec, n: int, d: int) -> int:
+    """Approximate resident size of the index (vectors, codes, ids, graph links)"""
+    if spec.kind == "flat":
+        return n * d * 4
+    if spec.kind == "ivf_flat":
+        return n * (d * 4 + 8) + spec.nlist * d * 4
+    if spec.kind == "ivf_pq":
+        return n * (spec.pq_m * spec.pq_bits // 8 + 8) + spec.nlist * d * 4 + (1 << spec.pq_bits) * d * 4
+    if spec.kind == "hnsw":
+        # Level 0 has 2*M links per vector; upper levels add ~1/M of that again
+        return n * d * 4 + int(n * spec.hnsw_m * 2 * 4 * (1 + 1.0 / spec.hnsw_m))
+    return n * d * 4
+
+
+def apply_search_params(index: Any, spec: IndexSpec):
+    """Set nprobe / efSearch on an opened index"""
+    if isinstance(index, (MmapFlatIndex, CompressedIndex)):
+        return
+    import faiss
+    
+    if spec.nprobe is not None:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = spec.nprobe
+    if spec.ef_search is not None:
+        hnsw = faiss.downcast_index(index)
+        if isinstance(hnsw, faiss.IndexHNSW):
+            hnsw.hnsw.efSearch = spec.ef_search
+
+
+def describe_index(index: Any) -> IndexSpec:
+    """The IndexSpec an opened index corresponds to (current search parameters included)"""
+    if isinstance(index, (MmapFlatIndex, CompressedIndex)):
+        return IndexSpec("flat")
+    import faiss
+    
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexFlat):
+        return IndexSpec("flat")
+    if isinstance(index, faiss.IndexHNSW):
+        return IndexSpec("hnsw", hnsw_m=index.hnsw.nb_neighbors(1), ef_construction=index.hnsw.efConstruction,
+                         ef_search=index.hnsw.efSearch)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf = faiss.downcast_index(ivf)
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            return IndexSpec("ivf_pq", nlist=ivf.nlist, nprobe=ivf.nprobe, pq_m=ivf.pq.M, pq_bits=ivf.pq.nbits)
+        return IndexSpec("ivf_flat", nlist=ivf.nlist, nprobe=ivf.nprobe)
+    return IndexSpec(type(index).__name__.lower())
+
+
+def build_index(vectors: np.ndarray, spec: IndexSpec, max_train: int = 100000, seed: int = 0):
+    """Train (on up to max_train vectors) and fill an inner-product index for `spec`"""
+    import faiss
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    spec = spec.resolved(n, d)
+    index = faiss.index_factory(d, spec.factory_string(), faiss.METRIC_INNER_PRODUCT)
+    if spec.kind == "hnsw" and spec.ef_construction is not None:
+        faiss.downcast_index(index).hnsw.efConstruction = spec.ef_construction
+    if not index.is_trained:
+        train = vectors
+        if n > max_train:
+            train = vectors[np.random.default_rng(seed).choice(n, max_train, replace=False)]
+        index.train(train)
+    if n:
+        index.add(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Lets filtered search gather candidate vectors by row (see vector_store._search_subset)
+        ivf.make_direct_map()
+    apply_search_params(index, spec)
+    return index
+
+
+def search_parameters(index: Any, selector: Any):
+    """SearchParameters restricted to `selector`, keeping the index's own nprobe / efSearch"""
+    import faiss
+    
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def params_path(index_path: Path) -> Path:
+    return Path(index_path).with_name(PARAMS_FILENAME)
+
+
+def read_index_params(index_path: Path) -> Optional[Dict[str, Any]]:
+    """The recorded index_params.json next to an index file, if any"""
+    path = params_path(index_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable {path}: {str(e)}")
+        return None
+
+
+def write_index_params(index_path: Path, spec: IndexSpec, size: int, tuning: Optional[Dict[str, Any]] = None):
+    """Record the spec an index was built/tuned with next to it (atomic replace)"""
+    path = params_path(index_path)
+    data = {"spec": spec.to_dict(), "label": spec.label, "vectors": size, "written_at": time.time()}
+    if tuning:
+        data["tuning"] = tuning
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# -- tuning --------------------------------------------------------------------
+
+@dataclass
+class TuneTrial:
+    spec: IndexSpec
+    recall: float
+    p50_ms: float
+    p99_ms: float
+    memory_bytes: int
+    build_seconds: float
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"spec": self.spec.to_dict(), "label": self.spec.label, "recall": round(self.recall, 4),
+                "p50_ms": round(self.p50_ms, 3), "p99_ms": round(self.p99_ms, 3),
+                "memory_bytes": self.memory_bytes, "build_seconds": round(self.build_seconds, 3)}
+
+
+@dataclass
+class TuneResult:
+    chosen: TuneTrial
+    trials: List[TuneTrial]
+    k: int
+    target_recall: float
+    vectors: int
+    queries: int
+    max_p99_ms: Optional[float] = None
+    tuned_at: float = field(default_factory=time.time)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """What gets recorded in index_params.json"""
+        return {
+            "k": self.k,
+            "target_recall": self.target_recall,
+            "max_p99_ms": self.max_p99_ms,
+            "vectors": self.vectors,
+            "queries": self.queries,
+            "tuned_at": self.tuned_at,
+            "chosen": self.chosen.to_dict(),
+            "trials": [trial.to_dict() for trial in self.trials]
+        }
+
+
+def candidate_specs(n: int, d: int, kinds: Sequence[str] = INDEX_TYPES) -> List[IndexSpec]:
+    """Build configurations worth trying at this corpus size (search parameters are swept separately)"""
+    specs = []
+    if "flat" in kinds:
+        specs.append(IndexSpec("flat"))
+    nlists = sorted({default_nlist(n), default_nlist(n) * 4, max(4, default_nlist(n) // 4)})
+    nlists = [nlist for nlist in nlists if nlist * MIN_POINTS_PER_CENTROID <= n]
+    if "ivf_flat" in kinds:
+        specs.extend(IndexSpec("ivf_flat", nlist=nlist) for nlist in nlists)
+    if "ivf_pq" in kinds and n >= (1 << 8) * MIN_POINTS_PER_CENTROID:
+        for m in (d // 8, d // 4):
+            if m and d % m == 0:
+                specs.extend(IndexSpec("ivf_pq", nlist=nlist, pq_m=m) for nlist in nlists)
+    if "hnsw" in kinds:
+        specs.extend(IndexSpec("hnsw", hnsw_m=m, ef_construction=200) for m in HNSW_M_SWEEP)
+    return specs
+
+
+def _search_sweep(spec: IndexSpec, k: int) -> List[IndexSpec]:
+    if spec.kind in ("ivf_flat", "ivf_pq"):
+        return [replace(spec, nprobe=nprobe) for nprobe in NPROBE_SWEEP if nprobe <= spec.nlist]
+    if spec.kind == "hnsw":
+        return [replace(spec, ef_search=ef) for ef in EF_SEARCH_SWEEP if ef >= k]
+    return [spec]
+
+
+def sample_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Corpus vectors nudged off their own position (a query is never exactly a chunk), renormalized"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), min(count, len(vectors)), replace=False)
+    queries = np.asarray(vectors[rows], dtype=np.float32)
+    if noise:
+        queries = queries + rng.normal(0, noise / np.sqrt(queries.shape[1]), queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+    return np.ascontiguousarray(queries)
+
+
+def measure_search(index: Any, vectors: np.ndarray, queries: np.ndarray, kth_scores: np.ndarray, k: int,
+             repeats: int = 3):
+    """
+    (recall@k, p50 ms, p99 ms) with one query per search call, as the API
+    issues them; each query's latency is its best of `repeats` runs so
+    scheduler noise doesn't decide between configurations. A hit counts when
+    its true score reaches the exact k-th score, so duplicate chunks (equal
+    scores) don't count as misses.
+    """
+    for i in range(min(10, len(queries))):
+        index.search(queries[i:i + 1], k)  # warm caches before timing
+    latencies = np.full(len(queries), np.inf)
+    hits = 0
+    for i in range(len(queries)):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _, rows = index.search(queries[i:i + 1], k)
+            latencies[i] = min(latencies[i], time.perf_counter() - start)
+        rows = rows[0][rows[0] >= 0]
+        hits += int((vectors[rows] @ queries[i] >= kth_scores[i] - 1e-5).sum())
+    return hits / (len(queries) * k), float(np.percentile(latencies, 50)) * 1000, float(np.percentile(latencies, 99)) * 1000
+
+
+def tune(vectors: np.ndarray, k: int = 10, target_recall: float = 0.95, num_queries: int = 200,
+         queries: Optional[np.ndarray] = None, kinds: Sequence[str] = INDEX_TYPES,
+         max_p99_ms: Optional[float] = None, query_noise: float = 0.3, seed: int = 0) -> TuneResult:
+    """
+    Build every candidate on `vectors`, sweep its search parameters and pick
+    the configuration with the lowest p99 (then memory) whose recall@k
+    against exact search reaches `target_recall` (and p99 <= max_p99_ms).
+    Flat search is exact, so it is the fallback when nothing else qualifies.
+    `queries` defaults to perturbed samples of the corpus; pass real query
+    embeddings when a log of them is available.
+    """
+    import faiss
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    if queries is None:
+        queries = sample_queries(vectors, num_queries, query_noise, seed)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, n)
+    
+    exact = faiss.IndexFlatIP(d)
+    exact.add(vectors)
+    truth, _ = exact.search(queries, k)
+    kth_scores = truth[:, -1]
+    
+    trials = []
+    for candidate in candidate_specs(n, d, kinds):
+        build_start = time.time()
+        try:
+            index = exact if candidate.kind == "flat" else build_index(vectors, candidate, seed=seed)
+        except Exception as e:
+            logger.warning(f"Skipping {candidate.label}: {str(e)}")
+            continue
+        build_seconds = time.time() - build_start
+        for spec in _search_sweep(candidate.resolved(n, d), k):
+            apply_search_params(index, spec)
+            recall, p50, p99 = measure_search(index, vectors, queries, kth_scores, k)
+            trials.append(TuneTrial(spec, recall, p50, p99, estimate_memory_bytes(spec, n, d), build_seconds))
+            logger.debug(f"{spec.label}: recall@{k}={recall:.3f} p99={p99:.2f}ms")
+            if recall >= 1.0:
+                break  # larger nprobe / efSearch only costs more
+    
+    qualifying = [trial for trial in trials if trial.recall >= target_recall
+                  and (max_p99_ms is None or trial.p99_ms <= max_p99_ms)]
+    if not qualifying:
+        # Nothing meets both: exact search at least meets the recall target
+        qualifying = [trial for trial in trials if trial.spec.kind == "flat"] or trials
+    # Within 10% (or 50 us) of the fastest counts as a tie, broken by memory
+    fastest = min(trial.p99_ms for trial in qualifying)
+    chosen = min((trial for trial in qualifying if trial.p99_ms <= fastest * 1.1 + 0.05),
+                 key=lambda trial: (trial.memory_bytes, trial.p99_ms))
+    return TuneResult(chosen, trials, k, target_recall, n, len(queries), max_p99_ms)
@@ -0,0 +1,78 @@
+"""
+Chunking of manual pages and metadata derived from manual filenames
+
+Manual filenames follow <brand>_<appliance type>_<model>.pdf
+(e.g. samsung_washingmachine_WF42H5200.pdf), which is also where the
+data_raw/ folder categories come from.
+
+Chunk ids are "<manual name>_<n>". Uploaded manuals add their content hash,
+"<manual name>@<hash>_<n>", so a different PDF uploaded under an existing
+filename gets ids of its own instead of colliding with the indexed one.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Brands written in capitals rather than title case
+_UPPERCASE_BRANDS = {"lg", "ge"}
+# Separates the manual name from the content hash namespace in chunk ids
+NAMESPACE_SEPARATOR = "@"
+NAMESPACE_LENGTH = 12
+
+
+def manual_name(filename: str, namespace: Optional[str] = None) -> str:
+    """
+    Chunk id prefix for a manual ("lg_microwave_MS2595DIS.pdf.pdf" -> "lg_microwave_MS2595DIS.pdf"),
+    with "@<namespace>" appended when one is given (uploads pass their content hash)
+    """
+    name = Path(filename).stem
+    if namespace:
+        name = f"{name}{NAMESPACE_SEPARATOR}{namespace[:NAMESPACE_LENGTH]}"
+    return name
+
+
+def strip_namespace(name: str) -> str:
+    """Manual name without its "@<hash>" namespace"""
+    return name.split(NAMESPACE_SEPARATOR, 1)[0]
+
+
+def manual_metadata(filename: str) -> Dict[str, Any]:
+    """brand / appliance_type / model parsed from the manual filename (or a namespaced manual name)"""
+    stem = strip_namespace(Path(filename).name)
+    while stem.lower().endswith(".pdf"):
+        stem = stem[:-4]
+    
+    parts = stem.split("_")
+    metadata = {"filename": strip_namespace(Path(filename).name)}
+    if len(parts) >= 3:
+        brand = parts[0]
+        metadata["brand"] = brand.upper() if brand.lower() in _UPPERCASE_BRANDS else brand.capitalize()
+        metadata["appliance_type"] = parts[1].lower()
+        metadata["model"] = "_".join(parts[2:])
+    return metadata
+
+
+def chunk_page(text: str, page: int, first_index: int, filename: str,
+               chunk_words: int = 200, overlap_words: int = 40,
+               namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Split one page of text into overlapping word windows; `namespace` goes into the chunk ids"""
+    words = text.split()
+    if not words:
+        return []
+    
+    prefix = manual_name(filename, namespace)
+    metadata = manual_metadata(filename)
+    step = max(chunk_words - overlap_words, 1)
+    
+    chunks = []
+    for start in range(0, len(words), step):
+        window = words[start:start + chunk_words]
+        chunks.append({
+            **metadata,
+            "id": f"{prefix}_{first_index + len(chunks)}",
+            "text": " ".join(window),
+            "page": page
+        })
+        if start + chunk_words >= len(words):
+            break
+    return chunks
@@ -0,0 +1,287 @@
+"""
+Compressed storage for the base vectors, so the in-memory copy of the corpus
+is a fraction of float32 (N, 384)
+
+CompressionSpec (VECTOR_COMPRESSION) combines:
+- storage: float16 / int8 scalar-quantized codes (FAISS IndexScalarQuantizer)
+  scored directly, or binary - one sign bit per dimension
+- dims (128 / 256) with reduction=prefix (keep the leading dimensions) or
+  pca (project onto the top principal directions); projected rows are
+  renormalized so scores stay on the cosine scale
+
+Binary storage is a prefilter: Hamming distance (popcount over the packed
+bits) shortlists `shortlist` candidates per query, and those are rescored
+exactly against the full-precision embeddings.npy, memory-mapped so it sits
+in the page cache instead of in every process. Float storages rescore their
+top k the same way when the file is available (or a wider `shortlist`), so
+returned scores stay exact and comparable with the delta segment's.
+
+CompressedIndex stands in for the FAISS base index (d, ntotal, search,
+reconstruct_n) and is saved as compressed.npz next to it.
+"""
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+REDUCTIONS = ("prefix", "pca")
+COMPRESSED_FILENAME = "compressed.npz"
+FORMAT_VERSION = 1
+# Hamming candidates rescored per query when binary storage does not set shortlist
+DEFAULT_BINARY_SHORTLIST = 200
+
+
+@dataclass(frozen=True)
+class CompressionSpec:
+    """How base vectors are stored in memory; dims=None keeps every dimension"""
+    storage: str = "float32"
+    dims: Optional[int] = None
+    reduction: str = "prefix"
+    # Candidates rescored from full precision (binary: DEFAULT_BINARY_SHORTLIST, float storages: k)
+    shortlist: Optional[int] = None
+    
+    def __post_init__(self):
+        if self.storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage {self.storage!r} (expected one of {', '.join(STORAGE_TYPES)})")
+        if self.reduction not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction {self.reduction!r} (expected prefix or pca)")
+        if self.dims is not None and self.dims <= 0:
+            raise ValueError(f"dims must be positive, got {self.dims}")
+        if self.storage == "binary" and self.dims is not None and self.dims % 8:
+            raise ValueError(f"Binary storage needs dims divisible by 8, got {self.dims}")
+    
+    @classmethod
+    def parse(cls, text: str) -> "CompressionSpec":
+        """"float16" / "int8:dims=256,reduction=pca" / "binary:shortlist=400\""""
+        storage, _, params = text.strip().lower().partition(":")
+        names = {f.name for f in fields(cls)} - {"storage"}
+        values: Dict[str, Any] = {}
+        for item in filter(None, (part.strip() for part in params.split(","))):
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if name not in names:
+                raise ValueError(f"Unknown vector storage parameter {name!r} in {text!r}")
+            values[name] = value.strip() if name == "reduction" else int(value)
+        return cls(storage.strip() or "float32", **values)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompressionSpec":
+        return cls(**{key: value for key, value in data.items() if key in {f.name for f in fields(cls)}})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    
+    def shortlist_size(self, k: int) -> int:
+        default = DEFAULT_BINARY_SHORTLIST if self.storage == "binary" else k
+        return max(self.shortlist or default, k)
+    
+    def output_dims(self, d: int) -> int:
+        return min(self.dims or d, d)
+    
+    def bytes_per_vector(self, d: int) -> float:
+        """In-memory code size (excluding the memory-mapped rescoring vectors)"""
+        width = {"float32": 4, "float16": 2, "int8": 1, "binary": 1 / 8}[self.storage]
+        return self.output_dims(d) * width
+    
+    @property
+    def label(self) -> str:
+        parts = [self.storage]
+        if self.dims:
+            parts.append(f"{self.reduction}{self.dims}")
+        if self.shortlist:
+            parts.append(f"shortlist={self.shortlist}")
+        return " ".join(parts)
+
+
+def compressed_path(index_path: Path) -> Path:
+    return Path(index_path).with_name(COMPRESSED_FILENAME)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def _pca_components(sample: np.ndarray, dims: int) -> np.ndarray:
+    """(d, dims) top principal directions of a sample of the corpus"""
+    sample = np.asarray(sample, dtype=np.float64)
+    sample = sample - sample.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh(sample.T @ sample)
+    return np.ascontiguousarray(eigenvectors[:, np.argsort(-eigenvalues)[:dims]], dtype=np.float32)
+
+
+class CompressedIndex:
+    """Inner-product search over compressed base vectors, optionally rescored from full precision"""
+    
+    def __init__(self, spec: CompressionSpec, d: int, codes: Any, components: Optional[np.ndarray] = None,
+                 center: Optional[np.ndarray] = None, full: Optional[np.ndarray] = None):
+        self.spec = spec
+        self.d = d
+        # FAISS IndexScalarQuantizer / IndexFlatIP (float storages) or IndexBinaryFlat (binary)
+        self.codes = codes
+        self.ntotal = codes.ntotal
+        self.components = components
+        # Binary: per-dimension mean subtracted before taking signs, so bits split the corpus evenly
+        self.center = center
+        # Full-precision (N, d) vectors, memory-mapped; binary storage rescores its shortlist from these
+        self.full = full
+        if spec.storage == "binary" and full is None:
+            raise ValueError("Binary storage needs the full-precision vectors to rescore from")
+    
+    @classmethod
+    def build(cls, vectors: np.ndarray, spec: CompressionSpec, full: Optional[np.ndarray] = None,
+              max_train: int = 100000, seed: int = 0, batch_size: int = 65536) -> "CompressedIndex":
+        """Encode `vectors` (N, d), L2-normalized; `full` defaults to `vectors` for binary storage"""
+        import faiss
+        
+        n, d = vectors.shape
+        out = spec.output_dims(d)
+        train = vectors
+        if n > max_train:
+            train = vectors[np.sort(np.random.default_rng(seed).choice(n, max_train, replace=False))]
+        components = None
+        if spec.dims and out < d and spec.reduction == "pca":
+            components = _pca_components(train, out)
+            if spec.storage == "binary":
+                # Sign bits of raw PCA coordinates waste most bits on the few high-variance
+                # directions; a random rotation spreads the variance evenly across them
+                rotation, _ = np.linalg.qr(np.random.default_rng(seed).normal(size=(out, out)))
+                components = np.ascontiguousarray(components @ rotation, dtype=np.float32)
+        if spec.storage == "binary" and full is None:
+            full = vectors
+        index = cls(spec, d, faiss.IndexFlatIP(out), components, full=full)
+        
+        if spec.storage == "binary":
+            index.center = index._project(np.asarray(train, dtype=np.float32), normalize=False).mean(axis=0)
+            codes = faiss.IndexBinaryFlat(out)
+        elif spec.storage == "float32":
+            codes = faiss.IndexFlatIP(out)
+        else:
+            qtype = faiss.ScalarQuantizer.QT_fp16 if spec.storage == "float16" else faiss.ScalarQuantizer.QT_8bit
+            codes = faiss.IndexScalarQuantizer(out, qtype, faiss.METRIC_INNER_PRODUCT)
+            if not codes.is_trained:
+                codes.train(index._project(np.asarray(train, dtype=np.float32)))
+        
+        # Encode in batches so a memory-mapped corpus is never materialized as one float32 copy
+        for start in range(0, n, batch_size):
+            batch = index._encode(np.asarray(vectors[start:start + batch_size], dtype=np.float32))
+            codes.add(batch)
+        index.codes = codes
+        index.ntotal = codes.ntotal
+        return index
+    
+    @classmethod
+    def load(cls, path: Path, full: Optional[np.ndarray] = None) -> "CompressedIndex":
+        import faiss
+        
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported compressed vector format {int(data['format_version'])}")
+            spec = CompressionSpec.from_dict(json.loads(str(data["spec"])))
+            if spec.storage == "binary":
+                codes = faiss.deserialize_index_binary(data["codes"])
+            else:
+                codes = faiss.deserialize_index(data["codes"])
+            components = data["components"] if data["components"].size else None
+            center = data["center"] if data["center"].size else None
+            d = int(data["d"])
+        if full is not None and full.shape != (codes.ntotal, d):
+            full = None
+        return cls(spec, d, codes, components, center, full)
+    
+    def save(self, path: Path):
+        """Write atomically (several worker processes may build the same file)"""
+        import faiss
+        
+        if self.spec.storage == "binary":
+            codes = faiss.serialize_index_binary(self.codes)
+        else:
+            codes = faiss.serialize_index(self.codes)
+        arrays = {
+            "format_version": np.int64(FORMAT_VERSION),
+            "spec": np.array(json.dumps(self.spec.to_dict())),
+            "d": np.int64(self.d),
+            "codes": codes,
+            "components": self.components if self.components is not None else np.zeros(0, dtype=np.float32),
+            "center": self.center if self.center is not None else np.zeros(0, dtype=np.float32)
+        }
+        path = Path(path)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    
+    @property
+    def memory_bytes(self) -> int:
+        """Resident size: codes plus the projection (the memory-mapped full vectors are not counted)"""
+        code_bytes = self.codes.ntotal * self.codes.code_size
+        extra = sum(array.nbytes for array in (self.components, self.center) if array is not None)
+        return int(code_bytes + extra)
+    
+    def _project(self, vectors: np.ndarray, normalize: bool = True) -> np.ndarray:
+        if self.components is not None:
+            vectors = vectors @ self.components
+        elif self.spec.dims and self.spec.dims < self.d:
+            vectors = vectors[:, :self.spec.dims]
+        else:
+            return np.ascontiguousarray(vectors, dtype=np.float32)
+        return np.ascontiguousarray(_normalize(vectors) if normalize else vectors, dtype=np.float32)
+    
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """What goes into `codes`: projected floats, or packed sign bits for binary storage"""
+        if self.spec.storage != "binary":
+            return self._project(vectors)
+        return np.packbits(self._project(vectors, normalize=False) > self.center, axis=1)
+    
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by inner product, rescored exactly when the full vectors are mapped; padded with (-inf, -1)"""
+        if self.full is None:
+            scores, rows = self.codes.search(self._project(queries), k)
+            return np.where(rows < 0, -np.inf, scores).astype(np.float32), rows
+        
+        n = queries.shape[0]
+        top_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        top_rows = np.full((n, k), -1, dtype=np.int64)
+        shortlist = min(self.spec.shortlist_size(k), self.ntotal)
+        if shortlist == 0:
+            return top_scores, top_rows
+        
+        _, candidates = self.codes.search(self._encode(queries), shortlist)
+        # Read each query's shortlist from the mapped file in row order, then rescore exactly
+        candidates = np.sort(candidates, axis=1)
+        vectors = np.asarray(self.full[candidates.ravel()], dtype=np.float32).reshape(n, shortlist, self.d)
+        scores = np.einsum("nsd,nd->ns", vectors, queries)
+        top = min(k, shortlist)
+        if top < shortlist:
+            best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        else:
+            best = np.tile(np.arange(shortlist), (n, 1))
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        top_scores[:, :top] = np.take_along_axis(best_scores, order, axis=1)
+        top_rows[:, :top] = np.take_along_axis(np.take_along_axis(candidates, best, axis=1), order, axis=1)
+        return top_scores, top_rows
+    
+    def score_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """(n, len(rows)) scores of the given rows only: exact when full vectors are mapped, else from the codes"""
+        if self.full is not None:
+            return queries @ np.asarray(self.full[rows], dtype=np.float32).T
+        return self._project(queries) @ self.codes.reconstruct_batch(rows).T
+    
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """Stored vectors back in the input space (lossy unless the full vectors are mapped)"""
+        if self.full is not None:
+            return np.asarray(self.full[start:start + count], dtype=np.float32)
+        projected = self.codes.reconstruct_n(start, count)
+        if self.components is not None:
+            return _normalize(projected @ self.components.T).astype(np.float32)
+        padded = np.zeros((count, self.d), dtype=np.float32)
+        padded[:, :projected.shape[1]] = projected
+        return padded
@@ -0,0 +1,177 @@
+"""
+Metadata-filtered retrieval: per-brand, per-model and per-appliance-type
+posting lists over index rows, so a filtered query scores only the vectors of
+matching manuals instead of the whole index.
+
+Facets come from the manual name embedded in every chunk id
+("<brand>_<appliance type>_<model>.pdf_<n>", the data_raw/ naming), falling
+back to the chunk record for manuals named differently.
+"""
+
+import re
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .chunking import manual_metadata
+
+FACETS = ("brand", "model", "appliance_type")
+
+# Common names for the data_raw/ categories
+APPLIANCE_ALIASES = {
+    "washer": "washingmachine",
+    "washing machine": "washingmachine",
+    "clothes washer": "washingmachine",
+    "microwave oven": "microwave",
+    "stand mixer": "mixer",
+    "hand mixer": "mixer",
+    "blender": "mixer",
+    "vacuum cleaner": "vacuum",
+    "hoover": "vacuum",
+    "range": "oven",
+    "stove": "oven",
+    "fridge": "refrigerator",
+    "tumble dryer": "dryer",
+    "clothes dryer": "dryer"
+}
+
+# The data_raw/ categories, normalized
+APPLIANCE_TYPES = ("washingmachine", "microwave", "oven", "mixer", "vacuum")
+
+# Appliances with no manuals in the catalogue, recognized so a question about
+# one is never taken for a question about a catalogue appliance
+OTHER_APPLIANCES = ("dryer", "dishwasher", "refrigerator", "freezer", "cooktop", "water heater", "air conditioner")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_facet(value: Any) -> str:
+    """Case, space and punctuation-insensitive facet value ("WF42H-5200" -> "wf42h5200")"""
+    return _NON_ALNUM.sub("", str(value).lower())
+
+
+def normalize_appliance_type(value: Any) -> str:
+    """"Washing machines" / "washer" / "washingmachines" -> "washingmachine" """
+    text = " ".join(str(value).lower().split())
+    text = APPLIANCE_ALIASES.get(text, APPLIANCE_ALIASES.get(text.rstrip("s"), text))
+    return normalize_facet(text)
+
+
+# Longest phrase first, so "microwave oven" is not read as "oven"
+_APPLIANCE_PHRASES = re.compile(r"\b(" + "|".join(
+    re.escape(phrase)
+    for phrase in sorted({*APPLIANCE_ALIASES, *APPLIANCE_TYPES, *OTHER_APPLIANCES}, key=len, reverse=True)
+) + r")s?\b")
+
+
+def appliance_in_text(text: str) -> Optional[str]:
+    """The normalized appliance type first named in free text ("my Samsung washer ..." -> "washingmachine")"""
+    match = _APPLIANCE_PHRASES.search(" ".join(text.lower().split()))
+    return normalize_appliance_type(match.group(1)) if match else None
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restrict retrieval to manuals matching every given facet"""
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    appliance_type: Optional[str] = None
+    
+    @property
+    def empty(self) -> bool:
+        return not (self.brand or self.model or self.appliance_type)
+    
+    def relaxations(self) -> List["SearchFilter"]:
+        """
+        This filter and progressively looser ones, ending unfiltered: the model
+        goes first (users often type a model slightly off), then the brand
+        """
+        candidates = [
+            self,
+            replace(self, model=None),
+            replace(self, model=None, brand=None),
+            replace(self, model=None, appliance_type=None),
+            SearchFilter()
+        ]
+        relaxed = []
+        for candidate in candidates:
+            if candidate not in relaxed:
+                relaxed.append(candidate)
+        return relaxed
+    
+    def to_dict(self) -> Dict[str, str]:
+        return {facet: getattr(self, facet) for facet in FACETS if getattr(self, facet)}
+
+
+def _manual_of(chunk_id: str) -> str:
+    return chunk_id.rsplit("_", 1)[0]
+
+
+class FacetIndex:
+    """facet -> normalized value -> sorted int64 rows of the chunks it covers"""
+    
+    def __init__(self, postings: Dict[str, Dict[str, np.ndarray]], size: int):
+        self.postings = postings
+        self.size = size
+    
+    @classmethod
+    def build(cls, ids: Sequence[str],
+              lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None) -> "FacetIndex":
+        """Group rows by manual (parsing each manual name once), then by facet value"""
+        rows_by_manual: Dict[str, List[int]] = {}
+        for row, chunk_id in enumerate(ids):
+            rows_by_manual.setdefault(_manual_of(chunk_id), []).append(row)
+        
+        lists: Dict[str, Dict[str, List[int]]] = {facet: {} for facet in FACETS}
+        for manual, rows in rows_by_manual.items():
+            metadata = manual_metadata(manual)
+            if "brand" not in metadata and lookup is not None:
+                metadata = lookup(ids[rows[0]]) or metadata
+            for facet in FACETS:
+                value = metadata.get(facet)
+                if not value:
+                    continue
+                key = normalize_appliance_type(value) if facet == "appliance_type" else normalize_facet(value)
+                lists[facet].setdefault(key, []).extend(rows)
+        
+        postings = {
+            facet: {value: np.array(sorted(rows), dtype=np.int64) for value, rows in values.items()}
+            for facet, values in lists.items()
+        }
+        return cls(postings, len(ids))
+    
+    def _facet_rows(self, facet: str, value: str) -> np.ndarray:
+        values = self.postings[facet]
+        if facet == "appliance_type":
+            key = normalize_appliance_type(value)
+            found = values.get(key)
+            if found is None and key.endswith("s"):
+                found = values.get(key[:-1])
+            return found if found is not None else np.zeros(0, dtype=np.int64)
+        
+        key = normalize_facet(value)
+        if key in values:
+            return values[key]
+        if facet == "model" and key:
+            # A model family ("WF42") matches every model it prefixes
+            matches = [rows for name, rows in values.items() if name.startswith(key)]
+            if matches:
+                return np.unique(np.concatenate(matches))
+        return np.zeros(0, dtype=np.int64)
+    
+    def rows(self, search_filter: SearchFilter) -> Optional[np.ndarray]:
+        """Rows matching every facet of the filter (None for an empty filter)"""
+        selected = None
+        for facet in FACETS:
+            value = getattr(search_filter, facet)
+            if not value:
+                continue
+            rows = self._facet_rows(facet, value)
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+            if not len(selected):
+                break
+        return selected
+    
+    def values(self, facet: str) -> List[str]:
+        return sorted(self.postings[facet])
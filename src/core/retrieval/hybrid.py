@@ -0,0 +1,39 @@
+"""
+Fusion of lexical (BM25) and dense retrieval results
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+# BM25 score at which a lexical-only hit gets relevance 0.5 (squashes BM25 onto the cosine scale)
+LEXICAL_RELEVANCE_PIVOT = 5.0
+
+
+def lexical_relevance(score: float) -> float:
+    return score / (score + LEXICAL_RELEVANCE_PIVOT)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int, rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked id lists: each id scores sum(1 / (rrf_k + rank)) over the
+    lists it appears in. Returns the top k (id, fused score), best first.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
+
+
+def is_decisive(hits: Sequence[Tuple[str, float, float]], min_score: float, margin: float) -> bool:
+    """
+    Whether the lexical result alone is good enough to skip the encoder: the
+    top chunk contains every query term, scores at least `min_score` and
+    beats the best chunk that misses a term by `margin`x
+    """
+    if not hits:
+        return False
+    _, top_score, coverage = hits[0]
+    if coverage < 1.0 or top_score < min_score:
+        return False
+    partial = [score for _, score, hit_coverage in hits if hit_coverage < 1.0]
+    return not partial or top_score >= margin * partial[0]
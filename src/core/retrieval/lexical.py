@@ -0,0 +1,241 @@
+"""
+BM25 inverted index over the chunk corpus, for exact-token queries ("E3",
+"WF45", part numbers) that dense embeddings handle poorly
+
+Postings are stored CSR-style (term -> chunk rows + term frequencies) in one
+.npz next to the FAISS index. Chunks ingested after the file was written go
+into a small in-memory delta, folded in by compact() when the vector index
+merges.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .filters import FacetIndex, SearchFilter
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+STOP_WORDS = frozenset("""
+a an the is are was were be been being am my me i you your it its of to in on for with and or but not no
+do does did doing what why how when where which who whom this that these those can could should would will
+please help there their they them from at by as if so than then also just about into out up down over
+get got has have had any some
+""".split())
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+# "E-3" / "dE-1" -> "e3" / "de1", so codes written with a hyphen match either way
+_HYPHENATED_CODE = re.compile(r"\b([a-z]{1,3})-(\d{1,3})\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens without stop words"""
+    text = _HYPHENATED_CODE.sub(r"\1\2", text.lower())
+    return [token for token in _TOKEN.findall(text) if token not in STOP_WORDS]
+
+
+class LexicalIndex:
+    """Okapi BM25 over chunk texts; rows are in insertion order, `ids` maps them to chunk ids"""
+    
+    def __init__(self, ids: List[str], terms: List[str], indptr: np.ndarray, doc_rows: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.ids = ids
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_rows = doc_rows
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        
+        self.base_size = len(ids)
+        self._known = set(ids)
+        # Delta: term -> [(row, tf)] for chunks added since the postings were built
+        self._delta_postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._facets: Optional[FacetIndex] = None
+        # add/compact swap several arrays; searches must not see them half-updated
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str]], **params) -> "LexicalIndex":
+        """From (chunk id, text) pairs"""
+        index = cls([], [], np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                    np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32), **params)
+        ids, texts = [], []
+        for chunk_id, text in docs:
+            ids.append(chunk_id)
+            texts.append(text)
+        index.add(ids, texts)
+        index.compact()
+        return index
+    
+    @classmethod
+    def load(cls, path: Path, **params) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported lexical index format {int(data['format_version'])}")
+            return cls(data["ids"].tolist(), data["terms"].tolist(), data["indptr"], data["doc_rows"],
+                       data["term_freqs"], data["doc_lengths"], **params)
+    
+    def save(self, path: Path):
+        """Write the compacted index atomically"""
+        with self._lock:
+            self._compact()
+            arrays = {
+                "format_version": np.int64(FORMAT_VERSION),
+                "ids": np.array(self.ids, dtype=np.str_),
+                "terms": np.array(self.terms, dtype=np.str_),
+                "indptr": self.indptr,
+                "doc_rows": self.doc_rows,
+                "term_freqs": self.term_freqs,
+                "doc_lengths": self.doc_lengths
+            }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def delta_size(self) -> int:
+        return len(self.ids) - self.base_size
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._known
+    
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> int:
+        """Index new chunks (ids already present are skipped); returns how many were added"""
+        with self._lock:
+            return self._add(ids, texts)
+    
+    def _add(self, ids: Sequence[str], texts: Sequence[str]) -> int:
+        lengths = []
+        for chunk_id, text in zip(ids, texts):
+            if chunk_id in self._known:
+                continue
+            row = len(self.ids)
+            tokens = tokenize(text or "")
+            for term, tf in Counter(tokens).items():
+                self._delta_postings.setdefault(term, []).append((row, tf))
+            self.ids.append(chunk_id)
+            self._known.add(chunk_id)
+            lengths.append(len(tokens))
+        if lengths:
+            self.doc_lengths = np.concatenate([self.doc_lengths, np.array(lengths, dtype=np.float32)])
+            self._facets = None
+        return len(lengths)
+    
+    def compact(self):
+        """Fold the delta into the CSR postings"""
+        with self._lock:
+            self._compact()
+    
+    def _compact(self):
+        if not self._delta_postings:
+            self.base_size = len(self.ids)
+            return
+        
+        base_terms = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.indptr))
+        terms = list(self.terms)
+        vocab = dict(self.vocab)
+        delta_terms, delta_rows, delta_tfs = [], [], []
+        for term, postings in self._delta_postings.items():
+            term_id = vocab.setdefault(term, len(terms))
+            if term_id == len(terms):
+                terms.append(term)
+            for row, tf in postings:
+                delta_terms.append(term_id)
+                delta_rows.append(row)
+                delta_tfs.append(tf)
+        
+        all_terms = np.concatenate([base_terms, np.array(delta_terms, dtype=np.int64)])
+        all_rows = np.concatenate([self.doc_rows, np.array(delta_rows, dtype=np.int32)])
+        all_tfs = np.concatenate([self.term_freqs, np.array(delta_tfs, dtype=np.float32)])
+        order = np.lexsort((all_rows, all_terms))
+        
+        self.terms = terms
+        self.vocab = vocab
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(all_terms, minlength=len(terms)))]).astype(np.int64)
+        self.doc_rows = all_rows[order]
+        self.term_freqs = all_tfs[order]
+        self._delta_postings = {}
+        self.base_size = len(self.ids)
+    
+    def _facet_index(self) -> FacetIndex:
+        if self._facets is None:
+            self._facets = FacetIndex.build(self.ids)
+        return self._facets
+    
+    def search(self, query: str, k: int,
+               search_filter: Optional[SearchFilter] = None) -> List[Tuple[str, float, float]]:
+        """
+        Top-k chunks by BM25 -> [(chunk id, score, coverage)], best first.
+        coverage is the fraction of the query's terms the chunk contains,
+        counting only terms that occur somewhere in the corpus.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            return self._search(terms, k, search_filter)
+    
+    def _search(self, terms: List[str], k: int, search_filter: Optional[SearchFilter]) -> List[Tuple[str, float, float]]:
+        n = len(self.ids)
+        if not terms or n == 0:
+            return []
+        
+        avgdl = float(self.doc_lengths.mean()) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / avgdl)
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.int32)
+        known_terms = 0
+        
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                start, end = self.indptr[term_id], self.indptr[term_id + 1]
+                rows, tfs = self.doc_rows[start:end], self.term_freqs[start:end]
+            else:
+                rows, tfs = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            delta = self._delta_postings.get(term)
+            if delta:
+                rows = np.concatenate([rows, np.array([row for row, _ in delta], dtype=np.int32)])
+                tfs = np.concatenate([tfs, np.array([tf for _, tf in delta], dtype=np.float32)])
+            if not len(rows):
+                continue
+            
+            known_terms += 1
+            df = len(rows)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+            matched[rows] += 1
+        
+        if search_filter is not None and not search_filter.empty:
+            allowed = self._facet_index().rows(search_filter)
+            mask = np.zeros(n, dtype=bool)
+            mask[allowed] = True
+            scores[~mask] = 0
+        
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.ids[row], float(scores[row]), float(matched[row]) / known_terms) for row in hits]
+    
+    def stats(self):
+        return {"chunks": self.size, "delta_chunks": self.delta_size, "terms": len(self.terms)}
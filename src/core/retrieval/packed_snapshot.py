@@ -0,0 +1,266 @@
+"""
+Single-file packed snapshot of the base index: vectors, chunk ids, chunk
+records (text + metadata) and optionally a serialized FAISS index, laid out
+so the file is memory-mapped and searched without parsing anything but a
+small JSON header. Cold start cost no longer grows with the corpus.
+
+Layout (little-endian):
+    0   8   magic b"CAISNAP\\0"
+    8   4   format version (uint32)
+    12  4   reserved
+    16  8   header length (uint64)
+    24  32  sha256 of the header
+    56  ..  header JSON: counts, provenance and a table of sections, each
+            {offset (from data start), length, dtype, shape, sha256}
+    ..      sections, 64-byte aligned
+
+Sections:
+    vectors        float32 (N, d), L2-normalized, row order = index order
+    id_offsets     int64 (N + 1) into id_blob (utf-8 chunk ids)
+    chunk_offsets  int64 (N + 1) into chunk_blob (one JSON record per row)
+    id_order       int64 (N) rows sorted by chunk id, for id lookups
+    faiss_index    uint8, only for non-flat indexes (faiss.serialize_index)
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .shared_store import ChunkStore, MmapFlatIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CAISNAP\x00"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sIIQ32s")
+ALIGN = 64
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _blob(items: List[bytes]):
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in items], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(items), dtype=np.uint8)
+
+
+def write_packed_snapshot(path: Path, vectors: np.ndarray, ids: List[str], records: List[Dict[str, Any]],
+                          base_files: Optional[Dict[str, str]] = None, metadata_bytes: int = 0,
+                          index_version: int = 0, faiss_index_bytes: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Write a snapshot atomically (temp file + rename). `base_files` and
+    `index_version` record which index it was built from; `metadata_bytes` is
+    how much of metadata.jsonl the records cover. Returns the header.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.shape[0] != len(ids) or len(ids) != len(records):
+        raise ValueError(f"Row mismatch: {vectors.shape[0]} vectors, {len(ids)} ids, {len(records)} records")
+    
+    id_bytes = [str(chunk_id).encode("utf-8") for chunk_id in ids]
+    id_offsets, id_blob = _blob(id_bytes)
+    chunk_offsets, chunk_blob = _blob([json.dumps(record).encode("utf-8") for record in records])
+    id_order = np.array(sorted(range(len(ids)), key=id_bytes.__getitem__), dtype=np.int64)
+    
+    arrays = {
+        "vectors": vectors,
+        "id_offsets": id_offsets,
+        "id_blob": id_blob,
+        "chunk_offsets": chunk_offsets,
+        "chunk_blob": chunk_blob,
+        "id_order": id_order
+    }
+    if faiss_index_bytes is not None:
+        arrays["faiss_index"] = np.asarray(faiss_index_bytes, dtype=np.uint8)
+    
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        data = array.tobytes()
+        sections[name] = {
+            "offset": offset,
+            "length": len(data),
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+        offset += len(data)
+    
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "count": len(ids),
+        "dim": int(vectors.shape[1]),
+        "index_version": index_version,
+        "base_files": base_files or {},
+        "metadata_bytes": metadata_bytes,
+        "sections": sections
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(PREAMBLE.size + len(header_bytes))
+    
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes), hashlib.sha256(header_bytes).digest()))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    
+    logger.info(f"Wrote snapshot {path}: {len(ids)} chunks, {data_start + offset} bytes")
+    return header
+
+
+class PackedSnapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+    
+    def __init__(self, path: Path, verify: bool = False):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        if len(self._mmap) < PREAMBLE.size:
+            raise ValueError(f"{self.path}: truncated snapshot")
+        magic, version, _, header_length, header_sha = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not a snapshot file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported snapshot format version {version}")
+        
+        header_bytes = self._mmap[PREAMBLE.size:PREAMBLE.size + header_length]
+        if hashlib.sha256(header_bytes).digest() != header_sha:
+            raise ValueError(f"{self.path}: header checksum mismatch")
+        self.header = json.loads(header_bytes)
+        self._data_start = _aligned(PREAMBLE.size + header_length)
+        
+        end = self._data_start + max(
+            (section["offset"] + section["length"] for section in self.header["sections"].values()), default=0
+        )
+        if len(self._mmap) < end:
+            raise ValueError(f"{self.path}: truncated snapshot ({len(self._mmap)} < {end} bytes)")
+        
+        if verify:
+            self.verify()
+        
+        self.vectors = self.section("vectors")
+        self._id_offsets = self.section("id_offsets")
+        self._id_blob = self._buffer("id_blob")
+        self._chunk_offsets = self.section("chunk_offsets")
+        self._chunk_blob = self._buffer("chunk_blob")
+        self._id_order = self.section("id_order")
+        self._ids: Optional[List[str]] = None
+    
+    def _buffer(self, name: str) -> memoryview:
+        section = self.header["sections"][name]
+        start = self._data_start + section["offset"]
+        return memoryview(self._mmap)[start:start + section["length"]]
+    
+    def section(self, name: str) -> np.ndarray:
+        section = self.header["sections"][name]
+        return np.frombuffer(self._buffer(name), dtype=np.dtype(section["dtype"])).reshape(section["shape"])
+    
+    def verify(self):
+        """Check every section against its sha256; raises ValueError on mismatch"""
+        for name, section in self.header["sections"].items():
+            if hashlib.sha256(self._buffer(name)).hexdigest() != section["sha256"]:
+                raise ValueError(f"{self.path}: section {name} checksum mismatch")
+    
+    @property
+    def count(self) -> int:
+        return self.header["count"]
+    
+    @property
+    def dim(self) -> int:
+        return self.header["dim"]
+    
+    @property
+    def base_files(self) -> Dict[str, str]:
+        return self.header["base_files"]
+    
+    @property
+    def metadata_bytes(self) -> int:
+        return self.header["metadata_bytes"]
+    
+    def chunk_id(self, row: int) -> str:
+        return bytes(self._id_blob[self._id_offsets[row]:self._id_offsets[row + 1]]).decode("utf-8")
+    
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            blob = bytes(self._id_blob).decode("utf-8")
+            offsets = self._id_offsets
+            if len(blob) == len(self._id_blob):
+                # ASCII ids (the usual case): byte offsets are character offsets
+                self._ids = [blob[offsets[row]:offsets[row + 1]] for row in range(self.count)]
+            else:
+                self._ids = [self.chunk_id(row) for row in range(self.count)]
+        return self._ids
+    
+    def record(self, row: int) -> Dict[str, Any]:
+        return json.loads(bytes(self._chunk_blob[self._chunk_offsets[row]:self._chunk_offsets[row + 1]]))
+    
+    def find(self, chunk_id: str) -> Optional[int]:
+        """Row of a chunk id (binary search over id_order), or None"""
+        target = chunk_id.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            row = int(self._id_order[middle])
+            start, end = self._id_offsets[row], self._id_offsets[row + 1]
+            if bytes(self._id_blob[start:end]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            row = int(self._id_order[low])
+            if self.chunk_id(row) == chunk_id:
+                return row
+        return None
+    
+    def index(self):
+        """Searchable base index: exact search over the mapped vectors, or the packed FAISS index"""
+        if "faiss_index" in self.header["sections"]:
+            import faiss
+            return faiss.deserialize_index(np.array(self.section("faiss_index")))
+        return MmapFlatIndex(self.vectors)
+
+
+class PackedChunkStore(ChunkStore):
+    """Chunk records from a PackedSnapshot, plus metadata.jsonl records appended after it was built"""
+    
+    def __init__(self, packed: PackedSnapshot, metadata_path: Path):
+        self.packed = packed
+        super().__init__(metadata_path)
+    
+    def _open(self):
+        start = self.packed.metadata_bytes
+        if self.path.exists() and start:
+            with open(self.path, "rb") as f:
+                f.seek(start - 1)
+                if f.read(1) != b"\n":
+                    # metadata.jsonl was rewritten since the snapshot - rescan it
+                    logger.warning(f"{self.path} does not match snapshot {self.packed.path}, rescanning")
+                    start = 0
+        self.refresh(start=start)
+    
+    def _lookup(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        row = self.packed.find(chunk_id)
+        return None if row is None else self.packed.record(row)
+    
+    def _indexed_count(self) -> int:
+        return self.packed.count
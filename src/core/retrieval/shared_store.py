@@ -0,0 +1,189 @@
+"""
+Read-only, memory-mapped index and chunk metadata so several uvicorn worker
+processes share one page-cache copy instead of each holding its own
+
+- MmapFlatIndex: exact inner-product search over embeddings.npy opened with
+  np.load(mmap_mode="r") - used for flat indexes, whose vectors FAISS would
+  otherwise copy into every process
+- read_index_mmap: other FAISS index types via IO_FLAG_MMAP | IO_FLAG_READ_ONLY
+- ChunkStore: chunk records served straight out of a memory-mapped
+  metadata.jsonl through a sorted (id, offset, length) sidecar
+"""
+
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# FAISS fourcc headers of flat (uncompressed) indexes
+FLAT_FOURCCS = (b"IxFI", b"IxF2", b"IxFl")
+
+
+def is_flat_index_file(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(4) in FLAT_FOURCCS
+
+
+class MmapFlatIndex:
+    """Exact inner-product search over a memory-mapped (N, d) float32 matrix"""
+    
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal = vectors.shape[0]
+        self.d = vectors.shape[1]
+    
+    @classmethod
+    def open(cls, embeddings_path: Path) -> "MmapFlatIndex":
+        return cls(np.load(embeddings_path, mmap_mode="r"))
+    
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n = queries.shape[0]
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        rows = np.full((n, k), -1, dtype=np.int64)
+        if self.ntotal == 0:
+            return scores, rows
+        
+        similarities = queries @ self.vectors.T
+        top = min(k, self.ntotal)
+        if top < self.ntotal:
+            candidates = np.argpartition(-similarities, top - 1, axis=1)[:, :top]
+        else:
+            candidates = np.tile(np.arange(self.ntotal), (n, 1))
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        
+        scores[:, :top] = np.take_along_axis(candidate_scores, order, axis=1)
+        rows[:, :top] = np.take_along_axis(candidates, order, axis=1)
+        return scores, rows
+    
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        return np.asarray(self.vectors[start:start + count], dtype=np.float32)
+
+
+def read_index_mmap(index_path: Path, embeddings_path: Optional[Path] = None):
+    """Open an index so its vectors are shared through the page cache"""
+    if embeddings_path and Path(embeddings_path).exists() and is_flat_index_file(index_path):
+        index = MmapFlatIndex.open(embeddings_path)
+        return index
+    
+    import faiss
+    return faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+class ChunkStore:
+    """
+    chunk_id -> record, read from a memory-mapped metadata.jsonl.
+    The sidecar <metadata>.offsets.npy holds a structured array sorted by id
+    and is itself memory-mapped, so lookups are a binary search plus one
+    json.loads of a single line. Records appended after the sidecar was built
+    (or added at runtime) live in a small per-process overlay.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.sidecar_path = self.path.with_name(self.path.name + ".offsets.npy")
+        self.overlay: Dict[str, Dict[str, Any]] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._index: Optional[np.ndarray] = None
+        self._indexed_bytes = 0
+        self._read_bytes = 0
+        self._open()
+    
+    def _scan(self, start: int) -> Iterator[Tuple[str, int, int, Dict[str, Any]]]:
+        """(chunk_id, offset, length, record) for complete lines from byte `start`"""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written tail
+                length = len(line)
+                if line.strip():
+                    record = json.loads(line)
+                    chunk_id = record.get("id") or record.get("chunk_id")
+                    if chunk_id is not None:
+                        yield str(chunk_id), offset, length, record
+                offset += length
+        self._read_bytes = offset
+    
+    def _build_sidecar(self):
+        entries = [(chunk_id, offset, length) for chunk_id, offset, length, _ in self._scan(0)]
+        width = max((len(chunk_id) for chunk_id, _, _ in entries), default=1)
+        index = np.array(entries, dtype=[("id", f"<U{width}"), ("offset", "<i8"), ("length", "<i8")])
+        index.sort(order="id")
+        
+        tmp = self.sidecar_path.with_name(self.sidecar_path.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, index)
+        os.replace(tmp, self.sidecar_path)
+        logger.info(f"Built chunk offset index: {len(entries)} chunks -> {self.sidecar_path}")
+    
+    def _open(self):
+        if not self.path.exists():
+            logger.warning(f"Chunk metadata not found: {self.path}")
+            return
+        
+        size = self.path.stat().st_size
+        sidecar_fresh = self.sidecar_path.exists() and \
+            self.sidecar_path.stat().st_mtime >= self.path.stat().st_mtime
+        if not sidecar_fresh:
+            self._build_sidecar()
+        
+        self._index = np.load(self.sidecar_path, mmap_mode="r")
+        if len(self._index):
+            last = self._index[np.argmax(self._index["offset"])]
+            self._indexed_bytes = int(last["offset"] + last["length"])
+        
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        
+        # Anything appended after the sidecar was written
+        self.refresh(start=self._indexed_bytes)
+    
+    def refresh(self, start: Optional[int] = None) -> int:
+        """Load records appended to the file (e.g. by another worker); returns how many"""
+        if not self.path.exists():
+            return 0
+        start = self._read_bytes if start is None else start
+        added = 0
+        for chunk_id, _, _, record in self._scan(start):
+            self.overlay[chunk_id] = record
+            added += 1
+        return added
+    
+    def get(self, chunk_id: str, default: Any = None) -> Any:
+        record = self.overlay.get(chunk_id)
+        if record is not None:
+            return record
+        record = self._lookup(chunk_id)
+        return default if record is None else record
+    
+    def _lookup(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        if self._index is None or self._mmap is None or not len(self._index):
+            return None
+        ids = self._index["id"]
+        position = int(np.searchsorted(ids, chunk_id))
+        if position >= len(ids) or ids[position] != chunk_id:
+            return None
+        
+        entry = self._index[position]
+        offset, length = int(entry["offset"]), int(entry["length"])
+        return json.loads(self._mmap[offset:offset + length])
+    
+    def _indexed_count(self) -> int:
+        return len(self._index) if self._index is not None else 0
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return self.get(chunk_id) is not None
+    
+    def __setitem__(self, chunk_id: str, record: Dict[str, Any]):
+        self.overlay[chunk_id] = record
+    
+    def __len__(self) -> int:
+        return self._indexed_count() + len(self.overlay)
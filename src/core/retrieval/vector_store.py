@@ -0,0 +1,862 @@
+"""
+VectorStore: FAISS index + chunk ids + chunk metadata, searched in batches
+
+Files (relative to the project root):
+- faiss_index/faiss.index   inner-product index over L2-normalized embeddings
+                            (flat by default; IVF-Flat, IVF-PQ or HNSW, see ann)
+- faiss_index/index_params.json   parameters the index was built / tuned with
+- embeddings/ids.npy        chunk id per index row ("<filename>_<n>")
+- metadata/metadata.jsonl   one chunk per line: id, text, filename, brand, model, page
+
+Incremental updates: new chunks go into an append-only delta segment that is
+searched alongside the base index and periodically merged into a new base in
+the background. Every change is published as a new immutable IndexSnapshot,
+swapped in with a single reference assignment, so searches never wait on
+writers and never see a half-updated index. On disk, faiss_index/manifest.json
+names the current base directory and delta segments; it is replaced
+atomically after the files it points to are complete.
+
+Shared mode (mmap=True): the base vectors and chunk metadata are memory-mapped
+read-only (see shared_store), so several worker processes on one host share a
+single page-cache copy. Workers that do not write pick up other processes'
+changes with refresh(), which re-reads the manifest.
+
+Packed snapshot (snapshot_path): when a packed_snapshot file built from the
+current base exists, the base vectors, ids and chunk records are all served
+from that one memory-mapped file; merges rewrite it.
+
+Filtered search (search_filtered_rows): brand / model / appliance-type posting
+lists (see filters) restrict scoring to the matching manuals' rows, relaxing
+the filter when it leaves too few candidates.
+
+Lexical index (lexical_path): a BM25 inverted index over the same chunks
+(see lexical), kept in step with add() and rewritten by merges.
+
+Index type (index_spec): merges keep the base's index type; ensure_index_type()
+rebuilds the base when it differs from the configured spec, or auto-tunes one
+("auto") and records the chosen parameters next to the index.
+
+Compressed vectors (compression): the base is searched through float16 /
+int8 / projected / sign-bit codes (see compressed) saved as compressed.npz
+next to the index, with full-precision rescoring from the memory-mapped
+embeddings.npy. It replaces the FAISS base in memory, so index_spec is not
+applied while it is set.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .shared_store import ChunkStore, MmapFlatIndex, read_index_mmap
+from .packed_snapshot import PackedChunkStore, PackedSnapshot, write_packed_snapshot
+from .filters import FacetIndex, SearchFilter
+from .lexical import LexicalIndex
+from .compressed import CompressedIndex, CompressionSpec, compressed_path
+from .ann import (
+    IndexSpec, apply_search_params, build_index, describe_index, params_path, read_index_params,
+    search_parameters, tune, write_index_params
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = Path("faiss_index/faiss.index")
+DEFAULT_IDS_PATH = Path("embeddings/ids.npy")
+DEFAULT_EMBEDDINGS_PATH = Path("embeddings/embeddings.npy")
+DEFAULT_METADATA_PATH = Path("metadata/metadata.jsonl")
+DEFAULT_MANIFEST_PATH = Path("faiss_index/manifest.json")
+DEFAULT_LEXICAL_PATH = Path("faiss_index/bm25.npz")
+
+
+def load_chunk_metadata(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Read metadata.jsonl into a chunk_id -> record dict"""
+    chunks = {}
+    if not path.exists():
+        logger.warning(f"Chunk metadata not found: {path}")
+        return chunks
+    
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            chunk_id = record.get("id") or record.get("chunk_id")
+            if chunk_id is not None:
+                chunks[str(chunk_id)] = record
+    return chunks
+
+
+def _save_npy(path: Path, array: np.ndarray):
+    # File handle instead of a path so np.save does not append ".npy" to "*.tmp"
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _replace_file(path: Path, write):
+    """Write to a temporary sibling, then atomically move it into place"""
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _flat_ip_index(vectors: np.ndarray, dim: int):
+    import faiss
+    
+    index = faiss.IndexFlatIP(dim)
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+
+def _open_base(base_files: Dict[str, str], mmap: bool):
+    if mmap:
+        return read_index_mmap(Path(base_files["index"]), Path(base_files["embeddings"]))
+    import faiss
+    return faiss.read_index(base_files["index"])
+
+
+def _apply_recorded_params(index: Any, base_files: Dict[str, str]):
+    """Re-apply the nprobe / efSearch recorded in index_params.json next to the base index"""
+    recorded = read_index_params(Path(base_files["index"]))
+    if recorded and recorded.get("spec"):
+        apply_search_params(index, IndexSpec.from_dict(recorded["spec"]))
+
+
+def _open_compressed(base_files: Dict[str, str], spec: CompressionSpec, count: int,
+                     packed: Optional[PackedSnapshot] = None, mmap: bool = False):
+    """The base as a CompressedIndex: compressed.npz if it matches `spec`, else encoded now and saved"""
+    embeddings = Path(base_files["embeddings"])
+    full = None
+    if packed is not None:
+        full = packed.vectors
+    elif embeddings.exists():
+        full = np.load(embeddings, mmap_mode="r")
+    if full is not None and full.shape[0] != count:
+        full = None
+    
+    path = compressed_path(Path(base_files["index"]))
+    if path.exists():
+        try:
+            index = CompressedIndex.load(path, full)
+            if index.spec == spec and index.ntotal == count:
+                return index
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable compressed vectors {path}: {str(e)}")
+    if full is None and spec.storage == "binary":
+        logger.warning(f"No full-precision vectors to rescore {spec.label} from, using the uncompressed index")
+        return _open_base(base_files, mmap)
+    
+    start = time.time()
+    vectors = full if full is not None else _open_base(base_files, mmap=True).reconstruct_n(0, count)
+    index = CompressedIndex.build(vectors, spec, full=full)
+    index.save(path)
+    logger.info(f"Compressed {count} base vectors ({spec.label}, {index.memory_bytes / 1e6:.1f} MB) "
+                f"in {time.time() - start:.2f}s")
+    return index
+
+
+def _layout(index: Any) -> str:
+    """Index type for logs; compressed bases also show their resident size"""
+    if isinstance(index, CompressedIndex):
+        return f"{index.spec.label}, {index.memory_bytes / 1e6:.1f} MB"
+    return describe_index(index).label
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k (score, row) pairs per query, padded with (-inf, -1)"""
+    n = scores.shape[0]
+    top_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    top_rows = np.full((n, k), -1, dtype=np.int64)
+    top = min(k, scores.shape[1])
+    if top == 0:
+        return top_scores, top_rows
+    
+    if top < scores.shape[1]:
+        candidates = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (n, 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    top_scores[:, :top] = np.take_along_axis(candidate_scores, order, axis=1)
+    top_rows[:, :top] = rows[np.take_along_axis(candidates, order, axis=1)]
+    return top_scores, top_rows
+
+
+def _search_subset(index: Any, rows: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k among the given rows of an index, scoring only those vectors"""
+    if isinstance(index, MmapFlatIndex):
+        return _top_k(queries @ np.asarray(index.vectors[rows], dtype=np.float32).T, rows, k)
+    if isinstance(index, CompressedIndex):
+        return _top_k(index.score_rows(queries, rows), rows, k)
+    
+    import faiss
+    try:
+        # Flat indexes: gather the candidate vectors and score just those
+        vectors = index.reconstruct_batch(rows)
+    except RuntimeError:
+        # ANN indexes without a direct map: let FAISS skip non-candidates
+        params = search_parameters(index, faiss.IDSelectorBatch(rows))
+        return index.search(queries, k, params=params)
+    return _top_k(queries @ vectors.T, rows, k)
+
+
+def _chunk_text(chunks: Any, chunk_id: str) -> str:
+    record = chunks.get(chunk_id) or {}
+    return record.get("text") or record.get("content") or ""
+
+
+def _open_lexical(path: Path, snapshot: "IndexSnapshot", chunks: Any) -> LexicalIndex:
+    """Load the BM25 index (building it from the chunk texts if missing) and index any chunks it lacks"""
+    lexical = None
+    if path.exists():
+        try:
+            lexical = LexicalIndex.load(path)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable lexical index {path}: {str(e)}")
+    if lexical is None:
+        start = time.time()
+        lexical = LexicalIndex.build((chunk_id, _chunk_text(chunks, chunk_id)) for chunk_id in snapshot.ids)
+        lexical.save(path)
+        logger.info(f"Built lexical index {path}: {lexical.size} chunks, {len(lexical.terms)} terms "
+                    f"in {time.time() - start:.2f}s")
+    _sync_lexical(lexical, snapshot.ids, chunks)
+    return lexical
+
+
+def _sync_lexical(lexical: LexicalIndex, ids: List[str], chunks: Any) -> int:
+    missing = [chunk_id for chunk_id in ids if chunk_id not in lexical]
+    return lexical.add(missing, [_chunk_text(chunks, chunk_id) for chunk_id in missing])
+
+
+def _read_manifest(manifest_path: Path, legacy: Dict[str, Path]) -> Dict[str, Any]:
+    if manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": 0, "base": {name: str(path) for name, path in legacy.items()}, "segments": []}
+
+
+def _open_packed(path: Optional[Path], manifest: Dict[str, Any], verify: bool = False) -> Optional[PackedSnapshot]:
+    """The packed snapshot at `path` if it was built from the manifest's base, else None"""
+    if path is None or not Path(path).exists():
+        return None
+    try:
+        packed = PackedSnapshot(path, verify=verify)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {str(e)}")
+        return None
+    if packed.base_files != manifest["base"]:
+        logger.info(f"Snapshot {path} is from another base index, loading index files instead")
+        return None
+    return packed
+
+
+def _load_snapshot(manifest: Dict[str, Any], mmap: bool,
+                   reuse: Optional["IndexSnapshot"] = None,
+                   packed: Optional[PackedSnapshot] = None,
+                   compression: Optional[CompressionSpec] = None) -> "IndexSnapshot":
+    """Open the base and delta segments a manifest names (reusing `reuse`'s base if unchanged)"""
+    base_files = manifest["base"]
+    if reuse is not None and reuse.base_files == base_files:
+        base_index, base_ids = reuse.base_index, reuse.base_ids
+    elif compression is not None:
+        if packed is not None:
+            base_ids = packed.ids
+        else:
+            base_ids = [str(chunk_id) for chunk_id in np.load(base_files["ids"], allow_pickle=True)]
+        base_index = _open_compressed(base_files, compression, len(base_ids), packed, mmap)
+    elif packed is not None:
+        base_index, base_ids = packed.index(), packed.ids
+    else:
+        base_index = _open_base(base_files, mmap)
+        base_ids = [str(chunk_id) for chunk_id in np.load(base_files["ids"], allow_pickle=True)]
+        if base_index.ntotal != len(base_ids):
+            logger.warning(f"Index has {base_index.ntotal} vectors but {len(base_ids)} ids")
+    if reuse is None or reuse.base_index is not base_index:
+        _apply_recorded_params(base_index, base_files)
+    
+    delta_vectors = np.zeros((0, base_index.d), dtype=np.float32)
+    delta_ids: List[str] = []
+    for segment in manifest["segments"]:
+        with np.load(segment["path"]) as data:
+            delta_vectors = np.vstack([delta_vectors, data["vectors"]])
+            delta_ids.extend(str(chunk_id) for chunk_id in data["ids"])
+    
+    reused = reuse is not None and reuse.base_index is base_index
+    return IndexSnapshot(manifest["version"], base_index, base_ids, base_files,
+                         delta_vectors, delta_ids, manifest["segments"],
+                         base_facets=reuse._base_facets if reused else None)
+
+
+class IndexSnapshot:
+    """Immutable view of the index: base + delta segment, published as a unit"""
+    
+    def __init__(self, version: int, base_index: Any, base_ids: List[str], base_files: Dict[str, str],
+                 delta_vectors: np.ndarray, delta_ids: List[str], segments: List[Dict[str, Any]],
+                 base_facets: Optional[FacetIndex] = None):
+        self.version = version
+        self.base_index = base_index
+        self.base_ids = base_ids
+        self.base_files = base_files
+        self.delta_vectors = delta_vectors
+        self.delta_ids = delta_ids
+        self.delta_index = _flat_ip_index(delta_vectors, base_index.d) if delta_ids else None
+        # Each delta segment on disk: {"path": ..., "count": ...}, in delta row order
+        self.segments = segments
+        
+        self._base_lookup = np.array(base_ids + [None], dtype=object)
+        self._delta_lookup = np.array(delta_ids + [None], dtype=object)
+        # Posting lists, built on the first filtered search (the base's carries over while it is unchanged)
+        self._base_facets = base_facets
+        self._delta_facets: Optional[FacetIndex] = None
+    
+    @property
+    def size(self) -> int:
+        return self.base_index.ntotal + len(self.delta_ids)
+    
+    @property
+    def ids(self) -> List[str]:
+        return self.base_ids + self.delta_ids
+    
+    def facets(self, lookup=None) -> Tuple[FacetIndex, FacetIndex]:
+        """(base, delta) posting lists; lookup resolves chunk records for unparseable manual names"""
+        if self._base_facets is None:
+            self._base_facets = FacetIndex.build(self.base_ids, lookup)
+        if self._delta_facets is None:
+            self._delta_facets = FacetIndex.build(self.delta_ids, lookup)
+        return self._base_facets, self._delta_facets
+    
+    def candidate_rows(self, search_filter: SearchFilter, lookup=None) -> Tuple[np.ndarray, np.ndarray]:
+        """(base rows, delta rows) matching a non-empty filter"""
+        base_facets, delta_facets = self.facets(lookup)
+        return base_facets.rows(search_filter), delta_facets.rows(search_filter)
+    
+    def search(self, queries: np.ndarray, k: int,
+               rows: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k over base and delta -> (scores, chunk ids); missing hits are None.
+        rows: (base rows, delta rows) to restrict the search to (see candidate_rows)
+        """
+        if rows is None:
+            scores, base_rows = self.base_index.search(queries, k)
+        else:
+            scores, base_rows = _search_subset(self.base_index, rows[0], queries, k)
+        ids = self._base_lookup[base_rows]  # row -1 maps to the trailing None
+        
+        if rows is None and self.delta_index is not None:
+            delta_scores, delta_rows = self.delta_index.search(queries, min(k, len(self.delta_ids)))
+        elif rows is not None and len(rows[1]):
+            delta_scores, delta_rows = _top_k(queries @ self.delta_vectors[rows[1]].T, rows[1], k)
+        else:
+            return scores, ids
+        scores = np.hstack([scores, delta_scores])
+        ids = np.hstack([ids, self._delta_lookup[delta_rows]])
+        
+        # Inner product: higher is better; empty slots score -inf
+        scores = np.where(ids == None, -np.inf, scores)  # noqa: E711 - elementwise on object array
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class VectorStore:
+    """Batched top-k search over a FAISS index with chunk metadata lookup"""
+    
+    def __init__(self, snapshot: IndexSnapshot, chunks: Dict[str, Dict[str, Any]],
+                 metadata_path: Optional[Path] = None, manifest_path: Optional[Path] = None,
+                 legacy_paths: Optional[Dict[str, Path]] = None, merge_threshold: int = 5000,
+                 mmap: bool = False, snapshot_path: Optional[Path] = None,
+                 lexical: Optional[LexicalIndex] = None, lexical_path: Optional[Path] = None,
+                 index_spec: Optional[IndexSpec] = None, compression: Optional[CompressionSpec] = None):
+        self._snapshot = snapshot
+        # Shared across snapshots: only ever gains keys, and readers only look
+        # up ids their snapshot returned
+        self.chunks = chunks
+        self.metadata_path = metadata_path
+        self.manifest_path = manifest_path
+        self.legacy_paths = legacy_paths or {}
+        self.merge_threshold = merge_threshold
+        self.mmap = mmap
+        self.snapshot_path = snapshot_path
+        self.lexical = lexical
+        self.lexical_path = lexical_path
+        # Target index type for rebuilds (None: keep whatever the base is)
+        self.index_spec = index_spec
+        # Base vectors held compressed (None: the FAISS index as stored)
+        self.compression = compression
+        
+        self._write_lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+        self.merges = 0
+    
+    @classmethod
+    def load(cls,
+             index_path: Path = DEFAULT_INDEX_PATH,
+             ids_path: Path = DEFAULT_IDS_PATH,
+             metadata_path: Path = DEFAULT_METADATA_PATH,
+             embeddings_path: Path = DEFAULT_EMBEDDINGS_PATH,
+             manifest_path: Path = DEFAULT_MANIFEST_PATH,
+             merge_threshold: int = 5000,
+             mmap: bool = False,
+             snapshot_path: Optional[Path] = None,
+             verify_snapshot: bool = False,
+             lexical_path: Optional[Path] = None,
+             index_spec: Optional[IndexSpec] = None,
+             compression: Optional[CompressionSpec] = None) -> "VectorStore":
+        start = time.time()
+        legacy = {"index": Path(index_path), "ids": Path(ids_path), "embeddings": Path(embeddings_path)}
+        manifest_path = Path(manifest_path)
+        
+        manifest = _read_manifest(manifest_path, legacy)
+        packed = _open_packed(snapshot_path, manifest, verify=verify_snapshot)
+        snapshot = _load_snapshot(manifest, mmap, packed=packed, compression=compression)
+        if packed is not None:
+            chunks = PackedChunkStore(packed, Path(metadata_path))
+        elif mmap:
+            chunks = ChunkStore(Path(metadata_path))
+        else:
+            chunks = load_chunk_metadata(Path(metadata_path))
+        
+        lexical = _open_lexical(Path(lexical_path), snapshot, chunks) if lexical_path else None
+        
+        source = f" from {snapshot_path}" if packed is not None else (" (memory-mapped)" if mmap else "")
+        logger.info(f"VectorStore loaded{source}: v{snapshot.version}, {snapshot.base_index.ntotal} base + "
+                    f"{len(snapshot.delta_ids)} delta vectors ({_layout(snapshot.base_index)}), "
+                    f"{len(chunks)} chunks in {time.time() - start:.3f}s")
+        return cls(snapshot, chunks, metadata_path=Path(metadata_path), manifest_path=manifest_path,
+                   legacy_paths=legacy, merge_threshold=merge_threshold, mmap=mmap,
+                   snapshot_path=Path(snapshot_path) if snapshot_path else None,
+                   lexical=lexical, lexical_path=Path(lexical_path) if lexical_path else None,
+                   index_spec=index_spec, compression=compression)
+    
+    def refresh(self) -> bool:
+        """
+        Adopt a newer manifest written by another process (delta segments or a
+        merged base) and any chunk metadata it appended. Returns True if the
+        snapshot changed.
+        """
+        if self.manifest_path is None or not self.manifest_path.exists():
+            return False
+        
+        with self._write_lock:
+            manifest = _read_manifest(self.manifest_path, self.legacy_paths)
+            current = self._snapshot
+            if manifest["version"] <= current.version:
+                return False
+            
+            if isinstance(self.chunks, ChunkStore):
+                self.chunks.refresh()
+            else:
+                for chunk_id, record in load_chunk_metadata(self.metadata_path).items():
+                    self.chunks.setdefault(chunk_id, record)
+            
+            packed = None
+            if manifest["base"] != current.base_files:
+                packed = _open_packed(self.snapshot_path, manifest)
+            snapshot = _load_snapshot(manifest, self.mmap, reuse=current, packed=packed,
+                                      compression=self.compression)
+            self._snapshot = snapshot
+            if self.lexical is not None:
+                new_ids = snapshot.delta_ids if snapshot.base_index is current.base_index else snapshot.ids
+                _sync_lexical(self.lexical, new_ids, self.chunks)
+        
+        logger.info(f"VectorStore refreshed to v{snapshot.version} "
+                    f"({snapshot.base_index.ntotal} base, {len(snapshot.delta_ids)} delta)")
+        return True
+    
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+    
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+    
+    @property
+    def size(self) -> int:
+        return self._snapshot.size
+    
+    @property
+    def delta_size(self) -> int:
+        return len(self._snapshot.delta_ids)
+    
+    @property
+    def dim(self) -> int:
+        return self._snapshot.base_index.d
+    
+    @property
+    def ids(self) -> List[str]:
+        return self._snapshot.ids
+    
+    def chunk(self, chunk_id: Optional[str], score: float) -> Optional[Dict[str, Any]]:
+        """Resolve a chunk id to its metadata record with a relevance score"""
+        if chunk_id is None:
+            return None
+        record = self.chunks.get(chunk_id, {"id": chunk_id})
+        return {**record, "id": chunk_id, "relevance_score": float(score)}
+    
+    def search_rows(self, query_embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Index search over the query matrix -> (scores, chunk ids), on the current snapshot"""
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        return self._snapshot.search(queries, k)
+    
+    def resolve(self, scores: np.ndarray, ids: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """Turn (scores, ids) from search_rows into chunk dicts, best first"""
+        results = []
+        for query_scores, query_ids in zip(scores, ids):
+            hits = []
+            for score, chunk_id in zip(query_scores, query_ids):
+                chunk = self.chunk(chunk_id, float(score))
+                if chunk is not None:
+                    hits.append(chunk)
+            results.append(hits)
+        return results
+    
+    def search(self, query_embeddings: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        """
+        Search all queries with a single index.search call.
+        query_embeddings: (n, d) float32, L2-normalized
+        Returns one list of up to k chunk dicts per query, best first.
+        """
+        scores, ids = self.search_rows(query_embeddings, k)
+        return self.resolve(scores, ids)
+    
+    def search_filtered_rows(self, query_embeddings: np.ndarray, k: int, search_filter: SearchFilter,
+                             min_candidates: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, SearchFilter]:
+        """
+        search_rows restricted to chunks of manuals matching `search_filter`.
+        When fewer than `min_candidates` (default k) chunks match, the filter is
+        relaxed (model, then brand, then dropped). Returns (scores, ids, filter applied).
+        """
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        snapshot = self._snapshot
+        needed = k if min_candidates is None else min_candidates
+        
+        for applied in search_filter.relaxations():
+            if applied.empty:
+                break
+            rows = snapshot.candidate_rows(applied, self.chunks.get)
+            if len(rows[0]) + len(rows[1]) >= needed:
+                scores, ids = snapshot.search(queries, k, rows=rows)
+                return scores, ids, applied
+        
+        scores, ids = snapshot.search(queries, k)
+        return scores, ids, SearchFilter()
+    
+    def search_lexical(self, query: str, k: int,
+                       search_filter: Optional[SearchFilter] = None) -> List[Tuple[str, float, float]]:
+        """BM25 top-k -> [(chunk id, score, query-term coverage)]; empty without a lexical index"""
+        if self.lexical is None:
+            return []
+        return self.lexical.search(query, k, search_filter)
+    
+    def facet_values(self) -> Dict[str, List[str]]:
+        """Known brands / models / appliance types (normalized)"""
+        base_facets, delta_facets = self._snapshot.facets(self.chunks.get)
+        return {facet: sorted(set(base_facets.values(facet)) | set(delta_facets.values(facet)))
+                for facet in base_facets.postings}
+    
+    # -- writers -------------------------------------------------------------
+    
+    def add(self, embeddings: np.ndarray, records: List[Dict[str, Any]]) -> int:
+        """
+        Append chunks (L2-normalized embeddings + metadata records) as a new
+        delta segment and publish a new snapshot. Ids already present are
+        skipped so a retried publish is idempotent. Returns the number added.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            known = set(current.base_ids)
+            known.update(current.delta_ids)
+            keep = [i for i, record in enumerate(records) if str(record["id"]) not in known]
+            if not keep:
+                return 0
+            
+            vectors = np.ascontiguousarray(embeddings[keep], dtype=np.float32)
+            new_records = [records[i] for i in keep]
+            new_ids = [str(record["id"]) for record in new_records]
+            
+            segment = self._write_segment(current.version + 1, vectors, new_ids)
+            self._append_metadata(new_records)
+            for chunk_id, record in zip(new_ids, new_records):
+                self.chunks[chunk_id] = record
+            if self.lexical is not None:
+                self.lexical.add(new_ids, [record.get("text") or record.get("content") or "" for record in new_records])
+            
+            snapshot = IndexSnapshot(
+                current.version + 1, current.base_index, current.base_ids, current.base_files,
+                np.vstack([current.delta_vectors, vectors]), current.delta_ids + new_ids,
+                current.segments + [segment], base_facets=current._base_facets
+            )
+            self._write_manifest(snapshot)
+            self._snapshot = snapshot
+        
+        logger.info(f"VectorStore v{snapshot.version}: +{len(new_ids)} chunks "
+                    f"({snapshot.base_index.ntotal} base, {len(snapshot.delta_ids)} delta)")
+        
+        if len(snapshot.delta_ids) >= self.merge_threshold:
+            self.merge_in_background()
+        return len(new_ids)
+    
+    def merge_in_background(self):
+        """Start a merge thread unless one is already running"""
+        if self._merge_thread and self._merge_thread.is_alive():
+            return
+        self._merge_thread = threading.Thread(target=self.merge, name="index-merge", daemon=True)
+        self._merge_thread.start()
+    
+    def merge(self) -> bool:
+        """
+        Fold the delta segment into a new base index. The expensive part runs
+        on a private copy; only the snapshot swap takes the write lock, and
+        deltas added meanwhile carry over into the new snapshot.
+        """
+        return self._rebuild_base()
+    
+    def rebuild(self, spec: IndexSpec, tuning: Optional[Dict[str, Any]] = None) -> bool:
+        """Rebuild the base (delta folded in) as `spec`, recording `tuning` with its parameters"""
+        return self._rebuild_base(spec, tuning)
+    
+    def _new_base(self, merging: IndexSnapshot, merged_vectors: np.ndarray, spec: Optional[IndexSpec]):
+        """Index over the merged vectors: `spec` if given, else the base's own type"""
+        import faiss
+        
+        current = describe_index(merging.base_index)
+        if spec is None or spec.same_structure(current):
+            if isinstance(merging.base_index, (MmapFlatIndex, CompressedIndex)):
+                return _flat_ip_index(merged_vectors, merging.base_index.d)
+            new_base = faiss.clone_index(merging.base_index)
+            new_base.add(merging.delta_vectors)
+            if spec is not None:
+                apply_search_params(new_base, spec)
+            return new_base
+        if spec.kind == "flat":
+            return _flat_ip_index(merged_vectors, merging.base_index.d)
+        return build_index(merged_vectors, spec)
+    
+    def _rebuild_base(self, spec: Optional[IndexSpec] = None, tuning: Optional[Dict[str, Any]] = None) -> bool:
+        import faiss
+        
+        with self._merge_lock:
+            start = time.time()
+            with self._write_lock:
+                merging = self._snapshot
+                metadata_bytes = self._metadata_bytes()
+            if not merging.delta_ids and spec is None:
+                return False
+            
+            merged_ids = merging.base_ids + merging.delta_ids
+            merged_vectors = np.vstack([self._base_vectors(merging), merging.delta_vectors])
+            new_base = self._new_base(merging, merged_vectors, spec)
+            
+            base_dir = self.manifest_path.parent / f"base_{time.time_ns()}"
+            base_dir.mkdir(parents=True)
+            base_files = {
+                "index": str(base_dir / "faiss.index"),
+                "ids": str(base_dir / "ids.npy"),
+                "embeddings": str(base_dir / "embeddings.npy")
+            }
+            faiss.write_index(new_base, base_files["index"])
+            _save_npy(Path(base_files["ids"]), np.array(merged_ids, dtype=object))
+            _save_npy(Path(base_files["embeddings"]), merged_vectors)
+            # Carry the recorded tuning over unless this rebuild comes with its own
+            if tuning is None and spec is None:
+                tuning = (read_index_params(Path(merging.base_files["index"])) or {}).get("tuning")
+            write_index_params(Path(base_files["index"]), describe_index(new_base), new_base.ntotal, tuning)
+            if self.compression is not None:
+                new_base = _open_compressed(base_files, self.compression, len(merged_ids), mmap=self.mmap)
+            elif self.mmap:
+                new_base = _open_base(base_files, mmap=True)
+                _apply_recorded_params(new_base, base_files)
+            
+            merged_count = len(merging.delta_ids)
+            merged_segments = len(merging.segments)
+            
+            with self._write_lock:
+                current = self._snapshot
+                snapshot = IndexSnapshot(
+                    current.version + 1, new_base, merged_ids, base_files,
+                    current.delta_vectors[merged_count:], current.delta_ids[merged_count:],
+                    current.segments[merged_segments:]
+                )
+                self._write_manifest(snapshot)
+                self._snapshot = snapshot
+            
+            self._cleanup(merging, base_files)
+            self._refresh_legacy_files(base_files)
+            if self.snapshot_path:
+                self._write_packed(merged_vectors, merged_ids, base_files, snapshot.version, metadata_bytes)
+            if self.lexical is not None and self.lexical_path:
+                self.lexical.save(self.lexical_path)
+            self.merges += 1
+            logger.info(f"VectorStore v{snapshot.version}: merged {merged_count} delta vectors into base "
+                        f"({new_base.ntotal} vectors, {_layout(new_base)}) in {time.time() - start:.2f}s")
+            return True
+    
+    def vectors(self) -> np.ndarray:
+        """All indexed vectors (base then delta) of the current snapshot"""
+        snapshot = self._snapshot
+        return np.vstack([self._base_vectors(snapshot), snapshot.delta_vectors])
+    
+    def index_params(self) -> Optional[Dict[str, Any]]:
+        """index_params.json of the current base, if recorded"""
+        return read_index_params(Path(self._snapshot.base_files["index"]))
+    
+    def ensure_index_type(self, k: int = 10, target_recall: float = 0.95, num_queries: int = 200,
+                          max_p99_ms: Optional[float] = None, retune_growth: float = 2.0) -> Optional[Dict[str, Any]]:
+        """
+        Bring the base in line with index_spec: rebuild when its type or build
+        parameters differ, or only re-apply search parameters when those are
+        all that changed. "auto" tunes on the current vectors (when never tuned,
+        or the corpus grew `retune_growth`x since). Returns the recorded params
+        when something changed, else None.
+        """
+        spec = self.index_spec
+        if spec is None or self.compression is not None:
+            return None
+        snapshot = self._snapshot
+        current = describe_index(snapshot.base_index)
+        tuning = None
+        
+        if spec.kind == "auto":
+            recorded = (self.index_params() or {}).get("tuning")
+            if recorded and snapshot.size < recorded.get("vectors", 0) * retune_growth:
+                return None
+            result = tune(self.vectors(), k=k, target_recall=target_recall, num_queries=num_queries, max_p99_ms=max_p99_ms)
+            spec, tuning = result.chosen.spec, result.to_dict()
+            logger.info(f"Index tuning: {spec.label} (recall@{result.k} {result.chosen.recall:.3f}, "
+                        f"p99 {result.chosen.p99_ms:.2f} ms) out of {len(result.trials)} configurations")
+        
+        search_changed = ((spec.nprobe is not None and spec.nprobe != current.nprobe) or
+                          (spec.ef_search is not None and spec.ef_search != current.ef_search))
+        if not spec.same_structure(current):
+            self.rebuild(spec, tuning)
+        elif tuning is not None or search_changed:
+            apply_search_params(snapshot.base_index, spec)
+            write_index_params(Path(snapshot.base_files["index"]), describe_index(snapshot.base_index),
+                               snapshot.base_index.ntotal, tuning)
+            self._refresh_legacy_files(snapshot.base_files)
+        else:
+            return None
+        return self.index_params()
+    
+    def write_packed_snapshot(self, path: Optional[Path] = None) -> Dict[str, Any]:
+        """
+        Pack the current base (vectors, ids, chunk records) into a single
+        snapshot file; merge first so the delta is included. Returns its header.
+        """
+        if self.delta_size:
+            self.merge()
+        with self._write_lock:
+            current = self._snapshot
+            metadata_bytes = self._metadata_bytes()
+        return self._write_packed(self._base_vectors(current), current.base_ids, current.base_files,
+                                  current.version, metadata_bytes, path)
+    
+    def _write_packed(self, vectors: np.ndarray, ids: List[str], base_files: Dict[str, str],
+                      version: int, metadata_bytes: int, path: Optional[Path] = None) -> Dict[str, Any]:
+        import faiss
+        
+        path = Path(path or self.snapshot_path)
+        base_index = self._snapshot.base_index
+        index_bytes = None
+        if not isinstance(base_index, (MmapFlatIndex, CompressedIndex, faiss.IndexFlat)):
+            index_bytes = faiss.serialize_index(base_index)
+        records = [self.chunks.get(chunk_id) or {"id": chunk_id} for chunk_id in ids]
+        return write_packed_snapshot(path, vectors, ids, records, base_files=base_files,
+                                     metadata_bytes=metadata_bytes, index_version=version,
+                                     faiss_index_bytes=index_bytes)
+    
+    def _metadata_bytes(self) -> int:
+        """Size of metadata.jsonl; every chunk in the current snapshot has its record before this offset"""
+        if self.metadata_path is None or not self.metadata_path.exists():
+            return 0
+        return self.metadata_path.stat().st_size
+    
+    def _base_vectors(self, snapshot: IndexSnapshot) -> np.ndarray:
+        path = snapshot.base_files.get("embeddings")
+        if path and Path(path).exists():
+            vectors = np.load(path, mmap_mode="r")
+            if vectors.shape[0] == snapshot.base_index.ntotal:
+                return np.asarray(vectors, dtype=np.float32)
+        return snapshot.base_index.reconstruct_n(0, snapshot.base_index.ntotal)
+    
+    def _write_segment(self, version: int, vectors: np.ndarray, ids: List[str]) -> Dict[str, Any]:
+        segment_dir = self.manifest_path.parent / "delta"
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        path = segment_dir / f"segment_{version:08d}.npz"
+        
+        def write(tmp: Path):
+            with open(tmp, "wb") as f:
+                np.savez(f, vectors=vectors, ids=np.array(ids, dtype=str))
+        
+        _replace_file(path, write)
+        return {"path": str(path), "count": len(ids)}
+    
+    def _append_metadata(self, records: List[Dict[str, Any]]):
+        if self.metadata_path is None:
+            return
+        with open(self.metadata_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+    
+    def _write_manifest(self, snapshot: IndexSnapshot):
+        if self.manifest_path is None:
+            return
+        manifest = {
+            "version": snapshot.version,
+            "base": snapshot.base_files,
+            "segments": snapshot.segments,
+            "updated_at": time.time()
+        }
+        
+        def write(tmp: Path):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+        
+        _replace_file(self.manifest_path, write)
+    
+    def _cleanup(self, merged: IndexSnapshot, new_base_files: Dict[str, str]):
+        """Remove merged segments and the superseded base directory (never the legacy files)"""
+        for segment in merged.segments:
+            Path(segment["path"]).unlink(missing_ok=True)
+        
+        old_dir = Path(merged.base_files["index"]).parent
+        if old_dir.name.startswith("base_") and old_dir != Path(new_base_files["index"]).parent:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    
+    def _refresh_legacy_files(self, base_files: Dict[str, str]):
+        """Keep faiss.index / ids.npy / embeddings.npy current for loaders that read them directly"""
+        for name, legacy in self.legacy_paths.items():
+            if legacy.exists() or name != "embeddings":
+                if Path(base_files[name]) != legacy:
+                    _replace_file(legacy, lambda tmp, source=base_files[name]: shutil.copyfile(source, tmp))
+        params = params_path(Path(base_files["index"]))
+        legacy_params = params_path(self.legacy_paths["index"]) if "index" in self.legacy_paths else None
+        if legacy_params and params.exists() and params != legacy_params:
+            _replace_file(legacy_params, lambda tmp: shutil.copyfile(params, tmp))
+    
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "base_vectors": snapshot.base_index.ntotal,
+            "delta_vectors": len(snapshot.delta_ids),
+            "delta_segments": len(snapshot.segments),
+            "merges": self.merges,
+            "mmap": self.mmap,
+            "packed_snapshot": isinstance(self.chunks, PackedChunkStore),
+            "index": describe_index(snapshot.base_index).label,
+            "compression": snapshot.base_index.spec.label if isinstance(snapshot.base_index, CompressedIndex) else None,
+            "base_vector_bytes": getattr(snapshot.base_index, "memory_bytes", None),
+            "lexical": self.lexical.stats() if self.lexical is not None else None
+        }
@@ -510,6 +510,15 @@ def call_api(query: str, brand: str = None, model: str = None) -> Dict[str, Any]
         
         if response.status_code == 200:
             return response.json()
+        elif response.status_code == 503:
+            retry_after = response.headers.get("Retry-After", "a few")
+            return {
+                "answer": f"CompanionAI is busy right now. Please try again in {retry_after} seconds.",
+                "safety_flag": False,
+                "safety_level": "safe",
+                "sources": [],
+                "processing_time": 0
+            }
         else:
             return {
                 "answer": f"API Error: {response.status_code}",
@@ -0,0 +1,43 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+
+def unit_vectors(count: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store_files(tmp_path):
+    """A small on-disk flat index (faiss_index/, embeddings/, metadata/) -> VectorStore.load kwargs"""
+    import faiss
+    
+    ids = [f"samsung_washingmachine_WF45.pdf_{i}" for i in range(20)] + \
+          [f"lg_microwave_MS2595.pdf_{i}" for i in range(20)]
+    vectors = unit_vectors(len(ids))
+    (tmp_path / "faiss_index").mkdir()
+    (tmp_path / "embeddings").mkdir()
+    (tmp_path / "metadata").mkdir()
+    
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / "faiss_index" / "faiss.index"))
+    np.save(tmp_path / "embeddings" / "embeddings.npy", vectors)
+    np.save(tmp_path / "embeddings" / "ids.npy", np.array(ids, dtype=object))
+    with open(tmp_path / "metadata" / "metadata.jsonl", "w", encoding="utf-8") as f:
+        for chunk_id in ids:
+            f.write(json.dumps({"id": chunk_id, "text": f"text of {chunk_id}"}) + "\n")
+    
+    return {
+        "index_path": tmp_path / "faiss_index" / "faiss.index",
+        "ids_path": tmp_path / "embeddings" / "ids.npy",
+        "embeddings_path": tmp_path / "embeddings" / "embeddings.npy",
+        "metadata_path": tmp_path / "metadata" / "metadata.jsonl",
+        "manifest_path": tmp_path / "faiss_index" / "manifest.json"
+    }
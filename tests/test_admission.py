@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionController, Overloaded, StageLimiter
+
+
+def test_waiters_are_admitted_in_order_as_slots_free():
+    async def main():
+        limiter = StageLimiter("llm", max_concurrency=1, max_queue=2, max_queue_seconds=5)
+        order = []
+        
+        async def request(name, hold):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(hold)
+        
+        await asyncio.gather(request("a", 0.02), request("b", 0), request("c", 0))
+        return limiter, order
+    
+    limiter, order = asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert limiter.active == 0
+    assert limiter.stats()["admitted"] == 3
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def main():
+        limiter = StageLimiter("llm", max_concurrency=1, max_queue=1, max_queue_seconds=5)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+        limiter.release()
+        await queued
+        return limiter, rejected.value
+    
+    limiter, rejected = asyncio.run(main())
+    assert (rejected.stage, rejected.reason) == ("llm", "queue full")
+    assert 1 <= rejected.retry_after <= 60
+    assert limiter.rejected_queue_full == 1
+
+
+def test_queue_timeout_is_rejected_and_leaves_the_queue():
+    async def main():
+        limiter = StageLimiter("search", max_concurrency=1, max_queue=4, max_queue_seconds=0.01)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+        return limiter, rejected.value
+    
+    limiter, rejected = asyncio.run(main())
+    assert rejected.reason == "queue timeout"
+    assert limiter.queued == 0
+    assert limiter.active == 1
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        limiter = StageLimiter("llm", max_concurrency=1, max_queue=4, max_queue_seconds=5)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        return limiter
+    
+    limiter = asyncio.run(main())
+    assert (limiter.active, limiter.queued) == (0, 0)
+
+
+def test_controller_check_and_disabled_mode():
+    async def main():
+        controller = AdmissionController({"llm": {"max_concurrency": 1, "max_queue": 0, "max_queue_seconds": 1}})
+        async with controller.slot("llm"):
+            with pytest.raises(Overloaded):
+                controller.check("llm")
+        controller.check("llm")
+        
+        disabled = AdmissionController({"llm": {"max_concurrency": 1, "max_queue": 0, "max_queue_seconds": 1}},
+                                       enabled=False)
+        async with disabled.slot("llm"):
+            async with disabled.slot("llm") as waited:
+                assert waited == 0.0
+            disabled.check("llm")
+    
+    asyncio.run(main())
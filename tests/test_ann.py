@@ -0,0 +1,72 @@
+import faiss
+import numpy as np
+import pytest
+
+from conftest import unit_vectors
+from core.retrieval.ann import (IndexSpec, build_index, default_nlist, describe_index, measure_search, sample_queries,
+                                tune)
+
+K = 10
+
+
+def exact_kth_scores(vectors, queries, k=K):
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    truth, _ = exact.search(queries, k)
+    return truth[:, -1]
+
+
+def test_spec_parsing_and_labels():
+    spec = IndexSpec.parse("IVF-Flat:nlist=64, nprobe=8")
+    assert (spec.kind, spec.nlist, spec.nprobe) == ("ivf_flat", 64, 8)
+    assert spec.label == "ivf_flat:nlist=64,nprobe=8"
+    assert spec.factory_string() == "IVF64,Flat"
+    assert IndexSpec.from_dict(spec.to_dict()) == spec
+    
+    with pytest.raises(ValueError):
+        IndexSpec.parse("annoy")
+    with pytest.raises(ValueError):
+        IndexSpec.parse("hnsw:efsearch=64")
+
+
+def test_resolved_fills_corpus_dependent_parameters():
+    spec = IndexSpec("ivf_pq").resolved(20000, 384)
+    assert spec.nlist == default_nlist(20000)
+    assert spec.pq_m == 48 and 384 % spec.pq_m == 0
+    assert IndexSpec("hnsw").resolved(100, 16).hnsw_m == 32
+    # Too few points per centroid shrinks nlist rather than training on nothing
+    assert default_nlist(200) == 4
+
+
+def test_ivf_with_every_list_probed_is_exact():
+    vectors = unit_vectors(2000, dim=32)
+    queries = sample_queries(vectors, 50, noise=0.3, seed=1)
+    index = build_index(vectors, IndexSpec("ivf_flat", nlist=16, nprobe=16))
+    assert describe_index(index).nprobe == 16
+    
+    recall, _, _ = measure_search(index, vectors, queries, exact_kth_scores(vectors, queries), K, repeats=1)
+    assert recall == 1.0
+
+
+def test_hnsw_recall_against_exact_search():
+    vectors = unit_vectors(2000, dim=32)
+    queries = sample_queries(vectors, 50, noise=0.3, seed=1)
+    index = build_index(vectors, IndexSpec("hnsw", hnsw_m=16, ef_construction=100, ef_search=128))
+    
+    recall, _, _ = measure_search(index, vectors, queries, exact_kth_scores(vectors, queries), K, repeats=1)
+    assert recall >= 0.9
+
+
+def test_tie_scores_are_not_counted_as_misses():
+    vectors = np.vstack([unit_vectors(50, dim=16)] * 2)  # every chunk indexed twice
+    queries = sample_queries(vectors, 20, noise=0.0, seed=0)
+    index = build_index(vectors, IndexSpec("flat"))
+    recall, _, _ = measure_search(index, vectors, queries, exact_kth_scores(vectors, queries, k=1), 1, repeats=1)
+    assert recall == 1.0
+
+
+def test_tune_meets_the_recall_target():
+    vectors = unit_vectors(2000, dim=32)
+    result = tune(vectors, k=K, target_recall=0.9, num_queries=50, kinds=("flat", "ivf_flat"))
+    assert result.chosen.recall >= 0.9
+    assert any(trial.spec.kind == "flat" and trial.recall == 1.0 for trial in result.trials)
@@ -0,0 +1,99 @@
+import json
+
+from conftest import unit_vectors
+from backend.answer_cache import AnswerCache
+
+SCOPE = AnswerCache.make_scope("Samsung", None, 5)
+
+
+def filled_cache(**params):
+    cache = AnswerCache(**params)
+    for i, vector in enumerate(unit_vectors(3)):
+        cache.put(vector, SCOPE, {"answer": f"answer {i}"})
+    return cache
+
+
+def test_similar_query_in_the_same_scope_hits():
+    cache = filled_cache()
+    assert cache.get(unit_vectors(3)[0], SCOPE)[0] == {"answer": "answer 0"}
+    assert cache.get(unit_vectors(3)[0], AnswerCache.make_scope("LG", None, 5)) is None
+    assert cache.get(unit_vectors(1, seed=9)[0], SCOPE) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_scope_normalizes_brand_and_model():
+    assert AnswerCache.make_scope(" Samsung", "WF45 ", 5, "Washer") == ("samsung", "wf45", 5, "washer")
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = filled_cache(max_entries=3)
+    vectors = unit_vectors(4)
+    cache.get(vectors[0], SCOPE)
+    cache.put(vectors[3], SCOPE, {"answer": "answer 3"})
+    assert cache.get(vectors[1], SCOPE) is None
+    assert cache.get(vectors[0], SCOPE)[0] == {"answer": "answer 0"}
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.answer_cache.time.time", lambda: now[0])
+    cache = filled_cache(ttl_seconds=60)
+    now[0] += 59
+    assert cache.get(unit_vectors(3)[0], SCOPE) is not None
+    now[0] += 2
+    assert cache.get(unit_vectors(3)[0], SCOPE) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_drops_everything():
+    cache = filled_cache()
+    cache.invalidate()
+    assert cache.get(unit_vectors(3)[0], SCOPE) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_saved_entries_are_served_after_a_restart(tmp_path):
+    path = tmp_path / "answer_cache.json"
+    assert filled_cache().save(path, tag="index-1") == 3
+    
+    restarted = AnswerCache()
+    assert restarted.load(path, tag="index-1") == 3
+    response, similarity = restarted.get(unit_vectors(3)[1], SCOPE)
+    assert response == {"answer": "answer 1"}
+    assert similarity > 0.99
+
+
+def test_entries_for_another_index_or_expired_are_not_loaded(tmp_path):
+    path = tmp_path / "answer_cache.json"
+    filled_cache().save(path, tag="index-1")
+    assert AnswerCache().load(path, tag="index-2") == 0
+    
+    data = json.loads(path.read_text())
+    data["entries"][0]["created_at"] -= 7200
+    path.write_text(json.dumps(data))
+    cache = AnswerCache(ttl_seconds=3600)
+    assert cache.load(path, tag="index-1") == 2
+    assert cache.get(unit_vectors(3)[0], SCOPE) is None
+
+
+def test_load_keeps_the_most_recent_entries_within_max_entries(tmp_path):
+    path = tmp_path / "answer_cache.json"
+    filled_cache().save(path)
+    cache = AnswerCache(max_entries=2)
+    cache.load(path)
+    assert cache.stats()["size"] == 2
+    assert cache.get(unit_vectors(3)[0], SCOPE) is None
+    assert cache.get(unit_vectors(3)[2], SCOPE)[0] == {"answer": "answer 2"}
+
+
+def test_appliance_type_scopes_cached_answers():
+    cache = AnswerCache()
+    vector = unit_vectors(1)[0]
+    washer = AnswerCache.make_scope("Samsung", None, 5, "washingmachine")
+    cache.put(vector, washer, {"answer": "washer answer"})
+    
+    assert cache.get(vector, AnswerCache.make_scope("samsung", None, 5, " WashingMachine"))[0] == \
+        {"answer": "washer answer"}
+    assert cache.get(vector, AnswerCache.make_scope("Samsung", None, 5, "microwave")) is None
+    assert cache.get(vector, AnswerCache.make_scope("Samsung", None, 5)) is None
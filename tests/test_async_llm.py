@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from core.models.async_llm import (AsyncLLMClient, CircuitBreaker, LLMBackendError, OllamaBackend,
+                                   OpenAICompatibleBackend)
+
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+from llm_stub_server import ANSWER, make_app  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "My washer shows 5C"}]
+
+
+@contextlib.asynccontextmanager
+async def stub_server(token_delay=0.0, first_token_delay=0.0, fail_rate=0.0):
+    server = TestServer(make_app(token_delay, first_token_delay, fail_rate))
+    await server.start_server()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+def backend_for(server, name, **options):
+    return OllamaBackend("stub", str(server.make_url("")), name=name, **options)
+
+
+def test_ollama_and_openai_streams_are_parsed():
+    async def main():
+        async with stub_server() as server:
+            client = AsyncLLMClient([backend_for(server, "ollama"),
+                                     OpenAICompatibleBackend("stub", str(server.make_url("/v1")), name="nim")],
+                                    hedge=False)
+            try:
+                return await client.generate(MESSAGES), await client.generate(MESSAGES, backend="nim")
+            finally:
+                await client.close()
+    
+    assert asyncio.run(main()) == (ANSWER, ANSWER)
+
+
+def test_concurrency_limit_caps_requests_to_a_backend():
+    async def main():
+        async with stub_server(token_delay=0.005, first_token_delay=0.05) as server:
+            backend = backend_for(server, "stub", max_concurrency=2)
+            client = AsyncLLMClient([backend], hedge=False)
+            try:
+                answers = await asyncio.gather(*(client.generate(MESSAGES) for _ in range(6)))
+            finally:
+                await client.close()
+            return answers, server.app["state"].max_active, backend
+    
+    answers, max_active, backend = asyncio.run(main())
+    assert answers == [ANSWER] * 6
+    assert max_active == 2
+    assert (backend.requests, backend.active) == (6, 0)
+
+
+def test_pooled_connections_are_reused():
+    async def main():
+        async with stub_server() as server:
+            client = AsyncLLMClient([backend_for(server, "stub")], hedge=False, pool_size=4)
+            try:
+                for _ in range(5):
+                    await client.generate(MESSAGES)
+                connector = client._get_session().connector
+                return sum(len(connections) for connections in connector._conns.values())
+            finally:
+                await client.close()
+    
+    # Every request read to EOF, so its connection went back to the pool
+    assert asyncio.run(main()) == 1
+
+
+def test_read_timeout_surfaces_as_an_error():
+    async def main():
+        async with stub_server(first_token_delay=5.0) as server:
+            backend = backend_for(server, "stub", read_timeout=0.1)
+            client = AsyncLLMClient([backend], hedge=False)
+            start = time.monotonic()
+            try:
+                with pytest.raises(LLMBackendError, match="TimeoutError"):
+                    await client.generate(MESSAGES)
+            finally:
+                await client.close()
+            return time.monotonic() - start, backend
+    
+    elapsed, backend = asyncio.run(main())
+    assert elapsed < 2.0
+    assert (backend.errors, backend.active) == (1, 0)
+
+
+def test_cancelling_the_consumer_closes_the_upstream_response():
+    async def main():
+        async with stub_server(token_delay=0.05) as server:
+            backend = backend_for(server, "stub")
+            client = AsyncLLMClient([backend], hedge=False)
+            first = asyncio.Event()
+            
+            async def consume():
+                async for _ in client.stream(MESSAGES):
+                    first.set()
+            
+            task = asyncio.create_task(consume())
+            await first.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            state = server.app["state"]
+            for _ in range(100):
+                if state.cancelled:
+                    break
+                await asyncio.sleep(0.01)
+            await client.close()
+            return state.cancelled, backend
+    
+    cancelled, backend = asyncio.run(main())
+    assert cancelled == 1
+    assert (backend.cancelled, backend.active, backend.errors) == (1, 0, 0)
+    assert backend.breaker.state == "closed"
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    async def main():
+        async with stub_server(first_token_delay=2.0) as slow, stub_server() as fast:
+            primary, secondary = backend_for(slow, "slow"), backend_for(fast, "fast")
+            client = AsyncLLMClient([primary, secondary], hedge_delay_seconds=0.1)
+            start = time.monotonic()
+            try:
+                answer = await client.generate(MESSAGES)
+            finally:
+                await client.close()
+            return answer, time.monotonic() - start, client.counters(), primary
+    
+    answer, elapsed, counters, primary = asyncio.run(main())
+    assert answer == ANSWER
+    assert elapsed < 1.0
+    assert counters == {"hedged": 1, "hedge_wins": 1, "failovers": 0}
+    # The losing request was cancelled, which says nothing about the backend's health
+    assert (primary.cancelled, primary.errors, primary.breaker.state) == (1, 0, "closed")
+
+
+def test_primary_error_fails_over():
+    async def main():
+        async with stub_server(fail_rate=1.0) as failing, stub_server() as healthy:
+            primary, secondary = backend_for(failing, "failing"), backend_for(healthy, "healthy")
+            client = AsyncLLMClient([primary, secondary], hedge=False)
+            try:
+                answer = await client.generate(MESSAGES)
+            finally:
+                await client.close()
+            return answer, client.counters(), primary, secondary
+    
+    answer, counters, primary, secondary = asyncio.run(main())
+    assert answer == ANSWER
+    assert counters["failovers"] == 1
+    assert (primary.errors, secondary.requests) == (1, 1)
+
+
+def test_breaker_opens_after_failures_and_recovers_half_open():
+    async def main():
+        async with stub_server(fail_rate=1.0) as flaky, stub_server() as healthy:
+            primary = backend_for(flaky, "flaky", breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0.2))
+            client = AsyncLLMClient([primary, backend_for(healthy, "healthy")], hedge=False)
+            state = flaky.app["state"]
+            states = []
+            try:
+                for _ in range(3):
+                    assert await client.generate(MESSAGES) == ANSWER
+                    states.append(primary.breaker.state)
+                skipped_requests = state.requests
+                
+                await asyncio.sleep(0.25)
+                states.append(primary.breaker.state)
+                state.fail_rate = 0.0
+                assert await client.generate(MESSAGES) == ANSWER
+                states.append(primary.breaker.state)
+            finally:
+                await client.close()
+            return states, skipped_requests, state.requests, primary
+    
+    states, skipped_requests, requests, primary = asyncio.run(main())
+    assert states == ["closed", "open", "open", "half_open", "closed"]
+    # While open the primary got no traffic; the half-open trial went to it and closed the breaker
+    assert skipped_requests == 2
+    assert requests == 3
+    assert primary.breaker.trips == 1
+
+
+def test_saturated_backend_skipped_by_a_hedge_is_still_a_failover_target():
+    async def main():
+        async with stub_server(first_token_delay=0.5) as stalled, stub_server(first_token_delay=0.3) as busy:
+            primary = backend_for(stalled, "stalled", read_timeout=0.3)
+            secondary = backend_for(busy, "busy", max_concurrency=1)
+            client = AsyncLLMClient([primary, secondary], hedge_delay_seconds=0.05)
+            other = AsyncLLMClient([secondary], hedge=False)
+            try:
+                # Occupy the secondary's only slot so the hedge has nowhere to go
+                holder = asyncio.create_task(other.generate(MESSAGES))
+                await asyncio.sleep(0.02)
+                answer = await client.generate(MESSAGES)
+                await holder
+            finally:
+                await client.close()
+                await other.close()
+            return answer, client.counters(), secondary
+    
+    answer, counters, secondary = asyncio.run(main())
+    assert answer == ANSWER
+    assert counters["hedged"] == 0
+    assert counters["failovers"] == 1
+    assert secondary.requests == 2
+
+
+def test_hedge_delay_follows_the_backend_in_flight():
+    async def main():
+        async with stub_server(fail_rate=1.0) as failing, stub_server(first_token_delay=2.0) as slow, \
+                stub_server() as fast:
+            failed = backend_for(failing, "failing")
+            failover = backend_for(slow, "slow")
+            hedge = backend_for(fast, "fast")
+            # The failed backend's stats would hold the hedge back for 5s; the one in flight says 0.1s
+            failed.first_token_latencies.extend([5.0] * 20)
+            failover.first_token_latencies.extend([0.1] * 20)
+            client = AsyncLLMClient([failed, failover, hedge], hedge_min_delay_seconds=0.05)
+            start = time.monotonic()
+            try:
+                answer = await client.generate(MESSAGES)
+            finally:
+                await client.close()
+            return answer, time.monotonic() - start, client.counters()
+    
+    answer, elapsed, counters = asyncio.run(main())
+    assert answer == ANSWER
+    assert elapsed < 1.5
+    assert counters == {"hedged": 1, "hedge_wins": 1, "failovers": 1}
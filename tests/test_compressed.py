@@ -0,0 +1,84 @@
+import faiss
+import numpy as np
+import pytest
+
+from conftest import unit_vectors
+from core.retrieval.ann import measure_search, sample_queries
+from core.retrieval.compressed import CompressedIndex, CompressionSpec
+
+K = 10
+
+
+def exact_search(vectors, queries, k=K):
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    return exact.search(queries, k)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    vectors = unit_vectors(2000, dim=64)
+    queries = sample_queries(vectors, 50, noise=0.3, seed=1)
+    truth, _ = exact_search(vectors, queries)
+    return vectors, queries, truth[:, -1]
+
+
+def test_spec_parsing():
+    spec = CompressionSpec.parse("int8:dims=32,reduction=pca")
+    assert (spec.storage, spec.dims, spec.reduction) == ("int8", 32, "pca")
+    assert spec.bytes_per_vector(64) == 32
+    assert CompressionSpec.parse("binary").shortlist_size(10) == 200
+    assert CompressionSpec.from_dict(spec.to_dict()) == spec
+    
+    with pytest.raises(ValueError):
+        CompressionSpec.parse("int4")
+    with pytest.raises(ValueError):
+        CompressionSpec.parse("binary:dims=12")
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_scalar_storage_keeps_recall(corpus, storage):
+    vectors, queries, kth_scores = corpus
+    index = CompressedIndex.build(vectors, CompressionSpec(storage))
+    assert index.memory_bytes <= vectors.nbytes // 2
+    
+    recall, _, _ = measure_search(index, vectors, queries, kth_scores, K, repeats=1)
+    assert recall >= 0.97
+
+
+def test_binary_shortlist_is_rescored_exactly(corpus):
+    vectors, queries, kth_scores = corpus
+    index = CompressedIndex.build(vectors, CompressionSpec("binary", shortlist=400))
+    assert index.codes.code_size == 64 // 8
+    
+    scores, rows = index.search(queries, K)
+    np.testing.assert_allclose(scores, np.einsum("nkd,nd->nk", vectors[rows], queries), atol=1e-5)
+    assert (np.diff(scores, axis=1) <= 1e-6).all()
+    recall, _, _ = measure_search(index, vectors, queries, kth_scores, K, repeats=1)
+    assert recall >= 0.9
+
+
+def test_binary_needs_full_vectors(corpus):
+    vectors, _, _ = corpus
+    index = CompressedIndex.build(vectors, CompressionSpec("binary"))
+    with pytest.raises(ValueError):
+        CompressedIndex(index.spec, index.d, index.codes, center=index.center)
+
+
+def test_short_corpus_is_padded(corpus):
+    vectors, queries, _ = corpus
+    index = CompressedIndex.build(vectors[:5], CompressionSpec("binary"))
+    scores, rows = index.search(queries[:2], K)
+    assert (rows[:, 5:] == -1).all() and np.isneginf(scores[:, 5:]).all()
+
+
+def test_save_load_round_trip(tmp_path, corpus):
+    vectors, queries, _ = corpus
+    index = CompressedIndex.build(vectors, CompressionSpec("int8", dims=32, reduction="pca"))
+    index.save(tmp_path / "compressed.npz")
+    
+    loaded = CompressedIndex.load(tmp_path / "compressed.npz")
+    assert loaded.spec == index.spec
+    np.testing.assert_array_equal(loaded.search(queries, K)[1], index.search(queries, K)[1])
+    # Full vectors of the wrong shape (a stale file) are not used for rescoring
+    assert CompressedIndex.load(tmp_path / "compressed.npz", full=vectors[:10]).full is None
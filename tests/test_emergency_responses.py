@@ -0,0 +1,38 @@
+import pytest
+
+from backend.emergency_responses import RESPONSES, classify_hazard, emergency_response
+
+
+@pytest.mark.parametrize("query, hazard", [
+    ("I smell gas near the stove", "gas"),
+    ("there is a gas smell in the kitchen", "gas"),
+    ("possible gas leak behind the range", "gas"),
+    ("the cooktop is hissing and smells like rotten eggs", "gas"),
+    ("my gas dryer is smoking", "fire"),
+    ("flames coming out of the gas oven", "fire"),
+    ("sparks from gas range igniter", "electrical"),
+    ("the outlet is arcing", "electrical"),
+    ("our CO alarm went off", "carbon_monoxide"),
+    ("water on the floor and smoke from the outlet", "fire"),
+    ("the basement flooded around the washer", "water_electrical"),
+])
+def test_classify_hazard(query, hazard):
+    assert classify_hazard(query) == hazard
+
+
+@pytest.mark.parametrize("query", [
+    "the fireplace insert door is stuck",
+    "an arch of rust under the door",
+    "how do I connect my gas dryer",
+    "the gas range igniter clicks constantly",
+    "stovetop shocking pink finish is chipped",
+])
+def test_words_that_only_contain_a_keyword_are_general(query):
+    assert classify_hazard(query) == "general"
+
+
+def test_emergency_response_only_for_flagged_levels():
+    assert emergency_response("I smell gas", "safe") is None
+    response = emergency_response("I smell gas", "emergency")
+    assert response == {"hazard": "gas", "answer": RESPONSES["emergency"]["gas"]}
+    assert response["answer"].startswith("EMERGENCY: Possible gas leak")
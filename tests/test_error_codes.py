@@ -0,0 +1,106 @@
+import json
+import sys
+from pathlib import Path
+
+from backend.error_codes import ErrorCodeIndex, ErrorCodeInfo, ErrorCodeTable, code_variants
+from core.retrieval.filters import appliance_in_text
+
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+from import_error_codes import read_csv  # noqa: E402
+
+SAMSUNG_DRAIN = ErrorCodeInfo(code="5C", brand="Samsung", appliance_type="washing_machine",
+                              description="Drain error", aliases=("SE", "5E"))
+SAMSUNG_WATER = ErrorCodeInfo(code="4C", brand="Samsung", appliance_type="washing_machine",
+                              description="Water supply error")
+
+
+def make_table(*entries):
+    return ErrorCodeTable(entries or (SAMSUNG_DRAIN, SAMSUNG_WATER))
+
+
+def test_appliance_in_text_uses_catalogue_vocabulary():
+    assert appliance_in_text("My Samsung washers are loud") == "washingmachine"
+    assert appliance_in_text("microwave oven shows E3") == "microwave"
+    assert appliance_in_text("the fridge beeps") == "refrigerator"
+    assert appliance_in_text("SE on the display") is None
+
+
+def test_named_appliance_with_no_entries_is_not_answered():
+    table = make_table()
+    assert table.recognize("My Samsung microwave shows SE error") is None
+    assert table.recognize("Samsung dryer shows 5C") is None
+    assert table.recognize("error SE", brand="Samsung", appliance_type="microwaves") is None
+
+
+def test_named_appliance_with_entries_is_answered():
+    match = make_table().recognize("My Samsung washer shows SE error")
+    assert match.info is SAMSUNG_DRAIN
+    assert match.exact
+    
+    match = make_table().recognize("Samsung 5c code")
+    assert match.info is SAMSUNG_DRAIN
+
+
+def test_variant_naming_a_single_entry_is_answerable():
+    assert code_variants("3E")[:2] == ["3E", "E3"]
+    match = make_table().recognize("Samsung washer C4")
+    assert match.info is SAMSUNG_WATER
+    assert not match.exact
+    assert match.unambiguous and match.answerable
+
+
+def test_variant_naming_two_entries_is_only_a_hint():
+    swapped = ErrorCodeInfo(code="E5", brand="LG", appliance_type="washing_machine", description="Heater error")
+    misread = ErrorCodeInfo(code="SE", brand="LG", appliance_type="washing_machine", description="Motor error")
+    # "5E" reads as E5 (swapped) or SE (5 misread as S)
+    match = make_table(swapped, misread).recognize("LG washer 5E")
+    assert match.info is swapped
+    assert not match.answerable
+    # The exact code is answered even though its variants name other entries
+    assert make_table(swapped, misread).recognize("LG washer SE").answerable
+
+
+def test_lowercase_words_need_code_context():
+    table = make_table()
+    assert table.recognize("Samsung washer: se the manual") is None
+    assert table.recognize("Samsung washer shows se").info is SAMSUNG_DRAIN
+
+
+def test_rows_without_a_source_are_not_loaded(tmp_path):
+    path = tmp_path / "error_codes.json"
+    path.write_text(json.dumps({"error_codes": [
+        {**SAMSUNG_DRAIN.to_dict(), "aliases": ["SE"], "source": "samsung_washingmachine_WF45.pdf, p. 40"},
+        SAMSUNG_WATER.to_dict()
+    ]}))
+    table = ErrorCodeTable.load(path)
+    assert table.size == 1
+    assert table.recognize("Samsung washer SE").info.source == "samsung_washingmachine_WF45.pdf, p. 40"
+    assert table.recognize("Samsung washer 4C") is None
+
+
+def test_index_counts_answers_and_hints_apart(tmp_path):
+    path = tmp_path / "error_codes.json"
+    path.write_text(json.dumps([
+        {"code": code, "brand": "LG", "appliance_type": "washing_machine", "description": "x", "source": "manual p. 1"}
+        for code in ("E5", "SE")
+    ]))
+    index = ErrorCodeIndex(path)
+    index.reload()
+    
+    assert index.recognize("LG washer E5").exact
+    assert index.recognize("LG washer 5-E").answerable is False
+    variant = index.recognize("LG washer 5E")
+    assert "5E" in variant.info.hint(variant.written)
+    assert (index.hits, index.hints) == (1, 2)
+
+
+def test_import_rejects_rows_without_a_source(tmp_path):
+    path = tmp_path / "codes.csv"
+    path.write_text("code,aliases,brand,appliance_type,description,troubleshooting_steps,source\n"
+                    "4C,4E|4c,Samsung,washing_machine,Water supply error,Open the taps|Check the hose,"
+                    "\"WF45.pdf, p. 40\"\n"
+                    "5C,,Samsung,washing_machine,Drain error,,\n")
+    rows, rejected = read_csv(path)
+    assert [(info.code, info.aliases, info.troubleshooting_steps) for info in rows] == \
+        [("4C", ("4E", "4c"), ("Open the taps", "Check the hose"))]
+    assert rejected == [(3, "no source")]
@@ -0,0 +1,106 @@
+import numpy as np
+
+from conftest import unit_vectors
+from core.retrieval import VectorStore
+from core.retrieval.ann import IndexSpec
+from core.retrieval.filters import FacetIndex, SearchFilter, appliance_in_text
+
+IDS = ["samsung_washingmachine_WF45.pdf_0", "lg_microwave_MS2595.pdf_0", "samsung_washingmachine_WF42H.pdf_0",
+       "samsung_microwave_ME16.pdf_0", "samsung_washingmachine_WF45.pdf_1", "scan_0042.pdf_0"]
+
+
+def test_posting_lists_per_facet():
+    records = {"scan_0042.pdf_0": {"brand": "Bosch", "appliance_type": "Oven", "model": "HBL8453UC"}}
+    facets = FacetIndex.build(IDS, records.get)
+    
+    assert facets.postings["brand"]["samsung"].tolist() == [0, 2, 3, 4]
+    assert facets.postings["appliance_type"]["washingmachine"].tolist() == [0, 2, 4]
+    assert facets.values("model") == ["hbl8453uc", "me16", "ms2595", "wf42h", "wf45"]
+    # Manuals not named <brand>_<type>_<model> take their facets from the chunk record
+    assert facets.rows(SearchFilter(brand="BOSCH")).tolist() == [5]
+    # Aliases, plurals, punctuation and model families
+    assert facets.rows(SearchFilter(appliance_type="Washers")).tolist() == [0, 2, 4]
+    assert facets.rows(SearchFilter(model="WF-45")).tolist() == [0, 4]
+    assert facets.rows(SearchFilter(model="wf4")).tolist() == [0, 2, 4]
+    assert facets.rows(SearchFilter()) is None
+    assert appliance_in_text("My Samsung washer won't drain") == "washingmachine"
+
+
+def test_combined_filters_intersect_and_can_be_empty():
+    facets = FacetIndex.build(IDS)
+    
+    assert facets.rows(SearchFilter(brand="samsung", appliance_type="microwave")).tolist() == [3]
+    assert facets.rows(SearchFilter(brand="samsung", appliance_type="washer", model="wf42")).tolist() == [2]
+    assert facets.rows(SearchFilter(brand="lg", appliance_type="washingmachine")).tolist() == []
+    assert facets.rows(SearchFilter(brand="whirlpool")).tolist() == []
+    assert [relaxed.to_dict() for relaxed in SearchFilter("lg", "wm3900", "washer").relaxations()] == [
+        {"brand": "lg", "model": "wm3900", "appliance_type": "washer"},
+        {"brand": "lg", "appliance_type": "washer"},
+        {"appliance_type": "washer"},
+        {"brand": "lg"},
+        {}
+    ]
+
+
+def brute_force(store, query, allowed, k):
+    """Exact top-k ids among the chunks `allowed` accepts"""
+    ids = [chunk_id for chunk_id in store.ids if allowed(chunk_id)]
+    vectors = store.vectors()[[store.ids.index(chunk_id) for chunk_id in ids]]
+    order = np.argsort(-(vectors @ query))[:k]
+    return [ids[row] for row in order]
+
+
+def test_dense_search_scores_only_matching_rows_in_base_and_delta(store_files):
+    for mmap in (False, True):
+        store = VectorStore.load(**store_files, mmap=mmap)
+        store.add(unit_vectors(4, seed=7), [
+            {"id": "lg_microwave_MS2595.pdf_20", "text": "delta lg"},
+            {"id": "lg_microwave_MS2595.pdf_21", "text": "delta lg"},
+            {"id": "samsung_washingmachine_WF45.pdf_20", "text": "delta samsung"},
+            {"id": "samsung_microwave_ME16.pdf_0", "text": "delta samsung microwave"}
+        ])
+        queries = unit_vectors(3, seed=11)
+        
+        scores, ids, applied = store.search_filtered_rows(queries, 5, SearchFilter(brand="LG"))
+        assert applied == SearchFilter(brand="LG")
+        for query, query_ids, query_scores in zip(queries, ids, scores):
+            assert list(query_ids) == brute_force(store, query, lambda chunk_id: chunk_id.startswith("lg_"), 5)
+            assert list(query_scores) == sorted(query_scores, reverse=True)
+        
+        # Combined facets narrow to the one delta chunk that matches both
+        search_filter = SearchFilter(brand="samsung", appliance_type="microwave")
+        _, ids, applied = store.search_filtered_rows(queries, 5, search_filter, min_candidates=1)
+        assert applied == search_filter
+        assert [list(query_ids) for query_ids in ids] == [["samsung_microwave_ME16.pdf_0", None, None, None, None]] * 3
+
+
+def test_filter_without_matches_is_relaxed_or_returns_nothing(store_files):
+    store = VectorStore.load(**store_files)
+    queries = unit_vectors(2, seed=11)
+    
+    rows = store.snapshot.candidate_rows(SearchFilter(brand="whirlpool"), store.chunks.get)
+    assert [len(part) for part in rows] == [0, 0]
+    scores, ids = store.snapshot.search(queries, 3, rows=rows)
+    assert (ids == None).all() and np.isneginf(scores).all()  # noqa: E711 - elementwise on object array
+    
+    # Through the store the filter is relaxed until something matches
+    _, ids, applied = store.search_filtered_rows(queries, 3, SearchFilter(brand="whirlpool"))
+    assert applied.empty and None not in ids
+    _, ids, applied = store.search_filtered_rows(queries, 3, SearchFilter(brand="lg", model="WM3900"))
+    assert applied == SearchFilter(brand="lg")
+    assert all(chunk_id.startswith("lg_") for chunk_id in ids.ravel())
+
+
+def test_prefiltered_search_over_an_ann_base(store_files):
+    store = VectorStore.load(**store_files)
+    # IVF lists have no direct map: the filter goes to FAISS as an id selector
+    assert store.rebuild(IndexSpec.parse("ivf_flat:nlist=2,nprobe=2"))
+    assert store.stats()["index"].startswith("ivf_flat")
+    queries = unit_vectors(3, seed=11)
+    
+    for search_filter, prefix in ((SearchFilter(brand="samsung"), "samsung_"),
+                                  (SearchFilter(brand="LG", model="ms2595", appliance_type="microwave oven"), "lg_")):
+        scores, ids, applied = store.search_filtered_rows(queries, 5, search_filter)
+        assert applied == search_filter
+        for query, query_ids in zip(queries, ids):
+            assert list(query_ids) == brute_force(store, query, lambda chunk_id: chunk_id.startswith(prefix), 5)
@@ -0,0 +1,52 @@
+from core.retrieval.filters import SearchFilter
+from core.retrieval.hybrid import is_decisive, lexical_relevance, reciprocal_rank_fusion
+from core.retrieval.lexical import LexicalIndex, tokenize
+
+DOCS = [
+    ("samsung_washingmachine_WF45.pdf_0", "Error code E3 means the washer cannot drain. Clean the drain filter."),
+    ("samsung_washingmachine_WF45.pdf_1", "To drain the washer, open the lower panel and pull the drain hose."),
+    ("samsung_washingmachine_WF45.pdf_2", "Load laundry evenly so the drum stays balanced during spin."),
+    ("lg_microwave_MS2595.pdf_0", "Press Start to heat food. Do not run the microwave empty."),
+    ("lg_microwave_MS2595.pdf_1", "Clean the microwave interior with a damp cloth after use.")
+]
+
+
+def test_tokenize_joins_hyphenated_codes_and_drops_stop_words():
+    assert tokenize("What does E-3 mean on my WF45?") == ["e3", "mean", "wf45"]
+
+
+def test_bm25_ranks_exact_token_first_with_full_coverage():
+    index = LexicalIndex.build(DOCS)
+    hits = index.search("E3 drain", 3)
+    assert hits[0][0] == "samsung_washingmachine_WF45.pdf_0"
+    assert hits[0][2] == 1.0
+    assert hits[1][2] == 0.5
+    assert index.search("nothing matches", 3) == []
+
+
+def test_bm25_delta_and_filter():
+    index = LexicalIndex.build(DOCS)
+    index.add(["lg_microwave_MS2595.pdf_2"], ["Error SE on the microwave display"])
+    assert index.search("SE display", 1)[0][0] == "lg_microwave_MS2595.pdf_2"
+    
+    hits = index.search("clean", 5, SearchFilter(brand="lg"))
+    assert [chunk_id for chunk_id, _, _ in hits] == ["lg_microwave_MS2595.pdf_1"]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], 3, rrf_k=60)
+    assert [chunk_id for chunk_id, _ in fused] == ["b", "a", "d"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+def test_is_decisive_needs_coverage_score_and_margin():
+    assert is_decisive([("a", 10.0, 1.0), ("b", 4.0, 0.5)], min_score=8.0, margin=1.5)
+    assert is_decisive([("a", 10.0, 1.0)], min_score=8.0, margin=1.5)
+    assert not is_decisive([], min_score=8.0, margin=1.5)
+    assert not is_decisive([("a", 10.0, 0.5)], min_score=8.0, margin=1.5)
+    assert not is_decisive([("a", 6.0, 1.0)], min_score=8.0, margin=1.5)
+    assert not is_decisive([("a", 10.0, 1.0), ("b", 9.0, 0.5)], min_score=8.0, margin=1.5)
+
+
+def test_lexical_relevance_is_bounded():
+    assert 0.0 < lexical_relevance(1.0) < lexical_relevance(20.0) < 1.0
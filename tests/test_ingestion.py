@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from conftest import unit_vectors
+from backend.ingestion_jobs import CHUNKS_FILE, IngestionQueue, load_job, save_job
+from core.retrieval import VectorStore
+from core.retrieval.chunking import chunk_page, manual_metadata
+from core.retrieval.filters import FacetIndex, SearchFilter
+
+FILENAME = "samsung_washingmachine_WF45.pdf"
+
+
+def test_chunk_ids_are_namespaced_by_content_hash():
+    first = chunk_page("old text " * 10, 1, 0, FILENAME, namespace="a" * 64)
+    second = chunk_page("new text " * 10, 1, 0, FILENAME, namespace="b" * 64)
+    assert first[0]["id"] == f"samsung_washingmachine_WF45@{'a' * 12}_0"
+    assert first[0]["id"] != second[0]["id"]
+    assert chunk_page("text", 1, 0, FILENAME)[0]["id"] == "samsung_washingmachine_WF45_0"
+
+
+def test_namespaced_manual_names_keep_their_facets():
+    metadata = manual_metadata(f"samsung_washingmachine_WF45.pdf@{'a' * 12}")
+    assert metadata == {"filename": FILENAME, "brand": "Samsung", "appliance_type": "washingmachine", "model": "WF45"}
+    
+    facets = FacetIndex.build([f"samsung_washingmachine_WF45.pdf@{'a' * 12}_0", "lg_microwave_MS2595.pdf_0"])
+    assert facets.rows(SearchFilter(brand="samsung", model="wf45")).tolist() == [0]
+
+
+def test_reupload_with_new_content_is_indexed_alongside(store_files):
+    store = VectorStore.load(**store_files)
+    old = chunk_page("old drain procedure", 1, 0, FILENAME, namespace="a" * 64)
+    new = chunk_page("new drain procedure", 1, 0, FILENAME, namespace="b" * 64)
+    
+    assert store.add(unit_vectors(1, seed=1), old) == 1
+    assert store.add(unit_vectors(1, seed=2), new) == 1
+    assert store.chunk(new[0]["id"], 1.0)["text"] == "new drain procedure"
+    # The same upload published twice is still idempotent
+    assert store.add(unit_vectors(1, seed=2), new) == 0
+
+
+def _embedded_job(queue, records):
+    job = queue.submit(queue.jobs_root / "upload.pdf", FILENAME, "c" * 64)
+    job_dir = queue.jobs_root / job["job_id"]
+    with open(job_dir / CHUNKS_FILE, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+    np.save(job_dir / "emb_000000000.npy", unit_vectors(len(records)))
+    job["status"] = "embedded"
+    save_job(job_dir, job)
+    return job_dir
+
+
+def test_job_fails_when_no_chunk_is_added(tmp_path):
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, dispatch=False)
+        job_dir = _embedded_job(queue, chunk_page("some text", 1, 0, FILENAME))
+        await queue._run(job_dir.name, None)
+        return load_job(job_dir)
+    
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert "none of 1 chunks were added" in job["errors"][-1]
+
+
+def test_retried_publish_still_completes(tmp_path):
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, dispatch=False)
+        job_dir = _embedded_job(queue, chunk_page("some text", 1, 0, FILENAME))
+        job = load_job(job_dir)
+        job["publish_started"] = True  # crashed after publishing, before recording it
+        save_job(job_dir, job)
+        await queue._run(job_dir.name, None)
+        return load_job(job_dir)
+    
+    job = asyncio.run(run())
+    assert job["status"] == "completed"
+    assert job["chunks_published"] == 1
+
+
+def test_missing_job_file_fails_the_job_and_drops_its_upload(tmp_path):
+    done = []
+    
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, dispatch=False)
+        upload = tmp_path / "upload.pdf"
+        upload.write_bytes(b"%PDF")
+        job = queue.submit(upload, FILENAME, "c" * 64)
+        job_dir = queue.jobs_root / job["job_id"]
+        queue._started[job["job_id"]] = job
+        (job_dir / "job.json").unlink()
+        await queue._run(job["job_id"], done.append)
+        return upload, load_job(job_dir)
+    
+    upload, job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert "job.json missing" in job["errors"][-1]
+    assert not upload.exists()
+    # The claim on the content hash can still be released
+    assert [finished["content_hash"] for finished in done] == ["c" * 64]
+
+
+def test_corrupt_job_file_without_history_is_marked_failed(tmp_path):
+    done = []
+    
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, dispatch=False)
+        job_dir = _embedded_job(queue, chunk_page("some text", 1, 0, FILENAME))
+        (job_dir / "job.json").write_text("{not json")
+        await queue._run(job_dir.name, done.append)
+        return job_dir
+    
+    job_dir = asyncio.run(run())
+    job = load_job(job_dir)
+    assert job["status"] == "failed" and job["job_id"] == job_dir.name
+    assert done and done[0]["status"] == "failed"
+    assert not (job_dir / CHUNKS_FILE).exists() and not list(job_dir.glob("emb_*.npy"))
+
+
+def test_failed_job_drops_partial_outputs(tmp_path):
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, dispatch=False)
+        job_dir = _embedded_job(queue, chunk_page("some text", 1, 0, FILENAME))
+        await queue._run(job_dir.name, None)
+        return job_dir
+    
+    job_dir = asyncio.run(run())
+    assert load_job(job_dir)["status"] == "failed"
+    assert not (job_dir / CHUNKS_FILE).exists() and not list(job_dir.glob("emb_*.npy"))
+
+
+def test_sweep_fails_lost_jobs_and_expires_finished_ones(tmp_path):
+    async def run():
+        queue = IngestionQueue(tmp_path / "jobs", publish=lambda job, records, embeddings: 0, retention_seconds=60)
+        lost = queue.jobs_root / "lost"
+        lost.mkdir()
+        os.utime(lost, (time.time() - 3600, time.time() - 3600))
+        fresh = queue.jobs_root / "fresh"  # job.json not written yet by another process
+        fresh.mkdir()
+        
+        finished = queue.jobs_root / "finished"
+        finished.mkdir()
+        save_job(finished, {"job_id": "finished", "status": "completed", "path": None})
+        job = load_job(finished)
+        job["updated_at"] -= 3600
+        with open(finished / "job.json", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        
+        resumed = queue.resume_pending()
+        await queue.shutdown()
+        return queue, resumed
+    
+    queue, resumed = asyncio.run(run())
+    assert resumed == 0
+    assert load_job(queue.jobs_root / "lost")["status"] == "failed"
+    assert load_job(queue.jobs_root / "fresh") is None
+    assert not (queue.jobs_root / "finished").exists()
@@ -0,0 +1,55 @@
+import pytest
+
+from backend.latency_metrics import (NUM_SLICES, SLICE_SECONDS, LatencyRecorder, StageHistogram, bucket_index,
+                                     bucket_upper_bound)
+
+NOW = 1_000_000.0
+
+
+def test_buckets_bound_the_relative_error():
+    for seconds in (0.0002, 0.013, 0.4, 2.5, 31.0):
+        upper = bucket_upper_bound(bucket_index(seconds))
+        assert seconds <= upper <= seconds * 1.1
+
+
+def test_window_percentiles():
+    histogram = StageHistogram()
+    for i in range(1, 101):
+        histogram.record(i / 100, NOW)
+    summary = histogram.window(60, NOW)
+    assert summary["count"] == 100
+    assert summary["max"] == 1.0
+    assert summary["p50"] == pytest.approx(0.5, rel=0.1)
+    assert summary["p95"] == pytest.approx(0.95, rel=0.1)
+    assert summary["p99"] <= summary["max"]
+    assert histogram.mean == pytest.approx(0.505)
+
+
+def test_window_slides_but_all_time_totals_keep_everything():
+    histogram = StageHistogram()
+    histogram.record(5.0, NOW)
+    histogram.record(0.1, NOW + 120)
+    assert histogram.window(60, NOW + 120) == {"count": 1, "max": 0.1, "p50": pytest.approx(0.1, rel=0.1),
+                                               "p95": pytest.approx(0.1, rel=0.1), "p99": pytest.approx(0.1, rel=0.1)}
+    assert histogram.window(300, NOW + 120)["count"] == 2
+    assert histogram.total_count == 2
+    
+    # An hour later the slice is recycled
+    histogram.record(0.2, NOW + NUM_SLICES * SLICE_SECONDS)
+    assert histogram.window(3600, NOW + NUM_SLICES * SLICE_SECONDS)["max"] == 0.2
+
+
+def test_cumulative_counts_for_exposition():
+    histogram = StageHistogram()
+    for seconds in (0.01, 0.2, 0.2, 3.0):
+        histogram.record(seconds, NOW)
+    assert histogram.cumulative([0.1, 1.0, 10.0]) == [(0.1, 1), (1.0, 3), (10.0, 4)]
+
+
+def test_recorder_adds_stages_on_demand_and_reports_empty_ones():
+    recorder = LatencyRecorder(stages=("total",))
+    recorder.record("error_code", 0.002)
+    assert recorder.count("error_code") == 1
+    assert recorder.count("search") == 0
+    assert recorder.window("search", 60) == {"count": 0, "max": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    assert set(recorder.snapshot()) == {"total", "error_code"}
@@ -0,0 +1,114 @@
+import gzip
+import io
+import logging
+import threading
+import time
+
+from backend.log_pipeline import BackgroundLogWriter, BackgroundStreamWriter, QueueLogHandler
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def write_batches(writer, batches, line="x" * 50):
+    for batch in range(batches):
+        for i in range(5):
+            writer.submit(f"{batch}-{i} {line}")
+        assert wait_until(lambda: writer.written == (batch + 1) * 5)
+
+
+def test_rotation_keeps_backup_count_compressed_files(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "api.log"), flush_interval=0.01, max_bytes=200, backup_count=2)
+    write_batches(writer, 4)
+    writer.close()
+    
+    backups = sorted(tmp_path.glob("api.log.*"))
+    assert len(backups) == 2
+    assert all(path.suffix == ".gz" for path in backups)
+    assert gzip.decompress(backups[-1].read_bytes()).decode().startswith("3-0 ")
+    assert (tmp_path / "api.log").read_text() == ""
+
+
+def test_zero_backup_count_keeps_no_rotated_files(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "api.log"), flush_interval=0.01, max_bytes=200, backup_count=0)
+    write_batches(writer, 2)
+    writer.close()
+    
+    assert list(tmp_path.glob("api.log.*")) == []
+    assert (tmp_path / "api.log").exists()
+
+
+def test_failed_rotation_does_not_stop_the_writer(tmp_path, capfd):
+    writer = BackgroundLogWriter(str(tmp_path / "api.log"), flush_interval=0.01, max_bytes=200,
+                                 compress=False, rotate_retry_seconds=60.0)
+    
+    def disk_full():
+        raise OSError(28, "No space left on device")
+    
+    writer._prune = disk_full
+    write_batches(writer, 3)
+    writer.close()
+    
+    # One failure, then no retry inside rotate_retry_seconds; every line still landed
+    assert writer.rotation_errors == 1
+    assert "No space left on device" in writer.stats()["last_error"]
+    assert "Log rotation of" in capfd.readouterr().err
+    assert writer.written == 15 and writer.dropped == 0
+    assert len((tmp_path / "api.log").read_text().splitlines()) == 10
+
+
+def test_full_queue_drops_new_records_without_blocking(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "api.log"), max_queue=3, flush_interval=0.01, flush_batch=1)
+    release = threading.Event()
+    write = writer._write
+    
+    def stalled_disk(lines):
+        release.wait()
+        write(lines)
+    
+    writer._write = stalled_disk
+    writer.submit("first")
+    assert wait_until(lambda: writer.queue.qsize() == 0)  # the writer holds it, stuck on the disk
+    
+    start = time.time()
+    for i in range(10):
+        writer.submit(f"line {i}")
+    assert time.time() - start < 0.5
+    assert writer.dropped == 7
+    
+    release.set()
+    writer.close()
+    assert (tmp_path / "api.log").read_text().splitlines() == ["first", "line 0", "line 1", "line 2"]
+
+
+def test_close_flushes_everything_queued(tmp_path):
+    writer = BackgroundLogWriter(str(tmp_path / "api.log"), flush_interval=5.0, flush_batch=64)
+    for i in range(1000):
+        writer.submit(f"line {i}")
+    writer.close()
+    
+    assert not writer._thread.is_alive()
+    assert len((tmp_path / "api.log").read_text().splitlines()) == 1000
+    assert writer.stats()["queued"] == 0
+
+
+def test_console_output_goes_through_the_queue():
+    stream = io.StringIO()
+    writer = BackgroundStreamWriter(stream, flush_interval=0.01)
+    logger = logging.getLogger("test_log_pipeline.console")
+    handler = QueueLogHandler(writer)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("search slow")
+        writer.close()
+    finally:
+        logger.removeHandler(handler)
+    
+    assert stream.getvalue() == "WARNING search slow\n"
+    assert not stream.closed
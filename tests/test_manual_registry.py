@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import logging
+
+from backend.manual_registry import ManualRegistry, file_sha256, stream_to_disk
+
+
+class FakeUpload:
+    """UploadFile.read over an in-memory body, recording the read sizes asked for"""
+    
+    def __init__(self, body):
+        self.body = body
+        self.position = 0
+        self.reads = []
+    
+    async def read(self, size):
+        self.reads.append(size)
+        chunk = self.body[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+def test_upload_is_streamed_to_disk_and_hashed_in_chunks(tmp_path):
+    body = bytes(range(256)) * 1000 + b"tail"
+    upload = FakeUpload(body)
+    destination = tmp_path / "upload.part"
+    
+    content_hash, size = asyncio.run(stream_to_disk(upload.read, destination, chunk_size=4096))
+    
+    assert (content_hash, size) == (hashlib.sha256(body).hexdigest(), len(body))
+    assert destination.read_bytes() == body and file_sha256(destination) == content_hash
+    # Never asked for more than one chunk at a time
+    assert set(upload.reads) == {4096} and len(upload.reads) == len(body) // 4096 + 2
+
+
+def test_empty_upload(tmp_path):
+    content_hash, size = asyncio.run(stream_to_disk(FakeUpload(b"").read, tmp_path / "empty.part"))
+    assert (content_hash, size) == (hashlib.sha256(b"").hexdigest(), 0)
+    assert (tmp_path / "empty.part").read_bytes() == b""
+
+
+def test_same_content_under_another_name_is_a_duplicate(tmp_path):
+    registry = ManualRegistry(tmp_path / "manual_registry.jsonl")
+    sha = "a" * 64
+    
+    assert registry.claim(sha, "WF45.pdf", 100) is None
+    processing = registry.claim(sha, "copy of WF45.pdf", 100)
+    assert processing["status"] == "processing" and processing["filename"] == "WF45.pdf"
+    
+    # A failed ingestion releases the claim so the manual can be uploaded again
+    registry.release(sha)
+    assert registry.claim(sha, "WF45 (2).pdf", 100) is None
+    registry.mark_indexed(sha, 12, filename="WF45 (2).pdf")
+    registry.release(sha)  # indexed entries are never released
+    indexed = registry.claim(sha, "WF45.pdf", 100)
+    assert (indexed["status"], indexed["chunks"]) == ("indexed", 12)
+
+
+def test_indexed_manuals_survive_restarts_and_reach_other_workers(tmp_path):
+    path = tmp_path / "manual_registry.jsonl"
+    writer = ManualRegistry(path)
+    other = ManualRegistry(path)
+    writer.claim("b" * 64, "MS2595.pdf", 10)
+    writer.mark_indexed("b" * 64, 3, filename="MS2595.pdf")
+    writer.claim("c" * 64, "ME16.pdf", 10)  # processing claims stay in memory
+    
+    assert other.get("b" * 64) is None
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"sha256": "dddd')  # another process mid-append
+    assert other.refresh() == 1
+    assert other.get("b" * 64)["chunks"] == 3
+    assert ManualRegistry(path).get("c" * 64) is None
+
+
+def test_seeding_registers_indexed_pdfs_and_warns_on_duplicates(tmp_path, caplog):
+    manuals = tmp_path / "data_raw"
+    manuals.mkdir()
+    (manuals / "lg_microwave_MS2595.pdf").write_bytes(b"%PDF lg")
+    (manuals / "samsung_washingmachine_WF45.pdf").write_bytes(b"%PDF samsung")
+    (manuals / "not_indexed.pdf").write_bytes(b"%PDF other")
+    (manuals / "uploads").mkdir()
+    (manuals / "uploads" / "wf45_copy.pdf").write_bytes(b"%PDF samsung")
+    registry = ManualRegistry(tmp_path / "manual_registry.jsonl")
+    
+    with caplog.at_level(logging.WARNING, logger="backend.manual_registry"):
+        registry.seed_from_directory(manuals, ["lg_microwave_MS2595", "samsung_washingmachine_WF45.pdf"])
+    
+    assert registry.get(file_sha256(manuals / "lg_microwave_MS2595.pdf"))["status"] == "indexed"
+    assert registry.get(file_sha256(manuals / "not_indexed.pdf")) is None
+    assert any("wf45_copy.pdf matches" in record.message for record in caplog.records)
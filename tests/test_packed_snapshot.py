@@ -0,0 +1,119 @@
+import faiss
+import numpy as np
+import pytest
+
+from conftest import unit_vectors
+from core.retrieval import VectorStore
+from core.retrieval.packed_snapshot import PREAMBLE, PackedSnapshot, write_packed_snapshot
+
+
+def test_round_trip_keeps_rows_ids_and_records(tmp_path):
+    ids = ["b_manual.pdf_0", "a_manual.pdf_1", "café_manual.pdf_2", "a_manual.pdf_0"]
+    records = [{"id": chunk_id, "text": f"text of {chunk_id}", "page": row} for row, chunk_id in enumerate(ids)]
+    vectors = unit_vectors(len(ids))
+    header = write_packed_snapshot(tmp_path / "snapshot.bin", vectors, ids, records,
+                                   base_files={"index": "faiss.index"}, metadata_bytes=123, index_version=7)
+    
+    packed = PackedSnapshot(tmp_path / "snapshot.bin", verify=True)
+    assert packed.header == header
+    assert (packed.count, packed.dim, packed.metadata_bytes) == (4, 16, 123)
+    assert packed.base_files == {"index": "faiss.index"}
+    assert packed.ids == ids
+    assert np.array_equal(packed.vectors, vectors)
+    assert [packed.find(chunk_id) for chunk_id in ids] == [0, 1, 2, 3]
+    assert packed.find("missing.pdf_0") is None
+    assert packed.record(2) == records[2]
+    
+    _, rows = packed.index().search(vectors[3:4], 1)
+    assert rows[0][0] == 3
+
+
+def test_round_trip_with_a_serialized_faiss_index(tmp_path):
+    vectors = unit_vectors(50)
+    ids = [f"manual.pdf_{i}" for i in range(50)]
+    hnsw = faiss.IndexHNSWFlat(16, 8, faiss.METRIC_INNER_PRODUCT)
+    hnsw.add(vectors)
+    write_packed_snapshot(tmp_path / "snapshot.bin", vectors, ids, [{"id": chunk_id} for chunk_id in ids],
+                          faiss_index_bytes=faiss.serialize_index(hnsw))
+    
+    index = PackedSnapshot(tmp_path / "snapshot.bin").index()
+    assert isinstance(index, faiss.IndexHNSWFlat) and index.ntotal == 50
+    _, rows = index.search(vectors[:5], 1)
+    assert list(rows[:, 0]) == [0, 1, 2, 3, 4]
+
+
+def test_unreadable_files_are_refused(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    write_packed_snapshot(path, unit_vectors(3), ["a", "b", "c"], [{"id": "a"}, {"id": "b"}, {"id": "c"}])
+    data = bytearray(path.read_bytes())
+    
+    newer = bytearray(data)
+    newer[8:12] = (2).to_bytes(4, "little")
+    (tmp_path / "newer.bin").write_bytes(newer)
+    with pytest.raises(ValueError, match="format version 2"):
+        PackedSnapshot(tmp_path / "newer.bin")
+    
+    (tmp_path / "truncated.bin").write_bytes(data[:len(data) - 8])
+    with pytest.raises(ValueError, match="truncated"):
+        PackedSnapshot(tmp_path / "truncated.bin")
+    
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    (tmp_path / "corrupt.bin").write_bytes(corrupt)
+    PackedSnapshot(tmp_path / "corrupt.bin")  # sections are only checked on request
+    with pytest.raises(ValueError, match="checksum"):
+        PackedSnapshot(tmp_path / "corrupt.bin", verify=True)
+    
+    header = bytearray(data)
+    header[PREAMBLE.size] ^= 0xFF
+    (tmp_path / "header.bin").write_bytes(header)
+    with pytest.raises(ValueError, match="header checksum"):
+        PackedSnapshot(tmp_path / "header.bin")
+
+
+def test_store_loads_from_its_packed_snapshot(store_files, tmp_path):
+    snapshot_path = tmp_path / "faiss_index" / "snapshot.bin"
+    store = VectorStore.load(**store_files)
+    queries = unit_vectors(5, seed=3)
+    expected = store.search_rows(queries, 5)
+    store.write_packed_snapshot(snapshot_path)
+    
+    packed = VectorStore.load(**store_files, snapshot_path=snapshot_path, verify_snapshot=True)
+    assert packed.stats()["packed_snapshot"]
+    scores, ids = packed.search_rows(queries, 5)
+    assert np.array_equal(ids, expected[1]) and np.allclose(scores, expected[0], atol=1e-5)
+    assert packed.chunk("lg_microwave_MS2595.pdf_3", 1.0)["text"] == "text of lg_microwave_MS2595.pdf_3"
+    
+    # Chunks added after the snapshot was built come from metadata.jsonl
+    packed.add(unit_vectors(1, seed=9), [{"id": "new.pdf_0", "text": "added later"}])
+    reloaded = VectorStore.load(**store_files, snapshot_path=snapshot_path)
+    assert reloaded.stats()["packed_snapshot"] and reloaded.delta_size == 1
+    assert reloaded.chunk("new.pdf_0", 1.0)["text"] == "added later"
+
+
+def test_stale_missing_or_mismatched_snapshot_falls_back_to_index_files(store_files, tmp_path):
+    snapshot_path = tmp_path / "faiss_index" / "snapshot.bin"
+    store = VectorStore.load(**store_files)
+    query = unit_vectors(1, seed=3)
+    _, expected = store.search_rows(query, 3)
+    
+    missing = VectorStore.load(**store_files, snapshot_path=snapshot_path)
+    assert not missing.stats()["packed_snapshot"]
+    
+    store.write_packed_snapshot(snapshot_path)
+    data = bytearray(snapshot_path.read_bytes())
+    data[8:12] = (99).to_bytes(4, "little")
+    snapshot_path.write_bytes(data)
+    mismatched = VectorStore.load(**store_files, snapshot_path=snapshot_path)
+    assert not mismatched.stats()["packed_snapshot"]
+    assert np.array_equal(mismatched.search_rows(query, 3)[1], expected)
+    
+    # A merge (by a store without the snapshot) moves the base: the snapshot is stale
+    store.write_packed_snapshot(snapshot_path)
+    store.snapshot_path = None
+    store.add(unit_vectors(1, seed=9), [{"id": "new.pdf_0", "text": "added later"}])
+    store.merge()
+    stale = VectorStore.load(**store_files, snapshot_path=snapshot_path)
+    assert not stale.stats()["packed_snapshot"]
+    assert stale.size == 41
+    assert stale.search_rows(unit_vectors(1, seed=9), 1)[1][0][0] == "new.pdf_0"
@@ -0,0 +1,56 @@
+import re
+
+from backend.latency_metrics import LatencyRecorder
+from backend.prometheus import LATENCY_BUCKETS, render_metrics
+
+SAMPLE = re.compile(r'^([a-z_]+)(?:\{((?:[a-z_]+="(?:[^"\\]|\\.)*",?)*)\})? (-?[0-9.e+-]+)$')
+
+
+def parse(text):
+    """Exposition text -> ({name: type}, [(name, labels, value)]), asserting the line format"""
+    types, samples = {}, []
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            types[name] = metric_type
+        elif not line.startswith("# HELP "):
+            match = SAMPLE.match(line)
+            assert match, line
+            labels = dict(re.findall(r'([a-z_]+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+            samples.append((match.group(1), labels, float(match.group(3))))
+    return types, samples
+
+
+def test_histogram_buckets_are_cumulative_and_end_at_count():
+    latency = LatencyRecorder(stages=("total", "llm"))
+    for seconds in (0.003, 0.04, 0.4, 4.0, 90.0):
+        latency.record("total", seconds)
+    types, samples = parse(render_metrics(latency, {"safe": 4, "danger": 1}, {}))
+    
+    assert types["companion_stage_latency_seconds"] == "histogram"
+    buckets = [(labels["le"], value) for name, labels, value in samples
+               if name == "companion_stage_latency_seconds_bucket" and labels["stage"] == "total"]
+    assert [le for le, _ in buckets] == [repr(float(bound)) for bound in LATENCY_BUCKETS] + ["+Inf"]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)
+    assert counts[-1] == 5
+    assert ("companion_stage_latency_seconds_count", {"stage": "llm"}, 0.0) in samples
+    assert ("companion_requests_total", {"safety_level": "danger"}, 1.0) in samples
+
+
+def test_counters_and_gauges_skip_missing_values():
+    types, samples = parse(render_metrics(LatencyRecorder(stages=()), {},
+                                          {"inflight_requests": 2, "index_vectors": None},
+                                          {"cache_hits": 7, "error_code_answers": None}))
+    assert types["companion_inflight_requests"] == "gauge"
+    assert types["companion_cache_hits_total"] == "counter"
+    names = {name for name, _, _ in samples}
+    assert {"companion_inflight_requests", "companion_cache_hits_total"} <= names
+    assert not {"companion_index_vectors", "companion_error_code_answers_total"} & names
+
+
+def test_label_values_are_escaped():
+    text = render_metrics(LatencyRecorder(stages=()), {'odd "level"\n': 1}, {})
+    assert 'safety_level="odd \\"level\\"\\n"' in text
+    parse(text)
@@ -0,0 +1,142 @@
+import random
+import re
+
+import pytest
+
+from backend.safety_matcher import SAFETY_LEVELS, PhraseAutomaton, SafetyMatcher, literal_phrases
+
+PATTERNS = {
+    "emergency": [r"\b(gas\s+leak|smell\s+gas|smell\s+of\s+gas)\b", r"\bcarbon\s+monoxide\b", r"\bon\s+fire\b",
+                  r"\bsparks?\s+(?:from|coming)\b"],
+    "danger": [r"\b(?:smoke|smoking|burning\s+smell)\b", r"\bexposed\s+wir(?:e|es|ing)\b", r"\bshock(?:ed)?\b"],
+    "caution": [r"\b(unplug|disconnect)\b", r"\bhot\s+surface\b", r"\bwater\s+(?:on|under)\s+the\s+floor\b"]
+}
+KEYWORDS = {
+    "emergency": ["explosion"],
+    "danger": ["burning", "electrical fire"],
+    "caution": ["leak", "leaking", "e-stop!"]
+}
+QUERIES = [
+    "I smell gas near the range",
+    "the smell of gas is strong",
+    "gas leak behind the dryer",
+    "Carbon   Monoxide alarm is beeping",
+    "my oven is on fire",
+    "sparks coming out of the outlet",
+    "smoke from the back of the microwave",
+    "there is a burning smell and it stopped",
+    "exposed wiring near the door",
+    "I got shocked by the washer",
+    "should I unplug it before cleaning?",
+    "water under the floor panel",
+    "water on the floor after a cycle",
+    "the hose is leaking",
+    "leaks are annoying",
+    "an electrical fire started",
+    "explosion in the kitchen",
+    "press e-stop! now",
+    "how do I set the clock",
+    "the smoker setting on my grill",
+    "shockingly quiet washer",
+    "hot surfaces everywhere",
+    "hot surface warning light and smoke",
+    "",
+]
+
+
+def reference_level(text):
+    """The regex list one pattern at a time, highest level first - what the checker does"""
+    for level in SAFETY_LEVELS:
+        if any(re.search(pattern, text, re.IGNORECASE) for pattern in PATTERNS[level]):
+            return level
+        for keyword in KEYWORDS[level]:
+            if re.search(r"(?<!\w)" + re.escape(keyword) + r"(?!\w)", text, re.IGNORECASE):
+                return level
+    return "safe"
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_the_regex_list(query):
+    assert SafetyMatcher(PATTERNS, KEYWORDS).level(query) == reference_level(query)
+
+
+def test_literals_go_into_the_trie_and_the_rest_stay_patterns():
+    matcher = SafetyMatcher(PATTERNS, KEYWORDS)
+    assert literal_phrases(r"\b(gas\s+leak|smell\s+gas)\b") == ["gas leak", "smell gas"]
+    assert literal_phrases(r"\bsparks?\s+(?:from|coming)\b") is None
+    assert matcher.literal_count == 16
+    assert matcher.pattern_count == 5
+
+
+def test_automaton_finds_every_phrase_on_word_boundaries():
+    automaton = PhraseAutomaton({"gas": 0, "gas leak": 1, "gasket": 2, "leak": 2})
+    text = "Gas \t Leak near the gasket, gasleak"
+    assert sorted((text[start:end], rank) for start, end, rank in automaton.matches(text)) == [
+        ("Gas", 0), ("Gas \t Leak", 1), ("Leak", 2), ("gasket", 2)
+    ]
+    assert automaton.matches("gaskets and leaky hoses") == []
+
+
+def test_automaton_follows_failure_links():
+    # "she" runs into "he" and "hers" through the failure links
+    automaton = PhraseAutomaton({"he": 2, "she": 1, "his": 2, "hers": 0})
+    assert sorted(automaton.matches("ushers")) == []  # inside a word
+    assert sorted((start, end) for start, end, _ in automaton.matches("u she hers")) == [(2, 5), (6, 10)]
+    assert automaton.states == 10
+
+
+def test_automaton_agrees_with_per_phrase_regexes():
+    rng = random.Random(3)
+    words = ["gas", "leak", "gasket", "smoke", "smoker", "hot", "surface", "on", "fire"]
+    phrases = {" ".join(rng.sample(words, rng.randint(1, 3))): rng.randrange(3) for _ in range(30)}
+    regexes = {phrase: re.compile(r"\b" + r"\s+".join(map(re.escape, phrase.split())) + r"\b", re.IGNORECASE)
+               for phrase in phrases}
+    automaton = PhraseAutomaton(phrases)
+    for _ in range(200):
+        text = "".join(rng.choice(words) + rng.choice([" ", "  ", "\n", ", ", "-", ""]) for _ in range(8))
+        expected = sorted(
+            (start, match.end(), rank) for phrase, rank in phrases.items() for start in range(len(text))
+            for match in [regexes[phrase].match(text, start)] if match
+        )
+        assert sorted(automaton.matches(text)) == expected
+
+
+def test_spans_report_every_level_seen():
+    match = SafetyMatcher(PATTERNS, KEYWORDS).classify("Unplug it, there is smoke and I smell gas")
+    assert match.level == "emergency"
+    assert [(span["level"], span["text"]) for span in match.spans] == [
+        ("caution", "Unplug"), ("danger", "smoke"), ("emergency", "smell gas")
+    ]
+
+
+def test_from_checker_uses_the_pattern_accessor():
+    class Checker:
+        DANGER_PATTERNS = [r"\bignored\b"]
+        
+        def safety_patterns(self):
+            return {"emergency": PATTERNS["emergency"], "caution": PATTERNS["caution"]}
+        
+        def safety_keywords(self):
+            return {"danger": ["burning"]}
+    
+    matcher = SafetyMatcher.from_checker(Checker())
+    assert matcher.level("gas leak") == "emergency"
+    assert matcher.level("burning") == "danger"
+    assert matcher.level("unplug") == "caution"
+    assert matcher.level("ignored") == "safe"
+
+
+def test_from_checker_falls_back_to_the_pattern_constants():
+    class Checker:
+        DANGER_PATTERNS = PATTERNS["danger"]
+        danger_keywords = ["not read"]
+    
+    matcher = SafetyMatcher.from_checker(Checker())
+    assert matcher.level("exposed wires") == "danger"
+    assert matcher.level("not read") == "safe"
+    assert SafetyMatcher.from_checker(object()) is None
+
+
+def test_bad_pattern_fails_at_build_time():
+    with pytest.raises(re.error):
+        SafetyMatcher({"danger": [r"(unclosed"]})
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from backend.search_batcher import SearchBatcher
+
+
+def run_concurrently(batcher, items):
+    async def main():
+        try:
+            return await asyncio.gather(*[batcher.submit(item) for item in items], return_exceptions=True)
+        finally:
+            batcher.shutdown()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_batch_in_order():
+    calls = []
+    
+    def batch_fn(items):
+        calls.append(list(items))
+        return [item * 10 for item in items]
+    
+    batcher = SearchBatcher(batch_fn, window_ms=20, max_batch_size=32)
+    assert run_concurrently(batcher, [1, 2, 3]) == [10, 20, 30]
+    assert calls == [[1, 2, 3]]
+    assert batcher.stats() == {"batches": 1, "requests": 3, "avg_batch_size": 3.0, "max_batch_size": 3}
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    calls = []
+    
+    def batch_fn(items):
+        calls.append(list(items))
+        return items
+    
+    # A window far longer than the test: only max_batch_size can flush
+    batcher = SearchBatcher(batch_fn, window_ms=60_000, max_batch_size=2)
+    
+    async def main():
+        try:
+            return await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 5)
+        finally:
+            batcher.shutdown()
+    
+    assert asyncio.run(main()) == ["a", "b"]
+    assert calls == [["a", "b"]]
+
+
+def test_batch_failure_reaches_every_waiter():
+    def batch_fn(items):
+        raise RuntimeError("index unavailable")
+    
+    results = run_concurrently(SearchBatcher(batch_fn, window_ms=5), ["a", "b"])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_waiter_does_not_break_the_batch():
+    def batch_fn(items):
+        return [item.upper() for item in items]
+    
+    batcher = SearchBatcher(batch_fn, window_ms=20)
+    
+    async def main():
+        cancelled = asyncio.ensure_future(batcher.submit("a"))
+        kept = asyncio.ensure_future(batcher.submit("b"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        try:
+            assert await kept == "B"
+        finally:
+            batcher.shutdown()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+    
+    asyncio.run(main())
+
+
+class CountingEncoder:
+    """Stands in for the query encoder: one call per batch, however many queries it holds"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def encode(self, queries):
+        self.calls.append(list(queries))
+        return [len(query) for query in queries]
+
+
+def test_concurrent_requests_coalesce_into_one_encoder_call():
+    encoder = CountingEncoder()
+    
+    def batch_fn(queries):
+        return [f"{query}:{embedding}" for query, embedding in zip(queries, encoder.encode(queries))]
+    
+    batcher = SearchBatcher(batch_fn, window_ms=20, max_batch_size=32)
+    queries = [f"question {i}" * (i + 1) for i in range(8)]
+    results = run_concurrently(batcher, queries)
+    
+    assert results == [f"{query}:{len(query)}" for query in queries]
+    assert encoder.calls == [queries]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_one_failing_item_does_not_fail_the_batch():
+    calls = []
+    
+    def batch_fn(items):
+        calls.append(list(items))
+        if "bad" in items:
+            raise ValueError("cannot encode bad")
+        return [item.upper() for item in items]
+    
+    results = run_concurrently(SearchBatcher(batch_fn, window_ms=20), ["a", "bad", "c"])
+    
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+    # One batched call, then each item on its own
+    assert calls == [["a", "bad", "c"], ["a"], ["bad"], ["c"]]
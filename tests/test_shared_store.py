@@ -0,0 +1,62 @@
+import json
+
+import faiss
+import numpy as np
+
+from conftest import unit_vectors
+from core.retrieval import VectorStore
+from core.retrieval.shared_store import ChunkStore, MmapFlatIndex, read_index_mmap
+
+
+def test_mmap_flat_index_matches_faiss(store_files):
+    index = read_index_mmap(store_files["index_path"], store_files["embeddings_path"])
+    assert isinstance(index, MmapFlatIndex) and index.ntotal == 40
+    exact = faiss.read_index(str(store_files["index_path"]))
+    queries = unit_vectors(5, seed=3)
+    
+    scores, rows = index.search(queries, 7)
+    expected_scores, expected_rows = exact.search(queries, 7)
+    assert np.array_equal(rows, expected_rows) and np.allclose(scores, expected_scores, atol=1e-5)
+    # Fewer vectors than k: the tail is padded like FAISS pads it
+    _, rows = MmapFlatIndex(unit_vectors(2)).search(queries, 3)
+    assert (rows[:, 2] == -1).all()
+
+
+def test_chunk_store_reads_appended_records_but_not_a_partial_tail(store_files):
+    path = store_files["metadata_path"]
+    chunks = ChunkStore(path)
+    assert len(chunks) == 40 and chunks.sidecar_path.exists()
+    assert chunks.get("lg_microwave_MS2595.pdf_7")["text"] == "text of lg_microwave_MS2595.pdf_7"
+    assert chunks.get("missing.pdf_0") is None
+    
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "new.pdf_0", "text": "appended"}) + "\n")
+        f.write('{"id": "new.pdf_1", "te')
+    assert chunks.refresh() == 1
+    assert chunks.get("new.pdf_0")["text"] == "appended" and "new.pdf_1" not in chunks
+    
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('xt": "finished"}\n')
+    assert chunks.refresh() == 1
+    assert chunks.get("new.pdf_1")["text"] == "finished"
+
+
+def test_follower_picks_up_the_writers_manifest(store_files):
+    writer = VectorStore.load(**store_files, mmap=True)
+    follower = VectorStore.load(**store_files, mmap=True)
+    assert not follower.refresh()
+    
+    vectors = unit_vectors(3, seed=7)
+    records = [{"id": f"new.pdf_{i}", "text": f"new chunk {i}"} for i in range(3)]
+    writer.add(vectors[:2], records[:2])
+    assert follower.refresh()
+    assert (follower.version, follower.delta_size) == (1, 2)
+    assert follower.search(vectors[1], 1)[0][0]["text"] == "new chunk 1"
+    
+    writer.add(vectors[2:], records[2:])
+    writer.merge()
+    assert follower.refresh()
+    assert (follower.version, follower.delta_size, follower.size) == (3, 0, 43)
+    assert isinstance(follower.snapshot.base_index, MmapFlatIndex)
+    assert follower.search(vectors[2], 1)[0][0]["text"] == "new chunk 2"
+    assert not follower.refresh()
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight, normalize_query_key
+
+
+def counting_fn(calls, result="answer", delay=0.02):
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return fn
+
+
+def test_concurrent_calls_share_one_computation():
+    async def main():
+        flight, calls = SingleFlight(), []
+        results = await asyncio.gather(*[flight.do("key", counting_fn(calls)) for _ in range(3)])
+        return flight, calls, results
+    
+    flight, calls, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == [("answer", False), ("answer", True), ("answer", True)]
+    assert flight.stats() == {"inflight": 0, "leaders": 1, "coalesced": 2, "abandoned": 0}
+
+
+def test_finished_key_runs_again():
+    async def main():
+        flight, calls = SingleFlight(), []
+        await flight.do("key", counting_fn(calls, delay=0))
+        await flight.do("key", counting_fn(calls, delay=0))
+        return calls
+    
+    assert len(asyncio.run(main())) == 2
+
+
+def test_exception_is_shared():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("llm down")
+    
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+
+def test_leader_disconnect_does_not_cancel_the_others():
+    async def main():
+        flight, calls = SingleFlight(), []
+        leader = asyncio.ensure_future(flight.do("key", counting_fn(calls)))
+        follower = asyncio.ensure_future(flight.do("key", counting_fn(calls)))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return flight, await follower
+    
+    flight, result = asyncio.run(main())
+    assert result == ("answer", True)
+    assert flight.abandoned == 0
+
+
+def test_computation_is_cancelled_once_every_caller_has_gone():
+    async def main():
+        flight, cancelled = SingleFlight(), asyncio.Event()
+        
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        callers = [asyncio.ensure_future(flight.do("key", slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight
+    
+    flight = asyncio.run(main())
+    assert flight.abandoned == 1
+    assert flight.inflight == 0
+
+
+def test_query_key_ignores_case_and_whitespace():
+    assert normalize_query_key("  My Washer  won't DRAIN", "Samsung", None, 5) == \
+        normalize_query_key("my washer won't drain", " samsung ", "", 5)
+    assert normalize_query_key("q", None, None, 5) != normalize_query_key("q", None, None, 10)
+
+
+def test_query_key_separates_appliance_types():
+    key = normalize_query_key("door won't open", "Samsung", None, 5, "Microwave")
+    assert key == normalize_query_key("Door won't open", "samsung", None, 5, " microwave ")
+    assert key != normalize_query_key("door won't open", "Samsung", None, 5, "washingmachine")
+    assert key != normalize_query_key("door won't open", "Samsung", None, 5)
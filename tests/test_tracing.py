@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from backend import tracing
+
+
+class Gauge:
+    """The in-flight gauge and trace log as main.py wires them into the middleware"""
+    
+    def __init__(self):
+        self.inflight = 0
+        self.finished = []
+    
+    def start(self, trace):
+        self.inflight += 1
+    
+    def finish(self, trace):
+        self.inflight -= 1
+        self.finished.append(trace)
+
+
+def middleware_for(app, gauge):
+    return tracing.TracingMiddleware(app, prefix="/answer", on_start=gauge.start, on_finish=gauge.finish)
+
+
+def run(middleware, path="/answer", headers=(), disconnect_after=None):
+    """Drive one http request through an ASGI app -> sent messages"""
+    sent = []
+    scope = {"type": "http", "path": path, "headers": list(headers)}
+    
+    async def receive():
+        if disconnect_after is not None and len(sent) >= disconnect_after:
+            return {"type": "http.disconnect"}
+        await asyncio.sleep(0.01)
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        sent.append(message)
+    
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def test_plain_response_releases_gauge_and_records_trace():
+    gauge = Gauge()
+    sent = run(middleware_for(plain_app, gauge), headers=[(b"x-request-id", b"abc")])
+    
+    assert gauge.inflight == 0
+    assert [trace.request_id for trace in gauge.finished] == ["abc"]
+    assert (b"x-request-id", b"abc") in sent[0]["headers"]
+
+
+def test_streamed_body_holds_gauge_until_last_chunk():
+    gauge = Gauge()
+    seen = []
+    
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b", b"c"):
+            seen.append(gauge.inflight)
+            assert tracing.current_trace() is not None
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    
+    run(middleware_for(streaming_app, gauge))
+    
+    assert seen == [1, 1, 1]
+    assert gauge.inflight == 0
+    assert len(gauge.finished) == 1
+    assert tracing.current_trace() is None
+
+
+def test_client_disconnect_before_body_releases_gauge():
+    gauge = Gauge()
+    
+    async def disconnected_app(scope, receive, send):
+        # The client is gone before the first body chunk - nothing is ever sent
+        message = await receive()
+        assert message["type"] == "http.disconnect"
+    
+    sent = run(middleware_for(disconnected_app, gauge), disconnect_after=0)
+    
+    assert sent == []
+    assert gauge.inflight == 0
+    assert len(gauge.finished) == 1
+
+
+def test_cancelled_or_failing_stream_releases_gauge():
+    for error in (asyncio.CancelledError, RuntimeError):
+        gauge = Gauge()
+        
+        async def aborted_app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"a", "more_body": True})
+            raise error()
+        
+        with pytest.raises(error):
+            run(middleware_for(aborted_app, gauge))
+        
+        assert gauge.inflight == 0
+        assert len(gauge.finished) == 1
+
+
+def test_other_paths_get_request_id_without_trace():
+    gauge = Gauge()
+    sent = run(middleware_for(plain_app, gauge), path="/health")
+    
+    assert gauge.inflight == 0 and gauge.finished == []
+    request_ids = [value for name, value in sent[0]["headers"] if name == b"x-request-id"]
+    assert len(request_ids) == 1 and request_ids[0]
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import unit_vectors
+from core.retrieval import VectorStore
+from core.retrieval import vector_store as vector_store_module
+
+
+def new_records(start, count):
+    return [{"id": f"whirlpool_dishwasher_WDT730.pdf_{i}", "text": f"new chunk {i}"}
+            for i in range(start, start + count)]
+
+
+def top_id(store, vector):
+    _, ids = store.search_rows(vector, 1)
+    return ids[0][0]
+
+
+def test_added_chunks_are_searchable_from_the_delta(store_files):
+    store = VectorStore.load(**store_files)
+    vectors = unit_vectors(3, seed=7)
+    
+    assert store.add(vectors, new_records(0, 3)) == 3
+    assert (store.version, store.size, store.delta_size) == (1, 43, 3)
+    assert top_id(store, vectors[1]) == "whirlpool_dishwasher_WDT730.pdf_1"
+    assert store.search(vectors[2], 1)[0][0]["text"] == "new chunk 2"
+    # The segment is on disk: a fresh load sees the same snapshot
+    reloaded = VectorStore.load(**store_files)
+    assert (reloaded.version, reloaded.delta_size) == (1, 3)
+    assert top_id(reloaded, vectors[0]) == "whirlpool_dishwasher_WDT730.pdf_0"
+
+
+def test_merge_folds_the_delta_into_the_base(store_files):
+    store = VectorStore.load(**store_files)
+    vectors = unit_vectors(4, seed=7)
+    store.add(vectors[:2], new_records(0, 2))
+    store.add(vectors[2:], new_records(2, 2))
+    segments = [segment["path"] for segment in store.snapshot.segments]
+    
+    assert store.merge()
+    assert (store.version, store.delta_size, store.snapshot.base_index.ntotal) == (3, 0, 44)
+    assert [top_id(store, vector) for vector in vectors] == [record["id"] for record in new_records(0, 4)]
+    assert not any(os.path.exists(path) for path in segments)
+    assert not store.merge()
+    
+    reloaded = VectorStore.load(**store_files)
+    assert (reloaded.version, reloaded.delta_size, reloaded.size) == (3, 0, 44)
+    assert top_id(reloaded, vectors[3]) == "whirlpool_dishwasher_WDT730.pdf_3"
+
+
+def test_crash_while_writing_the_manifest_keeps_the_previous_one(store_files, monkeypatch):
+    store = VectorStore.load(**store_files)
+    store.add(unit_vectors(1, seed=7), new_records(0, 1))
+    before = store_files["manifest_path"].read_text()
+    
+    def crash(manifest, f, **kwargs):
+        f.write(json.dumps(manifest)[:20])
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(vector_store_module.json, "dump", crash)
+    with pytest.raises(OSError):
+        store.add(unit_vectors(1, seed=8), new_records(1, 1))
+    with pytest.raises(OSError):
+        store.merge()
+    monkeypatch.undo()
+    
+    # Neither the serving snapshot nor the manifest on disk moved
+    assert (store.version, store.delta_size) == (1, 1)
+    assert store_files["manifest_path"].read_text() == before
+    reloaded = VectorStore.load(**store_files)
+    assert (reloaded.version, reloaded.size) == (1, 41)
+    assert top_id(reloaded, unit_vectors(1, seed=7)[0]) == "whirlpool_dishwasher_WDT730.pdf_0"
+
+
+def test_concurrent_refresh_only_sees_whole_snapshots(store_files):
+    writer = VectorStore.load(**store_files)
+    reader = VectorStore.load(**store_files)
+    vectors = unit_vectors(40, seed=7)
+    records = new_records(0, 40)
+    done = threading.Event()
+    seen, failures = [], []
+    
+    def write():
+        try:
+            for i in range(0, 40, 4):
+                writer.add(vectors[i:i + 4], records[i:i + 4])
+                if i % 12 == 8:
+                    writer.merge()
+        finally:
+            done.set()
+    
+    def read():
+        while not done.is_set() or reader.version < writer.version:
+            try:
+                reader.refresh()
+            except OSError:
+                # Segments merged away between reading the manifest and opening
+                # them: the old snapshot keeps serving until the next refresh
+                pass
+            snapshot = reader.snapshot
+            try:
+                assert snapshot.base_index.ntotal == len(snapshot.base_ids)
+                assert len(snapshot.delta_vectors) == len(snapshot.delta_ids)
+                # Whole add() batches, in order - never part of one, never one twice
+                added = [chunk_id for chunk_id in snapshot.ids if chunk_id.startswith("whirlpool")]
+                assert added == [record["id"] for record in records[:len(added)]] and len(added) % 4 == 0
+                if added:
+                    _, ids = snapshot.search(vectors[len(added) - 1:len(added)], 1)
+                    assert ids[0][0] == added[-1]
+            except AssertionError as e:
+                failures.append(e)
+            seen.append(snapshot.version)
+    
+    threads = [threading.Thread(target=write), threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    
+    assert not failures
+    assert reader.version == writer.version and reader.size == 80
+    assert seen == sorted(seen)
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from backend import worker_role
+
+CANDIDATE = (
+    "import sys; sys.path.insert(0, {src!r}); "
+    "from backend.worker_role import acquire_leader_lock; "
+    "print(acquire_leader_lock({path!r}))"
+)
+
+
+def candidate(path):
+    """Another worker process trying to become the index writer -> its answer"""
+    src = str(Path(__file__).parent.parent / "src")
+    result = subprocess.run([sys.executable, "-c", CANDIDATE.format(src=src, path=str(path))],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip() == "True"
+
+
+@pytest.fixture
+def lock_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_role, "_lock_file", None)
+    yield tmp_path / "faiss_index" / ".writer.lock"
+    if worker_role._lock_file is not None:
+        worker_role._lock_file.close()
+
+
+def test_second_writer_candidate_is_refused(lock_path):
+    pytest.importorskip("fcntl")
+    assert worker_role.acquire_leader_lock(lock_path)
+    assert lock_path.read_text() == str(os.getpid())
+    # Already the writer: asking again keeps the lock
+    assert worker_role.acquire_leader_lock(lock_path)
+    
+    assert not candidate(lock_path)
+    assert not candidate(lock_path)
+
+
+def test_lock_passes_on_when_the_writer_exits(lock_path):
+    pytest.importorskip("fcntl")
+    assert candidate(lock_path)  # that process exited, and the OS released its lock
+    assert worker_role.acquire_leader_lock(lock_path)
+    
+    worker_role._lock_file.close()
+    worker_role._lock_file = None
+    assert candidate(lock_path)